@@ -1,62 +1,52 @@
-import streamlit as st
+import os
+from dataclasses import replace
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import streamlit as st
+
+from analysis import QUESTIONS
+from bootstrap import CONFIDENCE, REPLICATES, effects
+from charts import QUESTION_CHART_SPECS, render_charts
+from customers import segment_summary
+from filters import filters_from_sidebar
+from insights import question_insights
+from instrumentation import Tracer, enabled_by_env
+from snapshots import SnapshotWatcher
+from timeindex import GRANULARITIES, PERIOD_OF_YEAR
+
+# Stage timings for this run; turned on by the sidebar's debug checkbox or DASHBOARD_INSTRUMENTATION=1
+tracer = Tracer(enabled=st.session_state.get('debug_timings', False) or enabled_by_env())
 
 # Load the dataset
 transactions_path = "./Transactions.xlsx"
-transactions_df = pd.ExcelFile(transactions_path).parse("Sheet1")
-
-# Convert 'Date' to datetime for easier manipulation
-transactions_df['Date'] = pd.to_datetime(transactions_df['Date'])
-
-# Add a 'Month' column for analysis
-transactions_df['Month'] = transactions_df['Date'].dt.month
-
-# --- Question 1: Average Transaction Amount Across Store Types by Season ---
-average_transaction_by_store_season = transactions_df.groupby(['Store_Type', 'Season'])['Amount($)'].mean().reset_index()
-average_transaction_by_store_season.columns = ['Store Type', 'Season', 'Average Transaction Amount ($)']
-average_transaction_by_store_season = average_transaction_by_store_season.sort_values(by=['Store Type', 'Season'])
-
-# --- Question 2: Most Common Payment Method for High-Value Transactions Across Cities ---
-average_transaction_amount = transactions_df['Amount($)'].mean()
-high_value_transactions = transactions_df[transactions_df['Amount($)'] > average_transaction_amount]
-payment_method_by_city = (
-    high_value_transactions.groupby(['City', 'Payment_Method'])
-    .size()
-    .reset_index(name='Count')
-)
-most_common_payment_method = payment_method_by_city.loc[
-    payment_method_by_city.groupby('City')['Count'].idxmax()
-].sort_values(by='City')
-
-# --- Question 3: Sales Amounts With and Without Discounts Over the Month ---
-sales_with_without_discount = (
-    transactions_df.groupby(['Month', 'Discount_Applied'])['Amount($)']
-    .sum()
-    .reset_index()
-    .pivot(index='Month', columns='Discount_Applied', values='Amount($)')
-    .fillna(0)
-)
-sales_with_without_discount.columns = ['No Discount', 'With Discount']
-
-# --- Question 4: Top Cities with Highest Average Items Per Transaction ---
-average_items_per_city = transactions_df.groupby('City')['Total_Items'].mean().reset_index()
-top_cities = average_items_per_city.nlargest(3, 'Total_Items')
-sales_by_city_season = (
-    transactions_df[transactions_df['City'].isin(top_cities['City'])]
-    .groupby(['City', 'Season'])['Amount($)']
-    .sum()
-    .reset_index()
-)
 
-# --- Question 5: Effectiveness of Promotions in Driving Higher Transaction Amounts ---
-promotion_effectiveness = (
-    transactions_df.groupby(['Promotion', 'Season'])['Amount($)']
-    .mean()
-    .reset_index()
-    .sort_values(by=['Season', 'Amount($)', 'Promotion'], ascending=[True, False, True])
-)
+# Query backend: "cube" (in-memory rollups, the default) or "sqlite" (an indexed SQLite copy of
+# the dataset; filters run as SQL predicates and only aggregates of the transactions are loaded).
+# Either way the customer segments are one row per customer, so once the Customers tab has been
+# opened memory is not flat in the number of customers.
+backend = os.environ.get("DASHBOARD_BACKEND", "cube")
+
+
+@st.cache_resource(show_spinner="Loading transactions...")
+def get_snapshot_watcher(path, backend, _tracer=None):
+    # One watcher per workbook, shared by every session. Its thread notices a replaced workbook or
+    # an appended batch (see ingest.py), builds the new cube, indexes and sketches in the background
+    # and then swaps them in, so no session waits for a rebuild.
+    return SnapshotWatcher(path, backend, tracer=_tracer or Tracer()).start()
+
+
+with tracer.span('load') as span:
+    snapshot_watcher = get_snapshot_watcher(transactions_path, backend, tracer)
+    # This run reads one snapshot throughout, even if a newer one is swapped in meanwhile
+    snapshot = snapshot_watcher.snapshot
+    transactions_store = snapshot.store
+    span.rows = transactions_store.rows
+
+
+# Date trends come from the database itself, or from the Date-sorted index next to the cube
+def get_trend_source():
+    return transactions_store if snapshot.time_index is None else snapshot.time_index
+
 
 # Streamlit layout
 st.title("Business Insights Dashboard")
@@ -74,361 +64,383 @@ st.sidebar.title("""
 **🚀 Battle of Insight**
 """)
 
+# The background reload keeps serving the last good snapshot when a new workbook cannot be loaded
+if snapshot_watcher.error is not None:
+    loaded_at = pd.Timestamp(snapshot.loaded_at, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+    st.sidebar.warning(f"Reloading the dataset failed ({snapshot_watcher.error}); showing the data loaded at {loaded_at} UTC.")
+
 # Select for store types (Multiple selection allowed)
 store_type = st.sidebar.multiselect(
     'Select Store Type(s):',
-    options=transactions_df['Store_Type'].unique(),
-    default=transactions_df['Store_Type'].unique()
+    options=transactions_store.options('Store_Type'),
+    default=transactions_store.options('Store_Type')
 )
 
 # Select for seasons (Multiple selection allowed)
 season = st.sidebar.multiselect(
     'Select Season(s):',
-    options=transactions_df['Season'].unique(),
-    default=transactions_df['Season'].unique()
+    options=transactions_store.options('Season'),
+    default=transactions_store.options('Season')
 )
 
 # Select for cities (Multiple selection allowed)
 city = st.sidebar.multiselect(
     'Select City(s):',
-    options=transactions_df['City'].unique(),
-    default=transactions_df['City'].unique()
+    options=transactions_store.options('City'),
+    default=transactions_store.options('City')
 )
 
 # Range selector for Amount ($)
+amount_bounds = tuple(int(bound) for bound in transactions_store.amount_bounds())
 min_amount, max_amount = st.sidebar.slider(
     "Select Transaction Amount Range ($)",
-    min_value=int(transactions_df['Amount($)'].min()),
-    max_value=int(transactions_df['Amount($)'].max()),
-    value=(int(transactions_df['Amount($)'].min()), int(transactions_df['Amount($)'].max())),
+    min_value=amount_bounds[0],
+    max_value=amount_bounds[1],
+    value=amount_bounds,
     step=1
 )
 
-# Filter data based on selections
-filtered_data = transactions_df[ 
-    (transactions_df['Store_Type'].isin(store_type)) & 
-    (transactions_df['Season'].isin(season)) & 
-    (transactions_df['City'].isin(city)) & 
-    (transactions_df['Amount($)'] >= min_amount) & 
-    (transactions_df['Amount($)'] <= max_amount)
-]
-
-# --- Show All Questions and Answers on Homepage ---
-st.header("All Questions and Answers")
-
-# Question 1: Average Transaction Amount Across Store Types by Season
-st.subheader("📊 1. What is the average transaction amount ($) across different store types, and how does it vary by season?")
-st.write("""
-This section shows the average transaction amounts across different store types and seasons.
-By understanding these trends, businesses can identify which store types perform best in each season.
-""")
-st.dataframe(average_transaction_by_store_season, use_container_width=True)
-
-# Visualization for Question 1
-# Set a professional theme
-sns.set_theme(style="whitegrid")
-
-# Define color palettes for each chart
-color_palettes = [
-    sns.color_palette(["#dae9e4"]), 
-    sns.color_palette(["#dfecfd"]),  
-    sns.color_palette(["#e2caec"]),
-    sns.color_palette(["#eac2e4"]), 
-    sns.color_palette(["#fcd5ce"]), 
-    sns.color_palette(["#fdeed7"]),  
-]
-
-# Get unique store types
-store_types = average_transaction_by_store_season['Store Type'].unique()
-
-# Ensure we only plot the first 6 charts
-store_types = store_types[:6]
-
-# Define insights for each chart
-chart_insights = [
-    "Perform best in spring (53.54) and summer (53.35), with a noticeable dip in winter (51.60). Seasonality plays a significant role in customer activity.",
-    "Exhibit stable performance across all seasons, with summer (52.78) and winter (52.58) being slightly stronger than fall (51.38).",
-    "Winter shows the highest performance (53.22), likely driven by seasonal demand for healthcare products, while summer (52.05) is the weakest.",
-    "Thrive in summer (53.59) and spring (53.52), indicating customer preference for niche products during warmer months, while winter and fall show similar lower performance levels (~51.8).",
-    "Experience consistent demand year-round, peaking slightly in spring (52.69), while summer dips (51.44).",
-    "Perform best in summer (53.01) and fall (52.03), with slightly lower performance in spring and winter (~51.6–51.8).",
-]
-
-# Create individual charts for each store type
-for idx, store_type in enumerate(store_types, start=1):
-    # Create the plot for the current store type
-    fig, ax = plt.subplots(figsize=(8, 5))
-    store_data = average_transaction_by_store_season[average_transaction_by_store_season['Store Type'] == store_type]
-    
-    # Create the barplot
-    sns.barplot(
-        data=store_data,
-        x='Season',
-        y='Average Transaction Amount ($)',
-        ax=ax,
-        palette=color_palettes[idx - 1]  # Use a unique color for each chart
+# Date range; a narrowed range is answered from the Date-sorted index instead of the cube
+date_bounds = transactions_store.date_bounds()
+date_range = None
+if date_bounds is not None:
+    date_range = st.sidebar.date_input(
+        "Select Date Range",
+        value=date_bounds,
+        min_value=date_bounds[0],
+        max_value=date_bounds[1]
     )
-    
-    # Add data points on bars
-    for bar in ax.patches:
-        value = bar.get_height()
-        ax.text(
-            bar.get_x() + bar.get_width() / 2,
-            value + 1,  # Slightly above the bar
-            f"${value:.2f}",
-            ha='center',
-            va='bottom',
-            fontsize=15,
-            color="white",
-            weight='bold',
-            bbox=dict(boxstyle="round,pad=0.2", edgecolor="none", facecolor="black")
+    # While the end of the range is still being picked, the range is the single day chosen so far
+    date_range = (date_range[0], date_range[-1]) if date_range else date_bounds
+
+# Approximate mode: Q2 and the extra summaries come from sketches whose size does not grow with the data
+approximate_mode = st.sidebar.toggle(
+    "Approximate mode (sketches)",
+    value=False,
+    help="Answer from t-digest, top-k and HyperLogLog sketches; approximate answers show their error bounds."
+)
+high_value_percentile = None
+if approximate_mode:
+    high_value_cut = st.sidebar.radio("High-value cut for Q2", options=["Mean", "Percentile"], horizontal=True)
+    if high_value_cut == "Percentile":
+        high_value_percentile = st.sidebar.slider("Amount percentile", min_value=50, max_value=99, value=90, step=1)
+
+# Debug panel: per-stage timings of this run, filled in once the page has been drawn
+st.sidebar.checkbox(
+    "Debug: stage timings",
+    key='debug_timings',
+    help="Time every stage of this run (load, parse, compute, render, emit) with its row count and memory delta."
+)
+debug_panel = st.sidebar.container()
+
+
+def show_debug_panel():
+    if not tracer.enabled:
+        return
+    tracer.export()
+    spans = pd.DataFrame(tracer.records())
+    with debug_panel:
+        st.write(f"**Stage timings** ({len(spans)} spans)")
+        st.dataframe(
+            spans.assign(
+                ms=spans['seconds'] * 1000,
+                memory_delta_mb=spans['memory_delta_bytes'] / 2**20,
+            )[['stage', 'parent', 'ms', 'rows', 'memory_delta_mb']],
+            width='stretch',
+            hide_index=True
         )
-    
-    # Set the title and adjust axes
-    ax.set_title(f"Chart {idx:02}: Average Transaction Amount for {store_type}", fontsize=17, weight='bold')
-    ax.set_xlabel('')
-    ax.set_ylabel('')
-    ax.set_ylim(0, average_transaction_by_store_season['Average Transaction Amount ($)'].max() * 1.2)  # Consistent y-axis
-
-    # Remove y-axis labels and ticks
-    ax.set_yticks([])  # Hide y-axis ticks
-    ax.tick_params(left=False)  # Hide left axis
-
-    # Customize x-axis labels
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0, fontsize=15, fontweight='bold')  # Make x-axis text bold and larger
-
-    # Adjust layout for spacing
-    fig.tight_layout()
-    
-    # Show the plot
-    st.pyplot(fig)
-    
-    # Display insights specific to the chart
-    st.write(f"""
-    **Insights for Chart {idx}: ({store_type})**
-    
-    {chart_insights[idx - 1]}
-    """)
-
+        st.download_button("Export JSON lines", tracer.json_lines(), file_name="timings.jsonl", mime="application/jsonl")
+        st.download_button("Export Prometheus text", tracer.prometheus(), file_name="timings.prom", mime="text/plain")
 
 
-# Question 2: Most Common Payment Method for High-Value Transactions Across Cities
-st.subheader("💳 2. Which payment method is most commonly used in high-value transactions (above the average transaction amount), and how does it differ across cities?")
-st.write("""
-This section highlights the most common payment methods for transactions exceeding the average transaction amount across various cities.
-Understanding this can help businesses refine their payment method strategies.
-""")
-st.dataframe(most_common_payment_method, use_container_width=True)
+# Filter data based on selections: the filters pick cube cells (and an amount range within them),
+# and every answer below is rolled up from those cells without touching the raw rows. The cube has
+# no Date dimension, so a narrowed date range instead slices the Date-sorted index by binary search.
+# The SQLite backend pushes every filter, dates included, down into its queries.
+with tracer.span('filter') as span:
+    filters = filters_from_sidebar(store_type, season, city, (min_amount, max_amount), amount_bounds, date_range, date_bounds)
+    if filters.date_range is None or backend == "sqlite":
+        filtered_data = transactions_store.select(filters)
+    else:
+        filtered_data = snapshot.time_index.select(filters)
+    filtered_count = filtered_data.totals()[0]
+    span.rows = filtered_count
 
-# Visualization for Question 2
-# Set a professional theme
-sns.set_theme(style="whitegrid")
 
-# Define the custom color palette
-custom_palette = ['#dae9e4', '#dfecfd', '#e2caec', '#fdeed7']
+def compute_question(question):
+    """Answers of one question for the current filters; only the open tab's question is computed."""
+    with tracer.span(f"compute {question}", rows=filtered_count):
+        return QUESTIONS[question](filtered_data)
 
-# Visualization for Most Common Payment Methods for High-Value Transactions Across Cities
-fig, ax = plt.subplots(figsize=(10, 6))
 
-# Adjust city labels to display two-word names on separate lines
-most_common_payment_method['City'] = most_common_payment_method['City'].apply(lambda x: "\n".join(x.split()))
+def show_insights(heading, lines):
+    """Generated insight lines as a bulleted list under a bold heading."""
+    st.markdown("\n".join([f"**{heading}**", "", *(f"- {line}" for line in lines)]))
 
-# Create the barplot with the custom color palette
-sns.barplot(
-    data=most_common_payment_method,
-    x='City',
-    y='Count',
-    hue='Payment_Method',
-    ax=ax,
-    palette=custom_palette
-)
 
-# Add data points on bars
-for bar in ax.patches:
-    value = bar.get_height()
-    if value > 0:  # Avoid labels for empty bars
-        ax.text(
-            bar.get_x() + bar.get_width() / 2,
-            value + 10,  # Adjust space above the bars (increase if needed)
-            f"{int(value)}",  # Display count as an integer
-            ha='center',
-            va='bottom',
-            fontsize=12,
-            color="white",
-            weight='bold',
-            bbox=dict(boxstyle="round,pad=0.2", edgecolor="none", facecolor="black")
+def show_effects(intervals, differences, description):
+    """Bootstrap intervals and the difference test behind one question, in an expander."""
+    with st.expander(f"Is the difference real? {description}"):
+        st.caption(
+            f"{CONFIDENCE:.0%} bootstrap confidence intervals of the mean transaction amount ($) from {REPLICATES:,} "
+            "resamples. A difference is significant when its interval excludes zero."
         )
+        st.dataframe(differences, width='stretch', hide_index=True)
+        st.dataframe(intervals, width='stretch', hide_index=True)
 
-# Add title and labels
-ax.set_title('Most Common Payment Methods for High-Value Transactions Across Cities', fontsize=17, weight='bold')
-ax.set_xlabel('', fontsize=14, weight='bold')  # No explicit label for the x-axis
-ax.set_ylabel('', fontsize=14, weight='bold')  # No explicit label for the y-axis
-
-# Remove y-axis ticks for a cleaner look
-ax.set_yticks([])
-ax.tick_params(left=False)
 
-# Customize x-axis labels (keep bold styling and adjust size)
-ax.set_xticklabels(ax.get_xticklabels(), rotation=0, fontsize=12, fontweight='bold')
+def question_charts(question, answers):
+    """(specs, PNG images) of one question's charts. Images are cached across reruns and sessions;
+    misses are drawn together in a process pool, importing the plotting stack on first use."""
+    specs = QUESTION_CHART_SPECS[question](answers)
+    with tracer.span(f"render {question} charts", rows=len(specs)):
+        return specs, render_charts(specs, tracer=tracer)
 
-# Customize legend
-ax.legend(title="Payment Method", fontsize=12, title_fontsize=13)
 
-# Adjust the ylim to create space above the bars
-ax.set_ylim(0, ax.get_ylim()[1] * 1.2)  # Add extra space at the top of the bars
+# --- Show All Questions and Answers on Homepage ---
+st.header("All Questions and Answers")
+st.caption(f"Showing {filtered_count:,} of {transactions_store.rows:,} transactions matching the sidebar filters.")
+if not filtered_count:
+    st.warning("No transactions match the selected filters.")
+    show_debug_panel()
+    st.stop()
+
+# One tab per question. Switching tabs reruns the script, and only the open tab computes its answer
+# and renders its charts, so a rerun costs one question rather than five
+q1_tab, q2_tab, q3_tab, q4_tab, q5_tab, customers_tab = st.tabs(
+    ["1. Store types by season", "2. High-value payments", "3. Discount sales", "4. Top cities", "5. Promotions", "6. Customers"],
+    key='question_tab',
+    on_change="rerun"
+)
 
-# Adjust layout to prevent label overlap
-fig.tight_layout()
+# Question 1: Average Transaction Amount Across Store Types by Season
+with q1_tab:
+    if q1_tab.open:
+        with tracer.span('emit Q1'):
+            q1_answers = compute_question('Q1')
+            average_transaction_by_store_season = q1_answers['average_transaction_by_store_season']
+            store_season_specs, store_season_charts = question_charts('Q1', q1_answers)
+            store_types = [args[1] for _, args, _ in store_season_specs]
 
-# Show the plot in Streamlit
-st.pyplot(fig)
+            st.subheader("📊 1. What is the average transaction amount ($) across different store types, and how does it vary by season?")
+            st.write("""
+            This section shows the average transaction amounts across different store types and seasons.
+            By understanding these trends, businesses can identify which store types perform best in each season.
+            """)
+            st.dataframe(average_transaction_by_store_season, width='stretch')
 
+            # Visualization for Question 1
+            # Insights for each store type's chart, generated from the averages above
+            chart_insights = question_insights('Q1', q1_answers)
 
-# Insights for the chart
-st.write("""
-**Insights for Question 2:**
+            # Show the individual chart for each store type
+            for idx, (store_type, chart) in enumerate(zip(store_types, store_season_charts), start=1):
+                st.image(chart, width='stretch')
 
-- **Mobile Payments:** Dominant in cities like Atlanta (506) and New York (510), reflecting a tech-savvy customer base and growing adoption of digital solutions for high-value transactions.
+                # Display insights specific to the chart
+                show_insights(f"Insights for Chart {idx}: ({store_type})", chart_insights.get(store_type, []))
 
-- **Cash Payments:** Significant in Boston (485), Chicago (516), and Houston (492), highlighting the continued preference for traditional payment methods in these cities.
 
-- **Debit Cards:** Preferred in Dallas (538) and Seattle (512), showcasing a trend toward secure and direct payment methods for substantial purchases.
 
-- **Credit Cards:** Common in Miami (489) and San Francisco (504), likely driven by their flexibility, rewards, and credit benefits, making them a top choice for high-spending customers.
-""")
+# Question 2: Most Common Payment Method for High-Value Transactions Across Cities
+with q2_tab:
+    if q2_tab.open:
+        with tracer.span('emit Q2'):
+            if approximate_mode:
+                # Only the sketches are read; the exact answer is never computed in this mode
+                with tracer.span('compute sketches', rows=filtered_count):
+                    # Sketches are kept per filter cell over all dates, so the date range does not narrow them
+                    sketch_selection = snapshot.sketches.select(replace(filters, date_range=None))
+                    high_value_amount, high_value_low, high_value_high = sketch_selection.high_value_cut(high_value_percentile)
+                    q2_answers = {
+                        'most_common_payment_method': sketch_selection.most_common_payment_method(high_value_amount),
+                    }
+            else:
+                q2_answers = compute_question('Q2')
+            most_common_payment_method = q2_answers['most_common_payment_method']
+            _, (payment_method_chart,) = question_charts('Q2', q2_answers)
+
+            st.subheader("💳 2. Which payment method is most commonly used in high-value transactions (above the average transaction amount), and how does it differ across cities?")
+            st.write("""
+            This section highlights the most common payment methods for transactions exceeding the average transaction amount across various cities.
+            Understanding this can help businesses refine their payment method strategies.
+            """)
+            if approximate_mode:
+                cut_name = "mean" if high_value_percentile is None else f"{high_value_percentile}th percentile"
+                st.caption(
+                    f"Approximate: transactions above the {cut_name} amount of ${high_value_amount:,.2f} "
+                    f"(between ${high_value_low:,.2f} and ${high_value_high:,.2f}); counts are t-digest estimates ± their error bound. "
+                    "Sketches cover every date; the date range does not apply to them."
+                )
+            st.dataframe(most_common_payment_method, width='stretch')
+
+            # Visualization for Most Common Payment Methods for High-Value Transactions Across Cities
+            st.image(payment_method_chart, width='stretch')
+
+            if approximate_mode:
+                with st.expander("Approximate summaries"):
+                    st.caption("Heavy hitters and distinct customers cover every amount; the amount range filter does not apply to them.")
+                    st.write("Top payment methods per city (space-saving counts ± error bound)")
+                    st.dataframe(sketch_selection.top_payment_methods(), width='stretch')
+                    for column in ['Store_Type', 'City', 'Season']:
+                        st.write(f"Distinct customers by {column.replace('_', ' ').lower()} (HyperLogLog ± 1 standard error)")
+                        st.dataframe(sketch_selection.distinct_customers(column), width='stretch')
+
+
+            # Insights for the chart
+            show_insights("Insights for Question 2:", question_insights('Q2', q2_answers)['payment_method'])
 
 # Question 3: Sales Amounts With and Without Discounts Over the Month
-st.subheader("💸 3. Sales Amounts With and Without Discounts Over the Month")
-st.write("""
-This section compares the total sales amounts for transactions with and without discounts across the months.
-The goal is to identify the impact of discounts on sales and how it fluctuates throughout the year.
-""")
-st.dataframe(sales_with_without_discount, use_container_width=True)
-
-# Visualization for Question 3
-# Create the plot
-fig, ax = plt.subplots(figsize=(10, 6))
-
-# Plot the data with customization
-sales_with_without_discount.plot(kind='line', marker='o', ax=ax, 
-                                 linewidth=2, markersize=10, linestyle='--', 
-                                 color=['#a6c7b6', '#f8d28b'], markerfacecolor='black')
-
-# Set title and labels
-ax.set_title('Sales Amounts With and Without Discounts Over the Months', fontsize=17, weight='bold')
-ax.set_ylabel('Sales Amount ($)')
-
-# Set x-ticks and labels
-ax.set_xticks(range(12))  # Set fixed ticks
-ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
-ax.set_xlabel('')
-# Remove gridlines (both horizontal and vertical)
-ax.grid(False)
-
-# Display the plot
-st.pyplot(fig)
-
-st.write("""
-**Insights for Question 3:**
-
-- **Sales with Discount:** Generally higher than sales without discount, indicating that discounts have a positive impact on boosting sales. The largest difference in sales between the two categories occurs in March, where the discount led to a significant increase in sales.
-
-- **Sales without Discount:** Although lower than sales with discount, the sales without discount maintain a relatively stable trend, suggesting a consistent level of interest in the products even without price reductions.
-
-- **Key Months for Growth:** The months of March and December show the highest sales values in both categories, indicating peak shopping periods, possibly due to seasonal promotions or end-of-year buying behavior.
-
-- **Stable Performance in Mid-Year:** Between May and September, both sales categories show a slight dip, potentially reflecting a quieter sales period before the busy holiday season or due to external factors such as market conditions or consumer sentiment.
-""")
+with q3_tab:
+    if q3_tab.open:
+        with tracer.span('emit Q3'):
+            q3_answers = compute_question('Q3')
+            sales_with_without_discount = q3_answers['sales_with_without_discount']
+            _, (discount_sales_chart,) = question_charts('Q3', q3_answers)
+
+            st.subheader("💸 3. Sales Amounts With and Without Discounts Over the Month")
+            st.write("""
+            This section compares the total sales amounts for transactions with and without discounts across the months.
+            The goal is to identify the impact of discounts on sales and how it fluctuates throughout the year.
+            """)
+            st.dataframe(sales_with_without_discount, width='stretch')
+
+            # Visualization for Question 3
+            st.image(discount_sales_chart, width='stretch')
+
+            discount_intervals, discount_differences = effects(filtered_data, 'discount', tracer=tracer)
+            show_insights(
+                "Insights for Question 3:",
+                question_insights('Q3', q3_answers, discount_differences)['discount_sales']
+            )
+            show_effects(discount_intervals, discount_differences, "Mean transaction with a discount minus without, per month")
+
+            # Discount trend over time: the table above merges every year into twelve months; these
+            # views keep the years apart, at any granularity and year over year
+            st.subheader("Discount Sales Over Time")
+            st.caption("The months above combine every year. Here each period is its own point, and years are compared side by side.")
+            trend_source = get_trend_source()
+            trend_granularity = st.selectbox(
+                "Granularity",
+                options=GRANULARITIES,
+                index=GRANULARITIES.index('month'),
+                format_func=str.title,
+                key='trend_granularity'
+            )
+            year_over_year_granularity = st.radio(
+                "Year over year by",
+                options=list(PERIOD_OF_YEAR),
+                index=list(PERIOD_OF_YEAR).index('month'),
+                format_func=PERIOD_OF_YEAR.get,
+                horizontal=True,
+                key='year_over_year_granularity'
+            )
+            year_over_year_sales = st.radio(
+                "Sales",
+                options=["All", "With Discount", "No Discount"],
+                horizontal=True,
+                key='year_over_year_sales'
+            )
+            with tracer.span('compute Q3 trend', rows=filtered_count):
+                discount_trend = trend_source.discount_trend(trend_granularity, filters)
+                year_over_year = trend_source.year_over_year(
+                    year_over_year_granularity,
+                    filters,
+                    discount={"All": None, "With Discount": True, "No Discount": False}[year_over_year_sales]
+                )
+            with tracer.span('render Q3 trend charts', rows=2):
+                discount_trend_chart, year_over_year_chart = render_charts([
+                    ('discount_trend', (discount_trend, trend_granularity), {}),
+                    ('year_over_year', (year_over_year, f"{year_over_year_sales} Sales by {PERIOD_OF_YEAR[year_over_year_granularity]}, Year over Year"), {}),
+                ], tracer=tracer)
+            st.image(discount_trend_chart, width='stretch')
+            st.image(year_over_year_chart, width='stretch')
+            st.write("Year-over-year sales ($)")
+            st.dataframe(year_over_year, width='stretch')
 
 # Question 4: Top Cities with Highest Average Items Per Transaction
-st.subheader("🏙️ 4. What are the top three cities with the highest average number of items per transaction, and how do their sales amounts vary across seasons?")
-st.write("""
-This section displays the top cities with the highest average items per transaction, and how their sales vary across different seasons.
-""")
-st.dataframe(top_cities, use_container_width=True)
-st.write("Seasonal Sales for Top Cities")
-st.dataframe(sales_by_city_season, use_container_width=True)
-
-# Visualization for Question 4
-fig, ax = plt.subplots(2, 1, figsize=(10, 10), gridspec_kw={'height_ratios': [1, 2]})
-
-custom_palette4 = ['#dae9e4', '#dfecfd', '#e2caec', '#eac2e4', '#fcd5ce', '#fdeed7']
-# Average Items per Transaction
-sns.barplot(data=top_cities, x='City', y='Total_Items', ax=ax[0], palette=custom_palette4, hue='City')
-ax[0].set_title('Top Cities with Highest Average Items per Transaction', fontsize=17, weight='bold')
-ax[0].set_xlabel('')
-ax[0].set_ylabel('Total Items')
-ax[0].grid(False)
-
-st.write("""
-**Insights for Question 4 - Chart 1:**
+with q4_tab:
+    if q4_tab.open:
+        with tracer.span('emit Q4'):
+            q4_answers = compute_question('Q4')
+            top_cities = q4_answers['top_cities']
+            sales_by_city_season = q4_answers['sales_by_city_season']
+            _, (top_cities_chart,) = question_charts('Q4', q4_answers)
 
-- **Chicago:** Leads the list with the highest total items at 5.55, suggesting that customers in Chicago tend to purchase or interact with more items compared to those in other cities. This could indicate a higher demand or a more engaged consumer base in Chicago.
-
-- **Houston:** Follows closely with 5.53 total items, showing that Houston also has a strong market but slightly trails Chicago. This may point to a competitive market in Houston where consumers are still engaging with a large number of items.
-
-- **Miami:** Has the lowest total items at 5.52, but the difference is minimal compared to Chicago and Houston. This suggests that while Miami's market may be slightly less active, the overall engagement in the city is still comparable to the other two cities.
-
-- **Overall Trend:** The total items across these three cities are quite close, indicating a relatively balanced market presence, with only slight variations between each city's consumer behavior.
-""")
+            st.subheader("🏙️ 4. What are the top three cities with the highest average number of items per transaction, and how do their sales amounts vary across seasons?")
+            st.write("""
+            This section displays the top cities with the highest average items per transaction, and how their sales vary across different seasons.
+            """)
+            st.dataframe(top_cities, width='stretch')
+            st.write("Seasonal Sales for Top Cities")
+            st.dataframe(sales_by_city_season, width='stretch')
 
+            # Visualization for Question 4
+            q4_insights = question_insights('Q4', q4_answers)
+            show_insights("Insights for Question 4 - Chart 1:", q4_insights['top_cities'])
 
-# Seasonal Sales
-sns.barplot(data=sales_by_city_season, x='City', y='Amount($)', hue='Season', ax=ax[1], palette=custom_palette4)
-ax[1].set_title('Seasonal Sales Amounts for Top Cities', fontsize=17, weight='bold')
-ax[1].legend(title="Season", loc="upper right")
-ax[1].set_xlabel('')
-ax[1].grid(False)
-st.pyplot(fig)
 
-st.write("""
-**Insights for Question 4 - Chart 2:**
+            st.image(top_cities_chart, width='stretch')
 
-- **Chicago:** The highest sales occur in the Spring season, with $51,831.02, followed closely by Winter ($51,710). Fall and Summer sales are similar but slightly lower, at $50,343.27 and $51,261.90, respectively. This indicates that Chicago's consumers are most active in the Spring, which could be linked to seasonal promotions or increased purchasing activity during that time.
-
-- **Houston:** Fall leads in sales for Houston, with $52,117.66, followed by Spring ($50,387.61). Summer and Winter show the lowest figures, at $50,155.51 and $50,564.55, respectively. The seasonal trends suggest a strong preference for Fall, possibly due to factors like regional weather or local events that boost consumer spending.
-
-- **Miami:** Fall again shows the highest sales for Miami, at $52,999.92, with Spring following at $50,267.66. Miami's sales in Summer and Winter are noticeably lower, with Winter sales dropping to $47,964.04. This indicates that Miami’s consumers are more likely to purchase in the Fall, with less activity in the Winter, possibly due to holiday-related shifts in buying behavior.
-
-- **Overall Trends:** Fall is consistently the top-performing season across all cities, while Winter appears to be the weakest in Miami. Chicago and Houston show a more even distribution across seasons, with Miami having a distinct preference for Fall over the other seasons. This data suggests that seasonal factors and regional preferences play a significant role in sales trends.
-""")
+            show_insights("Insights for Question 4 - Chart 2:", q4_insights['sales_by_city_season'])
 
 
 # Question 5: Effectiveness of Promotions in Driving Higher Transaction Amounts
-st.subheader("🎯 5. How effective are different promotions in driving higher transaction amounts, and which promotion type performs best in each season?")
-st.write("""
-This section assesses how different promotions influence transaction amounts across various seasons.
-The goal is to identify which promotions are most effective at driving higher sales.
-""")
-st.dataframe(promotion_effectiveness, use_container_width=True)
-custom_palette5 = ['#dae9e4', '#dfecfd', '#e2caec', '#eac2e4', '#fcd5ce', '#fdeed7']
-# Visualization for Question 5
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.barplot(data=promotion_effectiveness, x='Season', y='Amount($)', hue='Promotion', ax=ax, palette=custom_palette5)
-ax.set_title('Effectiveness of Promotions in Driving Higher Transaction Amounts', fontsize=17, weight='bold')
-ax.set_xlabel('Season')
-ax.set_ylabel('Average Transaction Amount ($)')
-ax.legend(title="Promotion Type")
-ax.grid(False)
-ax.set_xlabel('')
-st.pyplot(fig)
-
-st.write("""
-**Insights for Question 5:**
-
-- **BOGO (Buy One Get One) Promotion:**
-    - **Summer** shows the highest sales for BOGO at $53,271.76, followed by **Winter** with $52,872.20. This suggests that BOGO promotions are most effective in the summer and winter, potentially due to heightened consumer demand during these seasons, such as summer shopping sprees or winter holidays.
-    - **Fall** and **Spring** show slightly lower sales for BOGO promotions, at $52,678.44 and $52,519.02, respectively. These promotions still drive significant sales, but are slightly less impactful compared to Summer and Winter.
-
-- **Discount on Selected Items:**
-    - **Spring** sees the highest sales for discounts at $53,177.15, which may be tied to seasonal clearances or special events boosting consumer spending during this time.
-    - **Fall** follows closely with $51,997.05, indicating that discounts on selected items are also highly effective during this season.
-    - **Summer** and **Winter** show similar sales, with Winter at $52,012.39 and Summer at $51,842.83. While still performing well, these seasons show a slight dip compared to Spring and Fall, suggesting that other factors may be influencing consumer purchasing behavior.
-
-- **Overall Trends:**
-    - **BOGO promotions** tend to drive slightly higher sales in **Summer** and **Winter**, while **Discounts on Selected Items** see the highest performance in **Spring** and **Fall**.
-    - The data suggests that specific promotions perform better during different seasons, highlighting the importance of aligning promotional strategies with seasonal trends to maximize sales.
-""")
+with q5_tab:
+    if q5_tab.open:
+        with tracer.span('emit Q5'):
+            q5_answers = compute_question('Q5')
+            promotion_effectiveness = q5_answers['promotion_effectiveness']
+            _, (promotion_chart,) = question_charts('Q5', q5_answers)
+
+            st.subheader("🎯 5. How effective are different promotions in driving higher transaction amounts, and which promotion type performs best in each season?")
+            st.write("""
+            This section assesses how different promotions influence transaction amounts across various seasons.
+            The goal is to identify which promotions are most effective at driving higher sales.
+            """)
+            st.dataframe(promotion_effectiveness, width='stretch')
+            # Visualization for Question 5
+            st.image(promotion_chart, width='stretch')
+
+            promotion_intervals, promotion_differences = effects(filtered_data, 'promotion', tracer=tracer)
+            show_insights(
+                "Insights for Question 5:",
+                question_insights('Q5', q5_answers, promotion_differences)['promotion']
+            )
+            show_effects(promotion_intervals, promotion_differences, "Best promotion's mean transaction minus the runner-up's, per season")
+
+# Customers: RFM segments and k-means clusters
+with customers_tab:
+    if customers_tab.open:
+        with tracer.span('emit customers'):
+            customer_segments = snapshot.customer_segments(tracer)
+            customer_segment_summary = segment_summary(customer_segments)
+            customer_cluster_summary = segment_summary(customer_segments, by='Cluster')
+            (customer_segments_chart,) = render_charts(
+                [('customer_segments', (customer_segment_summary,), {})], tracer=tracer
+            )
+
+            st.subheader("👥 6. Who are the customers, and which segments drive revenue?")
+            st.write("""
+            This section scores every customer on recency (days since their last purchase), frequency (number of purchases)
+            and monetary value (total spend), and groups them into segments and clusters with similar buying behavior.
+            """)
+            st.caption(
+                f"{len(customer_segments):,} customers over all transactions; the sidebar filters do not apply. "
+                "R, F and M are quintile scores from 1 (lowest) to 5 (best)."
+            )
+            st.dataframe(customer_segment_summary, width='stretch', hide_index=True)
+            st.image(customer_segments_chart, width='stretch')
+
+            st.write("K-means clusters on log recency, frequency and monetary value, numbered by average spend")
+            st.dataframe(customer_cluster_summary, width='stretch', hide_index=True)
+
+            with st.expander("Top customers by total spend"):
+                st.dataframe(
+                    customer_segments.nlargest(100, 'Monetary'),
+                    width='stretch',
+                    hide_index=True
+                )
 
 
 # Profile Section
@@ -476,3 +488,5 @@ st.markdown("""
         }
     </style>
 """, unsafe_allow_html=True)
+
+show_debug_panel()
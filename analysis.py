@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+
+from schema import category_codes, to_cents
+
+# Columns the five questions group by
+DIMENSIONS = [
+    'Store_Type', 'Season', 'City', 'Payment_Method', 'Discount_Applied', 'Promotion', 'Month', 'Customer_Category',
+]
+
+# Measures every aggregate carries; averages are derived as sum / count
+MEASURES = ['count', 'amount_sum', 'items_sum']
+
+# Groupings answer_questions reads without an amount threshold (Q2 adds City x Payment_Method above the mean)
+QUESTION_GROUPINGS = [
+    ['Store_Type', 'Season'], ['Month', 'Discount_Applied'], ['City'], ['City', 'Season'], ['Promotion', 'Season'],
+]
+
+
+def empty_aggregate(by):
+    return pd.DataFrame({column: [] for column in [*by, *MEASURES]})
+
+
+def amount_histogram_frame(by, labels, codes, cents):
+    """Long table of `by` labels, amount in cents and row count, sorted; rows with a missing label are dropped."""
+    keep = np.ones(len(cents), dtype=bool)
+    for column_codes in codes:
+        keep &= column_codes >= 0
+    if not keep.any():
+        return pd.DataFrame({column: [] for column in [*by, 'cents', 'count']})
+    sizes = [len(labels[column]) for column in by]
+    groups = np.ravel_multi_index([column_codes[keep] for column_codes in codes], sizes)
+    cents = cents[keep]
+    low = int(cents.min())
+    span = int(cents.max()) - low + 1
+    keys, count = np.unique(groups.astype(np.int64) * span + (cents - low), return_counts=True)
+    result = {}
+    for column, column_codes in zip(by, np.unravel_index(keys // span, sizes)):
+        result[column] = pd.Index(labels[column]).take(column_codes).to_numpy()
+    result['cents'] = keys % span + low
+    result['count'] = count
+    return pd.DataFrame(result)
+
+
+class FrameAggregator:
+    """Grouped counts and sums over transactions_df, computed on integer dimension codes.
+
+    Dimension codes are extracted once; each aggregate is a bincount over the (optionally
+    selected) rows, so a filtered re-aggregation gathers a few arrays instead of copying the frame.
+    """
+
+    def __init__(self, transactions_df):
+        self.codes = {}
+        self.labels = {}
+        for column in DIMENSIONS:
+            if column in transactions_df:
+                self.codes[column], self.labels[column] = category_codes(transactions_df[column])
+        self.amount = transactions_df['Amount($)'].to_numpy()
+        self.items = transactions_df['Total_Items'].to_numpy()
+
+    def select(self, rows=None):
+        return Selection(self, rows)
+
+
+class Selection:
+    """Aggregate source bound to one row selection (`None` for every row)."""
+
+    def __init__(self, aggregator, rows=None):
+        self.aggregator = aggregator
+        self.rows = rows
+
+    def column(self, values):
+        return values if self.rows is None else values[self.rows]
+
+    def totals(self):
+        """(count, amount_sum) of the selection."""
+        amount = self.column(self.aggregator.amount)
+        return len(amount), float(amount.sum(dtype=np.float64))
+
+    def aggregate(self, by, amount_above=None):
+        """Long table of `by` labels plus count, amount_sum and items_sum for every observed group.
+
+        Groups come back in sorted label order and rows with a missing label are dropped, like
+        `groupby(by, observed=True)`. `amount_above` keeps only rows with Amount($) above it.
+        """
+        aggregator = self.aggregator
+        codes = [self.column(aggregator.codes[column]) for column in by]
+        sizes = [len(aggregator.labels[column]) for column in by]
+        amount = self.column(aggregator.amount)
+        items = self.column(aggregator.items)
+        keep = np.ones(len(amount), dtype=bool)
+        for column_codes in codes:
+            keep &= column_codes >= 0
+        if amount_above is not None:
+            keep &= amount > amount_above
+        if not keep.all():
+            codes = [column_codes[keep] for column_codes in codes]
+            amount = amount[keep]
+            items = items[keep]
+        if not len(amount):
+            return empty_aggregate(by)
+        keys = np.ravel_multi_index(codes, sizes)
+        cells = int(np.prod(sizes))
+        count = np.bincount(keys, minlength=cells)
+        present = np.flatnonzero(count)
+        amount_sum = np.bincount(keys, weights=amount, minlength=cells)[present]
+        items_sum = np.bincount(keys, weights=items, minlength=cells)[present]
+        result = {}
+        for column, column_codes in zip(by, np.unravel_index(present, sizes)):
+            result[column] = pd.Index(aggregator.labels[column]).take(column_codes).to_numpy()
+        result['count'] = count[present]
+        result['amount_sum'] = amount_sum
+        result['items_sum'] = items_sum
+        return pd.DataFrame(result)
+
+    def amount_histogram(self, by):
+        """Rows per (`by` labels, amount in cents): the selection's amount distribution within each group."""
+        aggregator = self.aggregator
+        codes = [self.column(aggregator.codes[column]) for column in by]
+        return amount_histogram_frame(by, aggregator.labels, codes, to_cents(self.column(aggregator.amount)))
+
+
+# --- Questions ---
+def average_by(aggregate, by, measure, name):
+    result = aggregate[by].copy()
+    result[name] = aggregate[measure] / aggregate['count']
+    return result
+
+
+# --- Question 1: Average Transaction Amount Across Store Types by Season ---
+def store_season_averages(source):
+    q1 = average_by(source.aggregate(['Store_Type', 'Season']), ['Store_Type', 'Season'], 'amount_sum', 'Amount($)')
+    q1.columns = ['Store Type', 'Season', 'Average Transaction Amount ($)']
+    return {'average_transaction_by_store_season': q1.sort_values(by=['Store Type', 'Season'])}
+
+
+# --- Question 2: Most Common Payment Method for High-Value Transactions Across Cities ---
+def high_value_payment_methods(source):
+    count, amount_sum = source.totals()
+    average_transaction_amount = amount_sum / count if count else float('nan')
+    payment_method_by_city = source.aggregate(['City', 'Payment_Method'], amount_above=average_transaction_amount)
+    payment_method_by_city = payment_method_by_city[['City', 'Payment_Method', 'count']].rename(columns={'count': 'Count'})
+    return {
+        'average_transaction_amount': average_transaction_amount,
+        'most_common_payment_method': payment_method_by_city.loc[
+            payment_method_by_city.groupby('City')['Count'].idxmax()
+        ].sort_values(by='City'),
+    }
+
+
+# --- Question 3: Sales Amounts With and Without Discounts Over the Month ---
+def discount_sales_by_month(source):
+    sales = source.aggregate(['Month', 'Discount_Applied'])
+    sales_with_without_discount = (
+        sales.pivot(index='Month', columns='Discount_Applied', values='amount_sum')
+        .reindex(columns=[False, True])
+        .fillna(0)
+    )
+    sales_with_without_discount.columns = ['No Discount', 'With Discount']
+    return {'sales_with_without_discount': sales_with_without_discount}
+
+
+# --- Question 4: Top Cities with Highest Average Items Per Transaction ---
+def top_cities_by_items(source):
+    average_items_per_city = average_by(source.aggregate(['City']), ['City'], 'items_sum', 'Total_Items')
+    top_cities = average_items_per_city.nlargest(3, 'Total_Items')
+    sales_by_city_season = source.aggregate(['City', 'Season'])
+    sales_by_city_season = (
+        sales_by_city_season[sales_by_city_season['City'].isin(top_cities['City'])][['City', 'Season', 'amount_sum']]
+        .rename(columns={'amount_sum': 'Amount($)'})
+        .reset_index(drop=True)
+    )
+    return {'top_cities': top_cities, 'sales_by_city_season': sales_by_city_season}
+
+
+# --- Question 5: Effectiveness of Promotions in Driving Higher Transaction Amounts ---
+def promotion_effectiveness(source):
+    averages = average_by(
+        source.aggregate(['Promotion', 'Season']), ['Promotion', 'Season'], 'amount_sum', 'Amount($)'
+    )
+    return {
+        'promotion_effectiveness': averages.sort_values(
+            by=['Season', 'Amount($)', 'Promotion'], ascending=[True, False, True]
+        )
+    }
+
+
+# Each question reads an aggregate source and returns its entries of the answers dict
+QUESTIONS = {
+    'Q1': store_season_averages,
+    'Q2': high_value_payment_methods,
+    'Q3': discount_sales_by_month,
+    'Q4': top_cities_by_items,
+    'Q5': promotion_effectiveness,
+}
+
+
+def answer_questions(source):
+    """Compute the Q1-Q5 tables from an aggregate source (see Selection)."""
+    answers = {}
+    for question in QUESTIONS.values():
+        answers.update(question(source))
+    return answers
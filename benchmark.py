@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from analysis import QUESTIONS, answer_questions
+from bootstrap import effects
+from charts import question_chart_specs, render_png
+from cube import TransactionCube
+from customers import customer_segments
+from data_loader import build_columns, ensure_cache, load_cube, load_time_index, load_transactions
+from filters import Filters
+from shared import LRUCache
+from sqlite_store import load_database
+from synthetic import synthetic_path, write_synthetic
+from timeindex import TimeIndex
+from xlsx_stream import to_datetime_column
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# A stage regresses when it is this much slower or bigger than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and by more than these absolute margins, so sub-millisecond stages do not fail on noise
+SECONDS_SLACK = 0.005
+PEAK_MB_SLACK = 1.0
+
+# A typical narrowed sidebar selection
+SIDEBAR_FILTERS = Filters(
+    store_types=('Pharmacy', 'Supermarket', 'Warehouse Club'),
+    seasons=('Fall', 'Winter'),
+    cities=('Boston', 'Chicago', 'Miami', 'New York'),
+    amount_range=(20, 80),
+)
+# One month of the synthetic date span, answered from the Date-sorted index
+DATE_RANGE_FILTERS = Filters(date_range=(datetime.date(2022, 3, 1), datetime.date(2022, 3, 31)))
+
+
+def measure(function, repeat):
+    """(best wall time in seconds over `repeat` runs, peak traced memory in MB of one extra run)."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    # Memory is traced in its own run: tracemalloc slows Python-heavy stages down
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def fresh_cache_build(path):
+    cache_root = tempfile.mkdtemp(prefix="benchmark-cache-")
+    try:
+        ensure_cache(path, cache_root)
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+
+def dataset_stages(path):
+    """(stage name, callable) for one dataset, in dashboard order."""
+    # Warm the persistent cache once so the load stages measure a rerun, not a conversion
+    transactions_df = load_transactions(path)
+    cube = load_cube(path)
+    source = cube.select(Filters())
+    time_index = load_time_index(path)
+    database = load_database(path)
+    date_text = transactions_df['Date'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist()
+    _, specs = question_chart_specs(answer_questions(source))
+    stages = [
+        ('source_parse', lambda: build_columns(path)),
+        ('cache_build', lambda: fresh_cache_build(path)),
+        ('cache_load', lambda: load_transactions(path)),
+        ('cube_load', lambda: load_cube(path)),
+        ('date_parsing', lambda: to_datetime_column(date_text)),
+        ('cube_build', lambda: TransactionCube.from_frame(transactions_df)),
+    ]
+    stages += [(name.lower(), lambda question=question: question(source)) for name, question in QUESTIONS.items()]
+    stages.append(('sidebar_filtering', lambda: answer_questions(cube.select(SIDEBAR_FILTERS))))
+    stages.append(('sqlite_filtering', lambda: answer_questions(database.select(SIDEBAR_FILTERS))))
+    stages.append(('time_index_build', lambda: TimeIndex(transactions_df)))
+    stages.append(('date_range_filtering', lambda: answer_questions(time_index.select(DATE_RANGE_FILTERS))))
+    stages.append(('discount_trend_week', lambda: time_index.discount_trend('week', Filters())))
+    stages.append(('customer_segments', lambda: customer_segments(transactions_df)))
+    # A fresh cache each run, so the stage times the bootstrap rather than a cache hit
+    stages.append(('bootstrap_effects', lambda: [effects(source, effect, cache=LRUCache(max_entries=256)) for effect in ('discount', 'promotion')]))
+    counts = {}
+    for spec in specs:
+        counts[spec[0]] = counts.get(spec[0], 0) + 1
+        stages.append((f"chart_{spec[0]}_{counts[spec[0]]}", lambda spec=spec: render_png(spec)))
+    return stages
+
+
+def run_benchmarks(scales, data_dir, repeat, seed=0):
+    results = {}
+    os.makedirs(data_dir, exist_ok=True)
+    for rows in scales:
+        path = synthetic_path(data_dir, rows)
+        if not os.path.exists(path):
+            print(f"Generating {path}...", flush=True)
+            write_synthetic(path, rows, seed)
+        results[str(rows)] = {}
+        for stage, function in dataset_stages(path):
+            seconds, peak_mb = measure(function, repeat)
+            results[str(rows)][stage] = {'seconds': seconds, 'peak_mb': peak_mb}
+            print(f"{rows:>12,}  {stage:<28} {seconds * 1000:>12.1f} ms {peak_mb:>10.1f} MB", flush=True)
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Lines describing every stage slower or bigger than its baseline beyond the tolerance."""
+    found = []
+    for rows, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(rows, {}).get(stage)
+            if reference is None:
+                continue
+            if result['seconds'] > reference['seconds'] * (1 + tolerance) + SECONDS_SLACK:
+                found.append(
+                    f"{rows} rows, {stage}: {result['seconds'] * 1000:.1f} ms vs baseline {reference['seconds'] * 1000:.1f} ms"
+                )
+            if result['peak_mb'] > reference['peak_mb'] * (1 + tolerance) + PEAK_MB_SLACK:
+                found.append(f"{rows} rows, {stage}: {result['peak_mb']:.1f} MB vs baseline {reference['peak_mb']:.1f} MB")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each dashboard stage on synthetic data and compare to a baseline.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000], help="Dataset scales, e.g. 100000 1000000 10000000")
+    parser.add_argument("--data-dir", default="./benchmark_data", help="Where the synthetic datasets are kept")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (the best is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    # Keep the table readable; plotting deprecation warnings are not what is being measured
+    warnings.simplefilter("ignore")
+
+    results = run_benchmarks(args.rows, args.data_dir, args.repeat)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as handle:
+                baseline = json.load(handle)
+        baseline.update(results)
+        with open(args.baseline, "w") as handle:
+            json.dump(baseline, handle, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one.")
+        return 0
+    with open(args.baseline) as handle:
+        found = regressions(results, json.load(handle), args.tolerance)
+    if found:
+        print(f"\nREGRESSIONS ({len(found)}) beyond {args.tolerance:.0%} of {args.baseline}:", file=sys.stderr)
+        for line in found:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print(f"\nNo regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import NULL_TRACER
+from shared import LRUCache, preload_in_workers, process_pool
+
+REPLICATES = 2000
+CONFIDENCE = 0.95
+SEED = 0
+
+# A group's amounts are resampled as a histogram of at most this many equal-count bins, each
+# standing for its mean amount. The sample mean stays exact and only the spread within a bin
+# (a few cents at most once a group has thousands of rows) is lost, so a replicate costs the
+# same on a thousand rows as on millions.
+MAX_BINS = 64
+# Groups up to this many rows are resampled row by row instead; drawing (replicates x rows) indices
+# is cheaper than a multinomial over the bins until a group reaches a few thousand rows
+DIRECT_ROWS = 1024
+
+# Effects behind Q5 and Q3: (cell column, compared column, fixed comparison order). Without an
+# order the two groups with the highest means are compared (the leader and its runner-up).
+EFFECTS = {
+    'promotion': ('Season', 'Promotion', None),
+    'discount': ('Month', 'Discount_Applied', [True, False]),
+}
+
+preload_in_workers(__name__)
+
+
+# --- Resampling ---
+def compress_histogram(cents, counts, max_bins=MAX_BINS):
+    """(amounts in dollars, counts) of a sorted cent histogram merged into at most `max_bins` equal-count bins."""
+    cents = np.asarray(cents, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(cents) <= max_bins:
+        return cents / 100, counts
+    before = np.cumsum(counts) - counts
+    bins = np.minimum(before * max_bins // counts.sum(), max_bins - 1)
+    binned = np.bincount(bins, weights=counts)
+    present = binned > 0
+    total = np.bincount(bins, weights=counts * cents)
+    return total[present] / binned[present] / 100, binned[present].astype(np.int64)
+
+
+def replicate_means(values, counts, replicates, rng):
+    """Means of `replicates` bootstrap resamples of a histogram, drawn in one array operation.
+
+    Resampling n rows with replacement is a multinomial draw of n over the bins, so every
+    replicate's mean is one row of a (replicates x bins) count matrix times the bin values;
+    small groups draw a (replicates x n) matrix of row indices instead.
+    """
+    rows = int(counts.sum())
+    if rows <= DIRECT_ROWS:
+        sample = np.repeat(values, counts)
+        return sample[rng.integers(0, rows, size=(replicates, rows))].mean(axis=1)
+    draws = rng.multinomial(rows, counts / rows, size=replicates)
+    return draws @ values / rows
+
+
+def cell_seed(seed, cell):
+    """Seed of one cell, independent of which other cells are resampled and of the worker that runs it."""
+    # NumPy and Python scalars of the same label hash alike, so every backend draws the same resamples
+    return np.random.SeedSequence([seed, zlib.crc32(repr(np.asarray(cell).tolist()).encode())])
+
+
+def bootstrap_cell(task):
+    """Intervals and the difference test of one cell. `task` is
+    (cell, [(group, amounts, counts), ...], order, replicates, confidence, seed); runs in a worker."""
+    cell, groups, order, replicates, confidence, seed = task
+    rngs = [np.random.default_rng(child) for child in cell_seed(seed, cell).spawn(len(groups))]
+    tail = (1 - confidence) / 2
+    means = {}
+    intervals = []
+    for (group, values, counts), rng in zip(groups, rngs):
+        replicated = replicate_means(values, counts, replicates, rng)
+        means[group] = (counts @ values / counts.sum(), replicated)
+        low, high = np.quantile(replicated, [tail, 1 - tail])
+        intervals.append((cell, group, int(counts.sum()), means[group][0], low, high))
+    if order is None:
+        compared = sorted(means, key=lambda group: -means[group][0])[:2]
+    else:
+        compared = [group for group in order if group in means]
+    if len(compared) < 2:
+        return intervals, None
+    (group, versus) = compared
+    difference = means[group][0] - means[versus][0]
+    replicated = means[group][1] - means[versus][1]
+    low, high = np.quantile(replicated, [tail, 1 - tail])
+    # Two-sided: how often the resampled difference lands on either side of zero
+    p_value = min(1.0, 2 * min(np.mean(replicated <= 0), np.mean(replicated >= 0)))
+    return intervals, (cell, group, versus, difference, low, high, p_value, bool(low > 0 or high < 0))
+
+
+# --- Effects ---
+def bootstrap_tasks(histogram, cell, group, order, replicates, confidence, seed):
+    tasks = []
+    for cell_value, cell_rows in histogram.groupby(cell, sort=True):
+        groups = []
+        for group_value, group_rows in cell_rows.groupby(group, sort=True):
+            values, counts = compress_histogram(group_rows['cents'].to_numpy(), group_rows['count'].to_numpy())
+            groups.append((group_value, values, counts))
+        tasks.append((cell_value, groups, order, replicates, confidence, seed))
+    return tasks
+
+
+def bootstrap_effects(histogram, cell, group, order=None, replicates=REPLICATES, confidence=CONFIDENCE, seed=SEED,
+                      parallel=True, executor=None):
+    """Bootstrap confidence intervals of the mean Amount($) per (cell, group), and a test of the
+    difference between two groups' means within each cell.
+
+    `histogram` is an aggregate source's amount_histogram([cell, group]). Returns (intervals,
+    differences): intervals has the cell and group labels, Transactions, Mean, Low and High;
+    differences has the cell label, the two groups compared (Group minus Versus), Difference,
+    Low, High, p-value and Significant (the interval excludes zero). Cells are resampled in the
+    shared process pool (or `executor`) when there is more than one core; results depend only on
+    the data and `seed`.
+    """
+    tasks = bootstrap_tasks(histogram, cell, group, order, replicates, confidence, seed)
+    if executor is not None:
+        results = list(executor.map(bootstrap_cell, tasks))
+    elif parallel and len(tasks) > 1 and (os.cpu_count() or 1) > 1:
+        results = list(process_pool().map(bootstrap_cell, tasks))
+    else:
+        results = [bootstrap_cell(task) for task in tasks]
+    intervals = pd.DataFrame(
+        [row for cell_intervals, _ in results for row in cell_intervals],
+        columns=[cell, group, 'Transactions', 'Mean', 'Low', 'High'],
+    )
+    differences = pd.DataFrame(
+        [difference for _, difference in results if difference is not None],
+        columns=[cell, 'Group', 'Versus', 'Difference', 'Low', 'High', 'p-value', 'Significant'],
+    )
+    return intervals, differences
+
+
+def effects_key(histogram, *params):
+    """Content address of an effects computation: the amount histogram and every parameter."""
+    digest = hashlib.sha256(repr((list(histogram.columns), params)).encode())
+    digest.update(pd.util.hash_pandas_object(histogram, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# (intervals, differences) keyed by effects_key
+effects_cache = LRUCache(max_entries=256)
+
+
+def effects(source, effect, replicates=REPLICATES, confidence=CONFIDENCE, seed=SEED, cache=effects_cache,
+            tracer=NULL_TRACER):
+    """(intervals, differences) of one of EFFECTS for an aggregate source's selection.
+
+    Only the amount histogram is read from the source; the bootstrap itself is cached on the
+    histogram's content, so a rerun with the same data and filters costs the histogram alone.
+    """
+    cell, group, order = EFFECTS[effect]
+    with tracer.span(f"histogram {effect}") as span:
+        histogram = source.amount_histogram([cell, group])
+        span.rows = len(histogram)
+    key = effects_key(histogram, cell, group, order, replicates, confidence, seed, MAX_BINS)
+    result = cache.get(key)
+    if result is None:
+        with tracer.span(f"bootstrap {effect}", rows=int(histogram['count'].sum())):
+            result = bootstrap_effects(histogram, cell, group, order, replicates, confidence, seed)
+        cache.put(key, result)
+    return result
@@ -0,0 +1,389 @@
+import calendar
+import hashlib
+import io
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import NULL_TRACER
+from shared import LRUCache, preload_in_workers, process_pool
+
+# The plotting stack is imported on the first render (see load_plotting), not when this module loads
+PLOTTING_MODULES = ["matplotlib.pyplot", "seaborn"]
+# Render workers fork from a server that already imported the plotting stack (headless)
+preload_in_workers(__name__, *PLOTTING_MODULES, MPLBACKEND="Agg")
+plt = None
+sns = None
+plotting_lock = threading.Lock()
+
+# Bump when any chart's drawing code changes so cached images are not reused
+CHART_VERSION = 3
+
+# Matches st.pyplot's defaults
+SAVEFIG_OPTIONS = {'format': 'png', 'dpi': 200, 'bbox_inches': 'tight'}
+
+# Define color palettes for each Question 1 chart; store types beyond the sixth reuse them in order
+STORE_CHART_COLORS = ["#dae9e4", "#dfecfd", "#e2caec", "#eac2e4", "#fcd5ce", "#fdeed7"]
+
+# Define the custom color palettes
+PAYMENT_PALETTE = ['#dae9e4', '#dfecfd', '#e2caec', '#fdeed7']
+CITY_SEASON_PALETTE = ['#dae9e4', '#dfecfd', '#e2caec', '#eac2e4', '#fcd5ce', '#fdeed7']
+PROMOTION_PALETTE = ['#dae9e4', '#dfecfd', '#e2caec', '#eac2e4', '#fcd5ce', '#fdeed7']
+
+
+# --- Question 1 ---
+def draw_store_season_chart(store_data, store_type, idx, y_max, color):
+    # Create the plot for the current store type
+    fig, ax = plt.subplots(figsize=(8, 5))
+
+    # Create the barplot
+    sns.barplot(
+        data=store_data,
+        x='Season',
+        y='Average Transaction Amount ($)',
+        ax=ax,
+        palette=sns.color_palette([color])  # Use a unique color for each chart
+    )
+
+    # Add data points on bars
+    for bar in ax.patches:
+        value = bar.get_height()
+        ax.text(
+            bar.get_x() + bar.get_width() / 2,
+            value + 1,  # Slightly above the bar
+            f"${value:.2f}",
+            ha='center',
+            va='bottom',
+            fontsize=15,
+            color="white",
+            weight='bold',
+            bbox=dict(boxstyle="round,pad=0.2", edgecolor="none", facecolor="black")
+        )
+
+    # Set the title and adjust axes
+    ax.set_title(f"Chart {idx:02}: Average Transaction Amount for {store_type}", fontsize=17, weight='bold')
+    ax.set_xlabel('')
+    ax.set_ylabel('')
+    ax.set_ylim(0, y_max * 1.2)  # Consistent y-axis
+
+    # Remove y-axis labels and ticks
+    ax.set_yticks([])  # Hide y-axis ticks
+    ax.tick_params(left=False)  # Hide left axis
+
+    # Customize x-axis labels
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=0, fontsize=15, fontweight='bold')  # Make x-axis text bold and larger
+
+    # Adjust layout for spacing
+    fig.tight_layout()
+    return fig
+
+
+# --- Question 2 ---
+def draw_payment_method_chart(most_common_payment_method):
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    # Adjust city labels to display two-word names on separate lines
+    most_common_payment_method = most_common_payment_method.assign(
+        City=most_common_payment_method['City'].apply(lambda x: "\n".join(x.split()))
+    )
+
+    # Create the barplot with the custom color palette
+    sns.barplot(
+        data=most_common_payment_method,
+        x='City',
+        y='Count',
+        hue='Payment_Method',
+        ax=ax,
+        palette=sns.color_palette(PAYMENT_PALETTE, most_common_payment_method['Payment_Method'].nunique())
+    )
+
+    # Add data points on bars
+    for bar in ax.patches:
+        value = bar.get_height()
+        if value > 0:  # Avoid labels for empty bars
+            ax.text(
+                bar.get_x() + bar.get_width() / 2,
+                value + 10,  # Adjust space above the bars (increase if needed)
+                f"{int(value)}",  # Display count as an integer
+                ha='center',
+                va='bottom',
+                fontsize=12,
+                color="white",
+                weight='bold',
+                bbox=dict(boxstyle="round,pad=0.2", edgecolor="none", facecolor="black")
+            )
+
+    # Add title and labels
+    ax.set_title('Most Common Payment Methods for High-Value Transactions Across Cities', fontsize=17, weight='bold')
+    ax.set_xlabel('', fontsize=14, weight='bold')  # No explicit label for the x-axis
+    ax.set_ylabel('', fontsize=14, weight='bold')  # No explicit label for the y-axis
+
+    # Remove y-axis ticks for a cleaner look
+    ax.set_yticks([])
+    ax.tick_params(left=False)
+
+    # Customize x-axis labels (keep bold styling and adjust size)
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=0, fontsize=12, fontweight='bold')
+
+    # Customize legend
+    ax.legend(title="Payment Method", fontsize=12, title_fontsize=13)
+
+    # Adjust the ylim to create space above the bars
+    ax.set_ylim(0, ax.get_ylim()[1] * 1.2)  # Add extra space at the top of the bars
+
+    # Adjust layout to prevent label overlap
+    fig.tight_layout()
+    return fig
+
+
+# --- Question 3 ---
+def draw_discount_sales_chart(sales_with_without_discount):
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    # Plot the data with customization
+    sales_with_without_discount.plot(kind='line', marker='o', ax=ax,
+                                     linewidth=2, markersize=10, linestyle='--',
+                                     color=['#a6c7b6', '#f8d28b'], markerfacecolor='black')
+
+    # Set title and labels
+    ax.set_title('Sales Amounts With and Without Discounts Over the Months', fontsize=17, weight='bold')
+    ax.set_ylabel('Sales Amount ($)')
+
+    # Set x-ticks and labels at the months present (the index holds month numbers 1-12)
+    ax.set_xticks(sales_with_without_discount.index)
+    ax.set_xticklabels([calendar.month_abbr[month] for month in sales_with_without_discount.index])
+    ax.set_xlabel('')
+    # Remove gridlines (both horizontal and vertical)
+    ax.grid(False)
+    return fig
+
+
+def draw_discount_trend_chart(discount_trend, granularity):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    # Markers only where there are few enough periods to tell them apart
+    marker = 'o' if len(discount_trend) <= 60 else None
+    discount_trend.plot(kind='line', marker=marker, ax=ax, linewidth=2, color=['#a6c7b6', '#f8d28b'])
+    ax.set_title(f'Sales Amounts With and Without Discounts by {granularity.title()}', fontsize=17, weight='bold')
+    ax.set_ylabel('Sales Amount ($)')
+    ax.set_xlabel('')
+    ax.grid(False)
+    return fig
+
+
+def draw_year_over_year_chart(year_over_year, title):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    year_over_year.plot(kind='line', ax=ax, linewidth=2, marker='o' if len(year_over_year) <= 60 else None)
+    ax.set_title(title, fontsize=17, weight='bold')
+    ax.set_ylabel('Sales Amount ($)')
+    if year_over_year.index.name == 'Month':
+        ax.set_xticks(year_over_year.index)
+        ax.set_xticklabels([calendar.month_abbr[month] for month in year_over_year.index])
+        ax.set_xlabel('')
+    ax.legend(title='Year')
+    ax.grid(False)
+    return fig
+
+
+# --- Question 4 ---
+def draw_top_cities_chart(top_cities, sales_by_city_season):
+    fig, ax = plt.subplots(2, 1, figsize=(10, 10), gridspec_kw={'height_ratios': [1, 2]})
+
+    # Average Items per Transaction
+    sns.barplot(data=top_cities, x='City', y='Total_Items', ax=ax[0], palette=sns.color_palette(CITY_SEASON_PALETTE, len(top_cities)), hue='City')
+    ax[0].set_title('Top Cities with Highest Average Items per Transaction', fontsize=17, weight='bold')
+    ax[0].set_xlabel('')
+    ax[0].set_ylabel('Total Items')
+    ax[0].grid(False)
+
+    # Seasonal Sales
+    sns.barplot(data=sales_by_city_season, x='City', y='Amount($)', hue='Season', ax=ax[1],
+                palette=sns.color_palette(CITY_SEASON_PALETTE, sales_by_city_season['Season'].nunique()))
+    ax[1].set_title('Seasonal Sales Amounts for Top Cities', fontsize=17, weight='bold')
+    ax[1].legend(title="Season", loc="upper right")
+    ax[1].set_xlabel('')
+    ax[1].grid(False)
+    return fig
+
+
+# --- Question 5 ---
+def draw_promotion_chart(promotion_effectiveness):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(data=promotion_effectiveness, x='Season', y='Amount($)', hue='Promotion', ax=ax,
+                palette=sns.color_palette(PROMOTION_PALETTE, promotion_effectiveness['Promotion'].nunique()))
+    ax.set_title('Effectiveness of Promotions in Driving Higher Transaction Amounts', fontsize=17, weight='bold')
+    ax.set_xlabel('Season')
+    ax.set_ylabel('Average Transaction Amount ($)')
+    ax.legend(title="Promotion Type")
+    ax.grid(False)
+    ax.set_xlabel('')
+    return fig
+
+
+# --- Customers ---
+def draw_customer_segments_chart(segment_summary):
+    fig, ax = plt.subplots(1, 2, figsize=(12, 6))
+    # Plain labels: a categorical Segment would reserve a dodge slot for every category
+    segment_summary = segment_summary.assign(Segment=segment_summary['Segment'].astype(str))
+    palette = sns.color_palette(CITY_SEASON_PALETTE, len(segment_summary))
+    sns.barplot(data=segment_summary, x='Customers', y='Segment', hue='Segment', ax=ax[0], palette=palette)
+    ax[0].set_title('Customers per Segment', fontsize=17, weight='bold')
+    ax[0].set_ylabel('')
+    ax[0].grid(False)
+    revenue_share = segment_summary.assign(**{'Revenue Share (%)': segment_summary['Revenue Share'] * 100})
+    sns.barplot(data=revenue_share, x='Revenue Share (%)', y='Segment', hue='Segment', ax=ax[1], palette=palette)
+    ax[1].set_title('Share of Revenue', fontsize=17, weight='bold')
+    ax[1].set_ylabel('')
+    ax[1].set_yticklabels([])
+    ax[1].grid(False)
+    return fig
+
+
+CHARTS = {
+    'store_season': draw_store_season_chart,
+    'payment_method': draw_payment_method_chart,
+    'discount_sales': draw_discount_sales_chart,
+    'discount_trend': draw_discount_trend_chart,
+    'year_over_year': draw_year_over_year_chart,
+    'top_cities': draw_top_cities_chart,
+    'promotion': draw_promotion_chart,
+    'customer_segments': draw_customer_segments_chart,
+}
+
+
+def store_season_chart_specs(answers):
+    """Q1: one store-season chart per store type."""
+    average_transaction_by_store_season = answers['average_transaction_by_store_season']
+
+    # Get unique store types
+    store_types = average_transaction_by_store_season['Store Type'].unique()
+
+    y_max = average_transaction_by_store_season['Average Transaction Amount ($)'].max()
+    specs = [
+        (
+            'store_season',
+            (
+                average_transaction_by_store_season[average_transaction_by_store_season['Store Type'] == store_type],
+                store_type, idx, y_max, STORE_CHART_COLORS[(idx - 1) % len(STORE_CHART_COLORS)],
+            ),
+            {},
+        )
+        for idx, store_type in enumerate(store_types, start=1)
+    ]
+    return specs
+
+
+# Chart specs (kind, args, kwargs) of each question, built from its entries of the answers dict
+QUESTION_CHART_SPECS = {
+    'Q1': store_season_chart_specs,
+    'Q2': lambda answers: [('payment_method', (answers['most_common_payment_method'],), {})],
+    'Q3': lambda answers: [('discount_sales', (answers['sales_with_without_discount'],), {})],
+    'Q4': lambda answers: [('top_cities', (answers['top_cities'], answers['sales_by_city_season']), {})],
+    'Q5': lambda answers: [('promotion', (answers['promotion_effectiveness'],), {})],
+}
+
+
+def question_chart_specs(answers):
+    """(store types charted, specs) for all of Q1-Q5: the store-season charts, then the
+    payment-method, discount-sales, top-cities and promotion charts."""
+    specs = [spec for build_specs in QUESTION_CHART_SPECS.values() for spec in build_specs(answers)]
+    store_types = [args[1] for kind, args, _ in specs if kind == 'store_season']
+    return store_types, specs
+
+
+# --- Rendering ---
+def load_plotting():
+    """Import matplotlib (Agg backend) and seaborn once, on the first chart actually drawn."""
+    global plt, sns
+    with plotting_lock:
+        if plt is None:
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.pyplot
+            import seaborn
+
+            plt, sns = matplotlib.pyplot, seaborn
+
+
+def render_png(spec):
+    """Draw one chart spec (kind, args, kwargs) and return it as PNG bytes; the figure is always closed."""
+    load_plotting()
+    kind, args, kwargs = spec
+    # Set a professional theme
+    sns.set_theme(style="whitegrid")
+    fig = CHARTS[kind](*args, **kwargs)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, **SAVEFIG_OPTIONS)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def timed_render_png(spec):
+    """render_png plus its wall time, so renders done in worker processes can still be traced."""
+    started = time.perf_counter()
+    image = render_png(spec)
+    return image, time.perf_counter() - started
+
+
+def hash_value(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        digest.update(repr((list(frame.columns), list(map(str, frame.dtypes)), frame.index.names)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def chart_key(spec):
+    """Content address of a chart: its kind, input data and styling."""
+    kind, args, kwargs = spec
+    digest = hashlib.sha256(f"{CHART_VERSION}:{kind}".encode())
+    for value in args:
+        hash_value(digest, value)
+    for name in sorted(kwargs):
+        digest.update(name.encode())
+        hash_value(digest, kwargs[name])
+    return digest.hexdigest()
+
+
+# Rendered PNGs keyed by chart_key, capped by their total size
+chart_cache = LRUCache(max_entries=None, max_bytes=64 * 1024 * 1024)
+
+
+def render_charts(specs, cache=chart_cache, parallel=True, executor=None, tracer=NULL_TRACER):
+    """PNG bytes for every spec, reusing cached images and rendering the misses in parallel.
+
+    `executor` overrides the shared process pool (the batch report passes its own). Each miss is
+    recorded on `tracer` as a 'render <kind>' span.
+    """
+    keys = [chart_key(spec) for spec in specs]
+    images = [cache.get(key) for key in keys]
+    missing = {}
+    for position, (key, image) in enumerate(zip(keys, images)):
+        if image is None:
+            missing.setdefault(key, []).append(position)
+    if not missing:
+        return images
+    misses = [specs[positions[0]] for positions in missing.values()]
+    if executor is not None:
+        rendered = list(executor.map(timed_render_png, misses))
+    elif parallel and len(misses) > 1 and (os.cpu_count() or 1) > 1:
+        rendered = list(process_pool().map(timed_render_png, misses))
+    else:
+        rendered = [timed_render_png(spec) for spec in misses]
+    for spec, (_, seconds) in zip(misses, rendered):
+        tracer.record(f"render {spec[0]}", seconds)
+    for (key, positions), (image, _) in zip(missing.items(), rendered):
+        cache.put(key, image)
+        for position in positions:
+            images[position] = image
+    return images
+
+
+def render_chart(spec, cache=chart_cache, tracer=NULL_TRACER):
+    return render_charts([spec], cache, tracer=tracer)[0]
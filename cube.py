@@ -0,0 +1,385 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from analysis import DIMENSIONS, amount_histogram_frame, empty_aggregate
+from filters import filter_mask
+from schema import category_codes, extend_labels, to_cents
+
+# Amounts are held as integer cents so sums are exact; the offset keeps cents non-negative when
+# they are packed next to a cell id in one int64 sort key
+CENTS_OFFSET = 1 << 31
+CELL_SHIFT = 32
+
+# Appended runs are folded back into one once there are more than this many
+MAX_RUNS = 8
+CUBE_MANIFEST = "cube.json"
+
+
+def cents_bounds(amount_range):
+    """Inclusive cent bounds of a dollar range."""
+    low, high = amount_range
+    return int(np.ceil(round(low * 100, 6))), int(np.floor(round(high * 100, 6)))
+
+
+class AmountRun:
+    """Rows sorted by (cell, amount) with prefix sums of every measure.
+
+    Counts and sums over any amount range of any set of cells are two binary searches per cell and
+    a difference of prefix sums, which is what Q2's above-average cut and the amount slider need.
+    Appended batches each get their own run, so ingesting a delta never re-sorts the history.
+    """
+
+    ARRAYS = ['keys', 'amount_sum', 'amount_sumsq', 'items_sum', 'items_sumsq']
+
+    def __init__(self, keys, prefix, name=None):
+        self.keys = keys
+        self.prefix = prefix
+        # Directory name once persisted; unsaved runs have none
+        self.name = name
+        if len(keys):
+            # Cents of the first/last row of each cell bound the whole run
+            cents = (keys & ((1 << CELL_SHIFT) - 1)) - CENTS_OFFSET
+            self.cents_bounds = (int(cents.min()), int(cents.max()))
+        else:
+            self.cents_bounds = None
+
+    @classmethod
+    def build(cls, cell_ids, cents, items):
+        keys = (cell_ids.astype(np.int64) << CELL_SHIFT) | (cents + CENTS_OFFSET)
+        order = np.argsort(keys, kind='stable')
+        cents = cents[order]
+        items = items[order].astype(np.int64)
+        prefix = {
+            'amount_sum': np.concatenate([[0], np.cumsum(cents)]),
+            'amount_sumsq': np.concatenate([[0], np.cumsum(cents * cents)]),
+            'items_sum': np.concatenate([[0], np.cumsum(items)]),
+            'items_sumsq': np.concatenate([[0], np.cumsum(items * items)]),
+        }
+        return cls(keys[order], prefix)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row_values(self):
+        """Decode (cell_ids, cents, items) of every row in the run."""
+        keys = np.asarray(self.keys)
+        cells = keys >> CELL_SHIFT
+        cents = (keys & ((1 << CELL_SHIFT) - 1)) - CENTS_OFFSET
+        items = np.diff(np.asarray(self.prefix['items_sum']))
+        return cells, cents, items
+
+    def remap_cells(self, mapping):
+        cells, cents, items = self.row_values()
+        return AmountRun.build(mapping[cells], cents, items)
+
+    def range_stats(self, cell_ids, low_cents, high_cents):
+        """Per-cell count and sums for rows with low_cents <= cents <= high_cents."""
+        base = cell_ids.astype(np.int64) << CELL_SHIFT
+        start = np.searchsorted(self.keys, base | (low_cents + CENTS_OFFSET), side='left')
+        stop = np.searchsorted(self.keys, base | (high_cents + CENTS_OFFSET), side='right')
+        stats = {'count': stop - start}
+        for measure, prefix in self.prefix.items():
+            stats[measure] = prefix[stop] - prefix[start]
+        return stats
+
+    def save(self, directory):
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "keys.npy"), self.keys)
+        for measure, prefix in self.prefix.items():
+            np.save(os.path.join(directory, f"{measure}.npy"), prefix)
+        self.name = os.path.basename(directory)
+
+    @classmethod
+    def load(cls, directory):
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in cls.ARRAYS
+        }
+        keys = arrays.pop('keys')
+        return cls(keys, arrays, name=os.path.basename(directory))
+
+
+def to_json_label(label):
+    return label.item() if isinstance(label, np.generic) else label
+
+
+def read_cube_manifest(directory):
+    try:
+        with open(os.path.join(directory, CUBE_MANIFEST)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+class TransactionCube:
+    """Count, sum and sum of squares of Amount($) and Total_Items per combination of DIMENSIONS.
+
+    Built once at ingest. Every Q1-Q5 aggregate, filtered or not, is a rollup over the cells, so
+    query cost follows the number of occupied cells rather than the number of transactions.
+    Amount-dependent queries (the slider range and Q2's above-average cut) go through AmountRun.
+    """
+
+    def __init__(self, labels, cell_codes, measures, runs, date_bounds=None):
+        self.labels = labels
+        self.cell_codes = cell_codes
+        self.measures = measures
+        self.runs = runs
+        # (first, last) Date as int64 nanoseconds, for the sidebar's date filter; None when empty
+        self.date_span = date_bounds
+        # Dataset fingerprint recorded by the last save or load; None for a cube built in memory
+        self.content = None
+
+    @classmethod
+    def from_frame(cls, transactions_df):
+        labels = {}
+        codes = []
+        for column in DIMENSIONS:
+            column_codes, labels[column] = category_codes(transactions_df[column])
+            codes.append(column_codes.astype(np.int64) + 1)
+        # Shift codes by one so a missing value (-1) gets its own slot
+        sizes = [len(labels[column]) + 1 for column in DIMENSIONS]
+        keys = np.ravel_multi_index(codes, sizes)
+        cell_keys, cell_ids = np.unique(keys, return_inverse=True)
+        cell_codes = {
+            column: (column_codes - 1).astype(np.int32)
+            for column, column_codes in zip(DIMENSIONS, np.unravel_index(cell_keys, sizes))
+        }
+        cents = to_cents(transactions_df['Amount($)'].to_numpy())
+        items = transactions_df['Total_Items'].to_numpy().astype(np.int64)
+        cells = len(cell_keys)
+        measures = {
+            'count': np.bincount(cell_ids, minlength=cells).astype(np.int64),
+            'amount_sum': np.bincount(cell_ids, weights=cents, minlength=cells).astype(np.int64),
+            'amount_sumsq': np.bincount(cell_ids, weights=cents * cents, minlength=cells).astype(np.int64),
+            'items_sum': np.bincount(cell_ids, weights=items, minlength=cells).astype(np.int64),
+            'items_sumsq': np.bincount(cell_ids, weights=items * items, minlength=cells).astype(np.int64),
+        }
+        dates = transactions_df['Date'].dropna().to_numpy(dtype='datetime64[ns]').view(np.int64)
+        date_bounds = (int(dates.min()), int(dates.max())) if len(dates) else None
+        return cls(labels, cell_codes, measures, [AmountRun.build(cell_ids, cents, items)], date_bounds)
+
+    @property
+    def cells(self):
+        return len(self.measures['count'])
+
+    @property
+    def rows(self):
+        return int(self.measures['count'].sum())
+
+    def amount_bounds(self):
+        """(min, max) Amount($) in dollars."""
+        bounds = [run.cents_bounds for run in self.runs if len(run)]
+        if not bounds:
+            return 0.0, 0.0
+        return min(low for low, _ in bounds) / 100, max(high for _, high in bounds) / 100
+
+    def date_bounds(self):
+        """(first, last) transaction day as datetime.date, or None for an empty cube."""
+        if self.date_span is None:
+            return None
+        return tuple(pd.Timestamp(bound).date() for bound in self.date_span)
+
+    def options(self, column):
+        """Values of one dimension in sorted order, for the sidebar (labels themselves are kept in append order)."""
+        return sorted(self.labels[column])
+
+    def select(self, filters):
+        if filters.date_range is not None:
+            # Cells have no Date dimension; date ranges are answered by timeindex.TimeIndex
+            raise ValueError("The cube cannot filter by date range")
+        return CubeSelection(self, filters)
+
+    # --- Incremental updates ---
+    def merge(self, other):
+        """Return a cube holding the rows of both cubes (e.g. the history plus a new batch).
+
+        Labels are extended append-only and the other cube's cells are matched to existing
+        cells by their label combination, so the cost follows the other cube's size.
+        """
+        labels = {}
+        other_codes = {}
+        for column in DIMENSIONS:
+            labels[column], remap = extend_labels(self.labels[column], other.labels[column])
+            other_codes[column] = remap[other.cell_codes[column]]
+        sizes = [len(labels[column]) + 1 for column in DIMENSIONS]
+        own_keys = np.ravel_multi_index([self.cell_codes[column].astype(np.int64) + 1 for column in DIMENSIONS], sizes)
+        other_keys = np.ravel_multi_index([other_codes[column].astype(np.int64) + 1 for column in DIMENSIONS], sizes)
+        order = np.argsort(own_keys)
+        position = np.minimum(np.searchsorted(own_keys[order], other_keys), max(len(order) - 1, 0))
+        found = (own_keys[order][position] == other_keys) if len(order) else np.zeros(len(other_keys), dtype=bool)
+        mapping = np.empty(len(other_keys), dtype=np.int64)
+        mapping[found] = order[position[found]]
+        new_cells = np.flatnonzero(~found)
+        mapping[new_cells] = self.cells + np.arange(len(new_cells))
+        cell_codes = {
+            column: np.concatenate([self.cell_codes[column], other_codes[column][new_cells]]).astype(np.int32)
+            for column in DIMENSIONS
+        }
+        measures = {}
+        for measure, values in self.measures.items():
+            merged = np.concatenate([values, np.zeros(len(new_cells), dtype=np.int64)])
+            # `mapping` never repeats a cell, so a plain fancy-index add is safe
+            merged[mapping] += other.measures[measure]
+            measures[measure] = merged
+        runs = list(self.runs) + [run.remap_cells(mapping) for run in other.runs]
+        spans = [span for span in (self.date_span, other.date_span) if span is not None]
+        date_bounds = (min(low for low, _ in spans), max(high for _, high in spans)) if spans else None
+        cube = TransactionCube(labels, cell_codes, measures, runs, date_bounds)
+        if len(cube.runs) > MAX_RUNS:
+            cube = cube.compacted()
+        return cube
+
+    def compacted(self):
+        """Fold every run into one."""
+        parts = [run.row_values() for run in self.runs]
+        cells, cents, items = (np.concatenate([part[index] for part in parts]) for index in range(3))
+        return TransactionCube(
+            self.labels, self.cell_codes, self.measures, [AmountRun.build(cells, cents, items)], self.date_span
+        )
+
+    # --- Persistence ---
+    def save(self, directory, content=None):
+        """Write the cube; runs already on disk are kept, only new ones are written.
+
+        `content` names the stored dataset the cube covers (see data_loader.dataset_fingerprint),
+        so a cube left behind by an interrupted update is recognized as stale and rebuilt.
+        """
+        os.makedirs(directory, exist_ok=True)
+        previous = read_cube_manifest(directory)
+        generation = previous['generation'] + 1 if previous else 0
+        # Clear what an interrupted save left behind, so this generation's names are free
+        kept = {previous['cells'], *previous['runs']} if previous else set()
+        for name in os.listdir(directory):
+            if name not in kept and name != CUBE_MANIFEST and not name.startswith("."):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        cells_name = f"cells-{generation}"
+        cells_dir = os.path.join(directory, cells_name)
+        os.makedirs(cells_dir)
+        for column, codes in self.cell_codes.items():
+            np.save(os.path.join(cells_dir, f"{column}.npy"), codes)
+        for measure, values in self.measures.items():
+            np.save(os.path.join(cells_dir, f"{measure}.npy"), values)
+        for index, run in enumerate(self.runs):
+            if run.name is None or not os.path.isdir(os.path.join(directory, run.name)):
+                run.save(os.path.join(directory, f"run-{generation}-{index}"))
+        manifest = {
+            'generation': generation,
+            'labels': {column: [to_json_label(label) for label in labels] for column, labels in self.labels.items()},
+            'cells': cells_name,
+            'runs': [run.name for run in self.runs],
+            'date_bounds': None if self.date_span is None else list(self.date_span),
+            'content': content,
+        }
+        staging = os.path.join(directory, f".{CUBE_MANIFEST}.tmp")
+        with open(staging, "w") as handle:
+            json.dump(manifest, handle)
+        os.replace(staging, os.path.join(directory, CUBE_MANIFEST))
+        # Drop generations the new manifest no longer references
+        referenced = {cells_name, *manifest['runs'], CUBE_MANIFEST}
+        for name in os.listdir(directory):
+            if name not in referenced and not name.startswith("."):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory):
+        manifest = read_cube_manifest(directory)
+        # Cubes saved before date bounds were recorded are rebuilt
+        if manifest is None or 'date_bounds' not in manifest:
+            return None
+        cells_dir = os.path.join(directory, manifest['cells'])
+        cell_codes = {column: np.load(os.path.join(cells_dir, f"{column}.npy")) for column in DIMENSIONS}
+        measures = {
+            measure: np.load(os.path.join(cells_dir, f"{measure}.npy"))
+            for measure in ['count', 'amount_sum', 'amount_sumsq', 'items_sum', 'items_sumsq']
+        }
+        runs = [AmountRun.load(os.path.join(directory, name)) for name in manifest['runs']]
+        date_bounds = None if manifest['date_bounds'] is None else tuple(manifest['date_bounds'])
+        cube = cls(manifest['labels'], cell_codes, measures, runs, date_bounds)
+        cube.content = manifest.get('content')
+        return cube
+
+    # --- Cell-level statistics ---
+    def cell_mask(self, filters):
+        """Cells whose Store_Type, Season and City pass `filters`."""
+        return filter_mask(filters, self.labels, self.cell_codes.__getitem__, self.cells)
+
+    def cell_stats(self, cell_ids, low_cents=None, high_cents=None):
+        """Measures of the given cells, restricted to an inclusive cent range when one is given."""
+        if low_cents is None and high_cents is None:
+            return {measure: values[cell_ids] for measure, values in self.measures.items()}
+        low_cents = -CENTS_OFFSET if low_cents is None else max(low_cents, -CENTS_OFFSET)
+        high_cents = CENTS_OFFSET - 1 if high_cents is None else min(high_cents, CENTS_OFFSET - 1)
+        stats = None
+        for run in self.runs:
+            run_stats = run.range_stats(cell_ids, low_cents, high_cents)
+            stats = run_stats if stats is None else {measure: stats[measure] + run_stats[measure] for measure in stats}
+        return stats
+
+
+class CubeSelection:
+    """Aggregate source (same interface as analysis.Selection) answered from the cube."""
+
+    def __init__(self, cube, filters):
+        self.cube = cube
+        self.filters = filters
+        self.cell_ids = np.flatnonzero(cube.cell_mask(filters))
+        if filters.amount_range is None:
+            self.low_cents = self.high_cents = None
+        else:
+            self.low_cents, self.high_cents = cents_bounds(filters.amount_range)
+
+    def stats(self, amount_above=None):
+        low_cents = self.low_cents
+        if amount_above is not None:
+            # amount > t  <=>  cents >= floor(t * 100) + 1 for amounts held to the cent;
+            # nothing is above a NaN average (empty selection)
+            above = CENTS_OFFSET if np.isnan(amount_above) else int(np.floor(amount_above * 100)) + 1
+            low_cents = above if low_cents is None else max(low_cents, above)
+        return self.cube.cell_stats(self.cell_ids, low_cents, self.high_cents)
+
+    def totals(self):
+        """(count, amount_sum) of the selection."""
+        stats = self.stats()
+        return int(stats['count'].sum()), stats['amount_sum'].sum() / 100
+
+    def aggregate(self, by, amount_above=None):
+        """Rollup of the selected cells to `by`; same output as analysis.Selection.aggregate."""
+        cube = self.cube
+        stats = self.stats(amount_above)
+        codes = [cube.cell_codes[column][self.cell_ids] for column in by]
+        keep = stats['count'] > 0
+        for column_codes in codes:
+            keep &= column_codes >= 0
+        if not keep.any():
+            return empty_aggregate(by)
+        codes = [column_codes[keep] for column_codes in codes]
+        sizes = [len(cube.labels[column]) for column in by]
+        keys = np.ravel_multi_index(codes, sizes)
+        group_keys, groups = np.unique(keys, return_inverse=True)
+        result = {}
+        for column, column_codes in zip(by, np.unravel_index(group_keys, sizes)):
+            result[column] = pd.Index(cube.labels[column]).take(column_codes).to_numpy()
+        result['count'] = np.bincount(groups, weights=stats['count'][keep]).astype(np.int64)
+        result['amount_sum'] = np.bincount(groups, weights=stats['amount_sum'][keep]) / 100
+        result['items_sum'] = np.bincount(groups, weights=stats['items_sum'][keep])
+        return pd.DataFrame(result).sort_values(by, kind='stable').reset_index(drop=True)
+
+    def amount_histogram(self, by):
+        """Rows per (`by` labels, amount in cents), read from the selected cells' amount runs."""
+        cube = self.cube
+        selected = np.zeros(cube.cells, dtype=bool)
+        selected[self.cell_ids] = True
+        parts = []
+        for run in cube.runs:
+            cells, cents, _ = run.row_values()
+            keep = selected[cells]
+            if self.low_cents is not None:
+                keep &= (cents >= self.low_cents) & (cents <= self.high_cents)
+            parts.append((cells[keep], cents[keep]))
+        cells = np.concatenate([np.zeros(0, dtype=np.int64), *(part[0] for part in parts)])
+        cents = np.concatenate([np.zeros(0, dtype=np.int64), *(part[1] for part in parts)])
+        codes = [cube.cell_codes[column][cells] for column in by]
+        return amount_histogram_frame(by, cube.labels, codes, cents)
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from schema import category_codes
+
+# Recency, frequency and monetary value are each scored 1 (worst) to 5 (best) by quintile
+RFM_SCORES = 5
+DEFAULT_CLUSTERS = 4
+# Rows per MiniBatchKMeans step; a fit touches a few of these batches rather than every customer at once
+MINI_BATCH_SIZE = 4096
+
+# Named segments, checked in order; a customer takes the first whose scores match
+SEGMENTS = ['Champions', 'At Risk', 'Loyal Customers', 'New Customers', 'Hibernating', 'Potential Loyalists']
+
+
+def customer_metrics(transactions_df):
+    """One row per customer: recency in days (to the last transaction in the data), frequency,
+    monetary value, first and last purchase, and the Customer_Category of the latest purchase.
+
+    Customers are their integer Customer_Name codes. One sort by (customer, date) makes each
+    customer a contiguous run, so every metric is a single reduceat over the sorted rows.
+    """
+    codes, names = category_codes(transactions_df['Customer_Name'])
+    dates = transactions_df['Date'].to_numpy(dtype='datetime64[ns]')
+    keep = (codes >= 0) & ~np.isnat(dates)
+    rows = np.flatnonzero(keep)
+    order = rows[np.lexsort((dates[rows], codes[rows]))]
+    codes = codes[order]
+    dates = dates[order]
+    if not len(order):
+        return pd.DataFrame({
+            'Customer_Name': pd.Categorical([], categories=names), 'Recency': [], 'Frequency': [], 'Monetary': [],
+            'First_Purchase': pd.to_datetime([]), 'Last_Purchase': pd.to_datetime([]), 'Customer_Category': [],
+        })
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    amount = transactions_df['Amount($)'].to_numpy()[order].astype(np.float64)
+    category, categories = category_codes(transactions_df['Customer_Category'])
+    last_purchase = dates[ends]
+    return pd.DataFrame({
+        'Customer_Name': pd.Categorical.from_codes(codes[starts], categories=names),
+        'Recency': ((dates.max() - last_purchase) // np.timedelta64(1, 'D')).astype(np.int32),
+        'Frequency': np.diff(np.r_[starts, len(order)]).astype(np.int32),
+        'Monetary': np.add.reduceat(amount, starts),
+        'First_Purchase': dates[starts],
+        'Last_Purchase': last_purchase,
+        'Customer_Category': pd.Categorical.from_codes(category[order][ends], categories=categories),
+    })
+
+
+def quintile_scores(values):
+    """1-5 score of each value by its percentile rank. Ties share the lowest rank of their group, so
+    the many one-purchase customers all score 1 on frequency rather than landing mid-scale."""
+    percentile = pd.Series(values).rank(method='min', pct=True).to_numpy()
+    return np.clip(np.ceil(percentile * RFM_SCORES), 1, RFM_SCORES).astype(np.int8)
+
+
+def rfm_segments(metrics):
+    """metrics plus R, F and M scores, their 'RFM' code and a named Segment."""
+    recency = (RFM_SCORES + 1 - quintile_scores(metrics['Recency'])).astype(np.int8)
+    frequency = quintile_scores(metrics['Frequency'])
+    monetary = quintile_scores(metrics['Monetary'])
+    conditions = [
+        (recency >= 4) & (frequency >= 4) & (monetary >= 4),
+        (recency <= 2) & (frequency >= 3),
+        frequency >= 4,
+        (recency >= 4) & (frequency <= 2),
+        recency <= 2,
+    ]
+    segment_codes = np.select(conditions, np.arange(len(conditions)), default=len(SEGMENTS) - 1)
+    return metrics.assign(
+        R=recency,
+        F=frequency,
+        M=monetary,
+        RFM=recency.astype(np.int16) * 100 + frequency * 10 + monetary,
+        Segment=pd.Categorical.from_codes(segment_codes, categories=SEGMENTS),
+    )
+
+
+def cluster_customers(metrics, clusters=DEFAULT_CLUSTERS, seed=0):
+    """MiniBatchKMeans cluster of each customer on standardized log recency, frequency and monetary.
+
+    Clusters are numbered from 1 by descending mean monetary value, so refits label them the same way.
+    scikit-learn is imported on the first fit.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    clusters = min(clusters, len(metrics))
+    if not clusters:
+        return np.zeros(0, dtype=np.int8)
+    features = np.log1p(metrics[['Recency', 'Frequency', 'Monetary']].to_numpy(dtype=np.float64))
+    spread = features.std(axis=0)
+    features = (features - features.mean(axis=0)) / np.where(spread > 0, spread, 1.0)
+    model = MiniBatchKMeans(n_clusters=clusters, batch_size=MINI_BATCH_SIZE, n_init=3, random_state=seed)
+    labels = model.fit_predict(features)
+    monetary = np.bincount(labels, weights=metrics['Monetary'].to_numpy(), minlength=clusters)
+    monetary /= np.maximum(np.bincount(labels, minlength=clusters), 1)
+    rank = np.empty(clusters, dtype=np.int8)
+    rank[np.argsort(-monetary, kind='stable')] = np.arange(clusters)
+    return rank[labels] + 1
+
+
+def customer_segments(transactions_df, clusters=DEFAULT_CLUSTERS, seed=0):
+    """Per-customer RFM metrics, scores, named segment and k-means Cluster."""
+    segments = rfm_segments(customer_metrics(transactions_df))
+    segments['Cluster'] = cluster_customers(segments, clusters, seed)
+    return segments
+
+
+def segment_summary(segments, by='Segment'):
+    """Customers, mean recency/frequency/monetary and share of revenue per segment (or Cluster)."""
+    summary = segments.groupby(by, observed=True).agg(
+        Customers=('Recency', 'size'),
+        Recency=('Recency', 'mean'),
+        Frequency=('Frequency', 'mean'),
+        Monetary=('Monetary', 'mean'),
+        Revenue=('Monetary', 'sum'),
+    )
+    summary['Revenue Share'] = summary['Revenue'] / summary['Revenue'].sum()
+    return summary.reset_index()
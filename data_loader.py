@@ -0,0 +1,543 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+from schema import AMOUNT_DTYPE, STRING_COLUMNS, TRANSACTION_COLUMNS, TRUE_TEXT, parse_dates, smallest_int_dtype
+from cube import TransactionCube
+from customers import DEFAULT_CLUSTERS, customer_segments
+from instrumentation import NULL_TRACER
+from sketches import TransactionSketches
+from timeindex import TimeIndex
+from xlsx_stream import DEFAULT_CHUNK_ROWS, iter_transaction_chunks, read_transactions
+
+CACHE_DIR_NAME = ".transactions_cache"
+CACHE_VERSION = 3
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+IDS_NAME = "ids_sorted.npy"
+SEGMENTS_DIR = "segments"
+CUBE_DIR = "cube"
+SKETCHES_DIR = "sketches"
+CUSTOMERS_DIR = "customers"
+
+
+# --- Source fingerprint ---
+def file_sha256(path, block_size=1 << 20):
+    """Hash the workbook bytes so a touched-but-identical file does not force a rebuild."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path, with_hash=True):
+    """Size, mtime and (optionally) content hash of the source workbook."""
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        fingerprint['sha256'] = file_sha256(path)
+    return fingerprint
+
+
+def cache_dir_for(path, cache_root=None):
+    """Directory holding the columnar cache for one workbook."""
+    path = os.path.abspath(path)
+    if cache_root is None:
+        cache_root = os.path.join(os.path.dirname(path), CACHE_DIR_NAME)
+    return os.path.join(cache_root, os.path.splitext(os.path.basename(path))[0])
+
+
+# --- Column encoding ---
+class ColumnBuilder:
+    """Accumulate transaction chunks into compact cache columns.
+
+    Strings are dictionary-encoded against a vocabulary that grows chunk by chunk, so only the
+    integer codes of already-seen rows are held while the rest of the export streams in.
+    """
+
+    def __init__(self):
+        self.parts = {column: [] for column in TRANSACTION_COLUMNS}
+        self.vocabularies = {column: {} for column in STRING_COLUMNS}
+
+    def add(self, chunk):
+        for column in TRANSACTION_COLUMNS:
+            values = chunk[column]
+            if column in STRING_COLUMNS:
+                codes, uniques = pd.factorize(values)
+                vocabulary = self.vocabularies[column]
+                mapping = np.array(
+                    [vocabulary.setdefault(str(value), len(vocabulary)) for value in uniques] + [-1],
+                    dtype=np.int32,
+                )
+                # Local code -1 (missing) indexes the trailing -1
+                self.parts[column].append(mapping[codes])
+            elif column == 'Date':
+                self.parts[column].append(parse_dates(values).to_numpy(dtype='datetime64[ns]').view(np.int64))
+            elif column == 'Discount_Applied':
+                self.parts[column].append(values.to_numpy(dtype=bool))
+            elif column == 'Amount($)':
+                self.parts[column].append(values.to_numpy(dtype=np.float64))
+            else:
+                self.parts[column].append(values.to_numpy(dtype=np.int64))
+
+    def finish(self):
+        """Return (columns, categories) with each vocabulary sorted."""
+        columns = {}
+        categories = {}
+        for column in TRANSACTION_COLUMNS:
+            parts = self.parts[column]
+            values = np.concatenate(parts) if parts else np.empty(0, dtype=self.empty_dtype(column))
+            if column in STRING_COLUMNS:
+                vocabulary = sorted(self.vocabularies[column])
+                order = np.array([self.vocabularies[column][value] for value in vocabulary], dtype=np.int32)
+                remap = np.empty(len(order) + 1, dtype=np.int32)
+                remap[order] = np.arange(len(order), dtype=np.int32)
+                remap[-1] = -1
+                values = remap[values]
+                categories[column] = vocabulary
+            elif column == 'Amount($)':
+                values = values.astype(AMOUNT_DTYPE)
+            elif column == 'Total_Items':
+                values = values.astype(smallest_int_dtype(values))
+            columns[column] = values
+        return columns, categories
+
+    @staticmethod
+    def empty_dtype(column):
+        if column in STRING_COLUMNS:
+            return np.int32
+        return {'Discount_Applied': bool, 'Amount($)': np.float64}.get(column, np.int64)
+
+
+def frame_to_columns(transactions_df):
+    """Convert a parsed frame into typed NumPy columns (strings dictionary-encoded)."""
+    builder = ColumnBuilder()
+    builder.add(transactions_df)
+    return builder.finish()
+
+
+def iter_source_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Typed chunks of the source: the workbook, or a .csv export (for sources past Excel's row limit)."""
+    if str(path).lower().endswith(".csv"):
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            yield read_batch(chunk)
+    else:
+        yield from iter_transaction_chunks(path, chunk_rows)
+
+
+def build_columns(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream the workbook into cache columns without materializing it as a DataFrame."""
+    builder = ColumnBuilder()
+    for chunk in iter_source_chunks(path, chunk_rows):
+        builder.add(chunk)
+    return builder.finish()
+
+
+# --- Columnar cache ---
+# Layout of one cache directory:
+#   manifest.json      source fingerprint, row count, the base part and every appended segment
+#   base-<sha>/        columns converted from the workbook
+#   segments/<name>/   columns of one appended batch (see append_transactions)
+#   cube/              the TransactionCube over base + segments
+#   sketches/          the TransactionSketches (approximate mode) over base + segments
+#   .lock              taken by every writer (see cache_lock)
+# The manifest is the commit point: the cube and sketches record the dataset_fingerprint they
+# were built from, and are rebuilt on load when it no longer matches the manifest.
+held_locks = threading.local()
+
+
+@contextmanager
+def cache_lock(cache_dir):
+    """Hold the cache directory's lock file for the duration of a change.
+
+    The lock is taken across processes (ingest.py, the app and its reload watcher) as well as
+    threads, so only one writer converts, appends or rebuilds at a time. A thread that already
+    holds the lock may enter again.
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    held = held_locks.__dict__.setdefault('paths', set())
+    if cache_dir in held:
+        yield
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, LOCK_NAME), "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        held.add(cache_dir)
+        try:
+            yield
+        finally:
+            held.discard(cache_dir)
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_NAME)) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def write_manifest(cache_dir, manifest):
+    """Replace the manifest atomically so readers see either the old or the new dataset."""
+    staging = os.path.join(cache_dir, f".{MANIFEST_NAME}.tmp")
+    with open(staging, "w") as handle:
+        json.dump(manifest, handle)
+    os.replace(staging, os.path.join(cache_dir, MANIFEST_NAME))
+    return manifest
+
+
+def write_part(directory, columns):
+    """Write one part's columns, plus its sorted Transaction_IDs for de-duplicating later batches."""
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+    try:
+        for column, values in columns.items():
+            np.save(os.path.join(staging_dir, f"{column}.npy"), values, allow_pickle=False)
+        np.save(os.path.join(staging_dir, IDS_NAME), np.sort(columns['Transaction_ID']), allow_pickle=False)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(staging_dir, directory)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+
+def read_part(directory):
+    """Memory-map every column of one part."""
+    return {
+        column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r', allow_pickle=False)
+        for column in TRANSACTION_COLUMNS
+    }
+
+
+def part_dirs(cache_dir, manifest):
+    """(directory, categories) of the base part and every segment, in append order."""
+    parts = [(os.path.join(cache_dir, manifest['base']), manifest['categories'])]
+    for segment in manifest['segments']:
+        parts.append((os.path.join(cache_dir, SEGMENTS_DIR, segment['name']), segment['categories']))
+    return parts
+
+
+def contains_sorted(sorted_values, values):
+    """Membership test against a sorted array: a binary search per value."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    position = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[position] == values
+
+
+def existing_ids(cache_dir, manifest, ids):
+    """Which of `ids` are already stored in any part."""
+    found = np.zeros(len(ids), dtype=bool)
+    for directory, _ in part_dirs(cache_dir, manifest):
+        found |= contains_sorted(np.load(os.path.join(directory, IDS_NAME), mmap_mode='r'), ids)
+    return found
+
+
+def columns_to_frame(columns, categories):
+    """Build the compact transactions_df straight from cached columns.
+
+    String columns become categoricals over the cached codes, so no Python strings are created.
+    """
+    data = {}
+    for column in TRANSACTION_COLUMNS:
+        values = np.asarray(columns[column])
+        if column in STRING_COLUMNS:
+            data[column] = pd.Categorical.from_codes(values, categories=categories[column])
+        elif column == 'Date':
+            data[column] = values.view('datetime64[ns]')
+        else:
+            data[column] = values
+    return pd.DataFrame(data, columns=TRANSACTION_COLUMNS)
+
+
+def combine_parts(parts):
+    """Concatenate (columns, categories) parts onto one sorted vocabulary per string column."""
+    if len(parts) == 1:
+        return parts[0]
+    columns = {}
+    categories = {}
+    for column in TRANSACTION_COLUMNS:
+        if column not in STRING_COLUMNS:
+            columns[column] = np.concatenate([part_columns[column] for part_columns, _ in parts])
+            continue
+        vocabulary = sorted(set().union(*(part_categories[column] for _, part_categories in parts)))
+        positions = {label: position for position, label in enumerate(vocabulary)}
+        codes = []
+        for part_columns, part_categories in parts:
+            remap = np.array([positions[label] for label in part_categories[column]] + [-1], dtype=np.int32)
+            # Code -1 (missing) indexes the trailing -1
+            codes.append(remap[part_columns[column]])
+        columns[column] = np.concatenate(codes)
+        categories[column] = vocabulary
+    return columns, categories
+
+
+def add_month(transactions_df):
+    # Add a 'Month' column for analysis
+    transactions_df['Month'] = transactions_df['Date'].dt.month.astype('int8')
+    return transactions_df
+
+
+def read_dataset(cache_dir, manifest):
+    parts = [(read_part(directory), categories) for directory, categories in part_dirs(cache_dir, manifest)]
+    return add_month(columns_to_frame(*combine_parts(parts)))
+
+
+def rebuild_cube(cache_dir, manifest, transactions_df=None):
+    if transactions_df is None:
+        transactions_df = read_dataset(cache_dir, manifest)
+    cube = TransactionCube.from_frame(transactions_df)
+    cube.save(os.path.join(cache_dir, CUBE_DIR), dataset_fingerprint(manifest))
+    return cube
+
+
+def rebuild_sketches(cache_dir, manifest, transactions_df=None):
+    if transactions_df is None:
+        transactions_df = read_dataset(cache_dir, manifest)
+    sketches = TransactionSketches.from_frame(transactions_df)
+    sketches.save(os.path.join(cache_dir, SKETCHES_DIR), dataset_fingerprint(manifest))
+    return sketches
+
+
+def rebuild_base(path, cache_dir, manifest, fingerprint, tracer=NULL_TRACER):
+    """Convert the workbook into a new base part, keeping appended segments that it does not cover."""
+    with tracer.span('parse') as span:
+        columns, categories = build_columns(path)
+        span.rows = len(columns['Transaction_ID'])
+    base = f"base-{fingerprint['sha256'][:16]}"
+    write_part(os.path.join(cache_dir, base), columns)
+    base_ids = np.load(os.path.join(cache_dir, base, IDS_NAME), mmap_mode='r')
+    segments = []
+    for segment in (manifest or {}).get('segments', []):
+        directory = os.path.join(cache_dir, SEGMENTS_DIR, segment['name'])
+        segment_columns = read_part(directory)
+        keep = ~contains_sorted(base_ids, np.asarray(segment_columns['Transaction_ID']))
+        if not keep.any():
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+        if not keep.all():
+            # The new export already holds some of these rows
+            write_part(directory, {column: np.asarray(values)[keep] for column, values in segment_columns.items()})
+        segments.append(dict(segment, rows=int(keep.sum())))
+    manifest = {
+        'version': CACHE_VERSION,
+        'source': fingerprint,
+        'rows': int(len(columns['Transaction_ID'])) + sum(segment['rows'] for segment in segments),
+        'base': base,
+        'categories': categories,
+        'segments': segments,
+        'next_segment': (manifest or {}).get('next_segment', 0),
+    }
+    write_manifest(cache_dir, manifest)
+    transactions_df = read_dataset(cache_dir, manifest)
+    with tracer.span('build cube', rows=len(transactions_df)):
+        rebuild_cube(cache_dir, manifest, transactions_df)
+    with tracer.span('build sketches', rows=len(transactions_df)):
+        rebuild_sketches(cache_dir, manifest, transactions_df)
+    for name in os.listdir(cache_dir):
+        if name.startswith("base-") and name != base:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return manifest
+
+
+def cache_is_current(manifest, quick):
+    return manifest is not None and manifest['source']['size'] == quick['size'] \
+        and manifest['source']['mtime_ns'] == quick['mtime_ns']
+
+
+def ensure_cache(path, cache_root=None, tracer=NULL_TRACER):
+    """Return (cache_dir, manifest), converting the workbook only when its content changed."""
+    cache_dir = cache_dir_for(path, cache_root)
+    manifest = read_manifest(cache_dir)
+    quick = source_fingerprint(path, with_hash=False)
+    if cache_is_current(manifest, quick):
+        return cache_dir, manifest
+    with cache_lock(cache_dir):
+        # Another process may have converted the workbook while this one waited
+        manifest = read_manifest(cache_dir)
+        if cache_is_current(manifest, quick):
+            return cache_dir, manifest
+        # Size or mtime moved: the content hash decides whether a rebuild is needed
+        fingerprint = source_fingerprint(path)
+        if manifest is not None and manifest['source'].get('sha256') == fingerprint['sha256']:
+            return cache_dir, write_manifest(cache_dir, dict(manifest, source=fingerprint))
+        return cache_dir, rebuild_base(path, cache_dir, manifest, fingerprint, tracer)
+
+
+def dataset_stamp(path, cache_root=None):
+    """Cheap key that changes whenever the workbook is replaced or a batch is appended."""
+    quick = source_fingerprint(path, with_hash=False)
+    try:
+        manifest_mtime = os.stat(os.path.join(cache_dir_for(path, cache_root), MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        manifest_mtime = 0
+    return quick['size'], quick['mtime_ns'], manifest_mtime
+
+
+def load_transactions(path, cache_root=None):
+    """Load Transactions.xlsx (plus appended batches) through the columnar cache."""
+    cache_dir, manifest = ensure_cache(path, cache_root)
+    return read_dataset(cache_dir, manifest)
+
+
+def load_cube(path, cache_root=None, tracer=NULL_TRACER):
+    """Load the persisted TransactionCube for the dataset, building it if it is missing or stale."""
+    cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+    cube = TransactionCube.load(os.path.join(cache_dir, CUBE_DIR))
+    if cube is not None and cube.content == dataset_fingerprint(manifest):
+        return cube
+    with cache_lock(cache_dir):
+        cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+        cube = TransactionCube.load(os.path.join(cache_dir, CUBE_DIR))
+        if cube is not None and cube.content == dataset_fingerprint(manifest):
+            return cube
+        with tracer.span('build cube', rows=manifest['rows']):
+            return rebuild_cube(cache_dir, manifest)
+
+
+def load_sketches(path, cache_root=None, tracer=NULL_TRACER):
+    """Load the persisted TransactionSketches for the dataset, building them if they are missing or stale."""
+    cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+    sketches = TransactionSketches.load(os.path.join(cache_dir, SKETCHES_DIR))
+    if sketches is not None and sketches.content == dataset_fingerprint(manifest):
+        return sketches
+    with cache_lock(cache_dir):
+        cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+        sketches = TransactionSketches.load(os.path.join(cache_dir, SKETCHES_DIR))
+        if sketches is not None and sketches.content == dataset_fingerprint(manifest):
+            return sketches
+        with tracer.span('build sketches', rows=manifest['rows']):
+            return rebuild_sketches(cache_dir, manifest)
+
+
+def dataset_fingerprint(manifest):
+    """Short hash of the stored content: the base export and every appended segment."""
+    content = [manifest['base'], manifest['rows'], [segment['name'] for segment in manifest['segments']]]
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()[:16]
+
+
+def load_customer_segments(path, cache_root=None, clusters=DEFAULT_CLUSTERS, tracer=NULL_TRACER):
+    """Per-customer RFM segments and clusters (see customers.py), cached against the dataset fingerprint.
+
+    A replaced workbook or an appended batch changes the fingerprint, so the next call recomputes;
+    older results are removed when the new ones are written.
+    """
+    cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+    directory = os.path.join(cache_dir, CUSTOMERS_DIR)
+    fingerprint = dataset_fingerprint(manifest)
+    name = f"segments-{fingerprint}-k{clusters}.pkl"
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        return pd.read_pickle(target)
+    transactions_df = read_dataset(cache_dir, manifest)
+    with tracer.span('segment customers', rows=len(transactions_df)):
+        segments = customer_segments(transactions_df, clusters)
+    with cache_lock(cache_dir):
+        if dataset_fingerprint(read_manifest(cache_dir) or manifest) != fingerprint:
+            # A batch landed meanwhile; these segments are still right for the data they were asked about
+            return segments
+        os.makedirs(directory, exist_ok=True)
+        staging = os.path.join(directory, f".{name}.tmp")
+        segments.to_pickle(staging)
+        os.replace(staging, target)
+        for stale in os.listdir(directory):
+            if stale.startswith("segments-") and not stale.startswith(f"segments-{fingerprint}-"):
+                os.remove(os.path.join(directory, stale))
+    return segments
+
+
+def load_time_index(path, cache_root=None, tracer=NULL_TRACER):
+    """Build the Date-sorted TimeIndex of the dataset from the columnar cache."""
+    cache_dir, manifest = ensure_cache(path, cache_root, tracer)
+    transactions_df = read_dataset(cache_dir, manifest)
+    with tracer.span('build time index', rows=len(transactions_df)):
+        return TimeIndex(transactions_df)
+
+
+# --- Incremental ingestion ---
+def read_batch(batch):
+    """A delta as a DataFrame: an .xlsx export, a .csv file, or an in-memory frame."""
+    if isinstance(batch, pd.DataFrame):
+        frame = batch
+    elif str(batch).lower().endswith(".csv"):
+        frame = pd.read_csv(batch)
+    else:
+        frame = read_transactions(batch)
+    missing = [column for column in TRANSACTION_COLUMNS if column not in frame]
+    if missing:
+        raise ValueError(f"Batch is missing columns: {', '.join(missing)}")
+    frame = frame[TRANSACTION_COLUMNS].copy()
+    discount = frame['Discount_Applied']
+    if discount.dtype != bool:
+        frame['Discount_Applied'] = discount.astype(str).str.strip().str.lower().isin(TRUE_TEXT)
+    frame['Date'] = parse_dates(frame['Date'])
+    return frame
+
+
+def append_transactions(path, batch, cache_root=None):
+    """Append a batch of transactions to the stored dataset and fold it into the cube and sketches.
+
+    Rows whose Transaction_ID is already stored (or repeats within the batch) are skipped. The
+    cost follows the batch: IDs are checked by binary search against each part's sorted IDs, the
+    batch is written as its own segment, and the cube and sketches absorb ones built from the batch alone.
+    The whole update holds the cache lock, and the manifest is written before the cube and sketches:
+    if the process dies in between, a retry finds the rows stored and the stale cube and sketches
+    are rebuilt on their next load rather than counting the batch twice.
+    Returns the number of rows appended.
+    """
+    frame = read_batch(batch)
+    frame = frame[~frame['Transaction_ID'].duplicated()]
+    ids = frame['Transaction_ID'].to_numpy(dtype=np.int64)
+    cache_dir = cache_dir_for(path, cache_root)
+    with cache_lock(cache_dir):
+        cache_dir, manifest = ensure_cache(path, cache_root)
+        frame = frame[~existing_ids(cache_dir, manifest, ids)]
+        if frame.empty:
+            return 0
+        cube = load_cube(path, cache_root)
+        sketches = load_sketches(path, cache_root)
+        columns, categories = frame_to_columns(frame)
+        name = f"{manifest['next_segment']:06d}"
+        write_part(os.path.join(cache_dir, SEGMENTS_DIR, name), columns)
+        batch_df = add_month(columns_to_frame(columns, categories))
+        cube = cube.merge(TransactionCube.from_frame(batch_df))
+        sketches = sketches.merge(TransactionSketches.from_frame(batch_df))
+        segment = {'name': name, 'rows': len(frame), 'categories': categories}
+        manifest = write_manifest(cache_dir, dict(
+            manifest,
+            rows=manifest['rows'] + len(frame),
+            segments=manifest['segments'] + [segment],
+            next_segment=manifest['next_segment'] + 1,
+        ))
+        content = dataset_fingerprint(manifest)
+        cube.save(os.path.join(cache_dir, CUBE_DIR), content)
+        sketches.save(os.path.join(cache_dir, SKETCHES_DIR), content)
+    return len(frame)
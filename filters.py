@@ -0,0 +1,156 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from schema import category_codes
+
+# Sidebar filters over categorical columns, in the order they appear in the sidebar
+FILTER_COLUMNS = {
+    'store_types': 'Store_Type',
+    'seasons': 'Season',
+    'cities': 'City',
+}
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar selection. `None` means "no restriction" for that filter."""
+    store_types: tuple = None
+    seasons: tuple = None
+    cities: tuple = None
+    amount_range: tuple = None
+    # Inclusive (first day, last day) as datetime.date values
+    date_range: tuple = None
+
+    def is_empty(self):
+        return all(getattr(self, name) is None for name in (*FILTER_COLUMNS, 'amount_range', 'date_range'))
+
+
+def filters_from_sidebar(store_types, seasons, cities, amount_range, full_amount_range, date_range=None, full_date_range=None):
+    """Normalize sidebar widget values; full selections become `None` so they cost nothing."""
+    # A date range that covers every transaction restricts nothing
+    if date_range is not None and full_date_range is not None:
+        if date_range[0] <= full_date_range[0] and date_range[1] >= full_date_range[1]:
+            date_range = None
+    return Filters(
+        store_types=tuple(store_types),
+        seasons=tuple(seasons),
+        cities=tuple(cities),
+        amount_range=None if tuple(amount_range) == tuple(full_amount_range) else tuple(amount_range),
+        date_range=None if date_range is None else tuple(date_range),
+    )
+
+
+def filter_mask(filters, labels, codes, size):
+    """Boolean mask over `size` entries (rows or cells) whose Store_Type, Season and City pass `filters`.
+
+    `labels` maps each filter column to its labels and `codes(column)` returns the entries' codes
+    into them; code -1 (missing) never passes a restricted filter.
+    """
+    mask = np.ones(size, dtype=bool)
+    for name, column in FILTER_COLUMNS.items():
+        values = getattr(filters, name)
+        if values is None:
+            continue
+        wanted = set(values)
+        allowed = np.array([label in wanted for label in labels[column]] + [False], dtype=bool)
+        # Code -1 (missing) indexes the trailing False
+        mask &= allowed[codes(column)]
+    return mask
+
+
+def day_bounds(date_range):
+    """Half-open [start, end) datetime64[ns] bounds covering an inclusive (first day, last day) range."""
+    first, last = date_range
+    return (
+        np.datetime64(first, 'D').astype('datetime64[ns]'),
+        (np.datetime64(last, 'D') + np.timedelta64(1, 'D')).astype('datetime64[ns]'),
+    )
+
+
+class FilterIndex:
+    """Bitmap index over the sidebar filter columns.
+
+    Every categorical value gets one packed bitmap (one bit per row), so a selection is a few
+    bitwise ORs/ANDs over n/8 bytes. Amount($) and Date are indexed by sort permutations: a slider
+    or date range is two binary searches and a slice of that permutation.
+    """
+
+    def __init__(self, transactions_df):
+        self.rows = len(transactions_df)
+        self.bitmaps = {}
+        self.categories = {}
+        for column in FILTER_COLUMNS.values():
+            codes, categories = category_codes(transactions_df[column])
+            self.categories[column] = categories
+            # One stable sort groups the rows of each code together, so building every bitmap is a single pass
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+            bitmaps = {}
+            for code, value in enumerate(categories):
+                bits = np.zeros(self.rows, dtype=bool)
+                bits[order[bounds[code]:bounds[code + 1]]] = True
+                bitmaps[value] = np.packbits(bits)
+            self.bitmaps[column] = bitmaps
+        amount = transactions_df['Amount($)'].to_numpy()
+        self.amount_order = np.argsort(amount, kind='stable')
+        self.sorted_amount = amount[self.amount_order]
+        if 'Date' in transactions_df:
+            dates = transactions_df['Date'].to_numpy(dtype='datetime64[ns]')
+            self.date_order = np.argsort(dates, kind='stable')
+            self.sorted_dates = dates[self.date_order]
+        else:
+            self.date_order = self.sorted_dates = None
+
+    @property
+    def amount_bounds(self):
+        if not self.rows:
+            return 0.0, 0.0
+        return float(self.sorted_amount[0]), float(self.sorted_amount[-1])
+
+    def value_bitmap(self, column, values):
+        """OR of the bitmaps of the selected values of one column."""
+        bitmaps = self.bitmaps[column]
+        selected = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        for value in values:
+            if value in bitmaps:
+                np.bitwise_or(selected, bitmaps[value], out=selected)
+        return selected
+
+    def amount_bitmap(self, low, high):
+        """Bitmap of the rows with low <= Amount($) <= high."""
+        start = np.searchsorted(self.sorted_amount, low, side='left')
+        stop = np.searchsorted(self.sorted_amount, high, side='right')
+        bits = np.zeros(self.rows, dtype=bool)
+        bits[self.amount_order[start:stop]] = True
+        return np.packbits(bits)
+
+    def date_bitmap(self, date_range):
+        """Bitmap of the rows dated within an inclusive (first day, last day) range."""
+        if self.sorted_dates is None:
+            raise ValueError("This index was built without a Date column")
+        start, end = day_bounds(date_range)
+        bits = np.zeros(self.rows, dtype=bool)
+        bits[self.date_order[np.searchsorted(self.sorted_dates, start):np.searchsorted(self.sorted_dates, end)]] = True
+        return np.packbits(bits)
+
+    def select(self, filters):
+        """Row positions matching `filters`, or `None` when every row matches."""
+        selected = None
+        for name, column in FILTER_COLUMNS.items():
+            values = getattr(filters, name)
+            if values is None or set(self.categories[column]) <= set(values):
+                continue
+            bitmap = self.value_bitmap(column, values)
+            selected = bitmap if selected is None else np.bitwise_and(selected, bitmap, out=selected)
+        if filters.amount_range is not None:
+            low, high = filters.amount_range
+            if (low, high) != self.amount_bounds:
+                bitmap = self.amount_bitmap(low, high)
+                selected = bitmap if selected is None else np.bitwise_and(selected, bitmap, out=selected)
+        if filters.date_range is not None:
+            bitmap = self.date_bitmap(filters.date_range)
+            selected = bitmap if selected is None else np.bitwise_and(selected, bitmap, out=selected)
+        if selected is None:
+            return None
+        return np.flatnonzero(np.unpackbits(selected, count=self.rows))
@@ -0,0 +1,17 @@
+import argparse
+
+from data_loader import append_transactions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append new transaction batches to the dashboard dataset.")
+    parser.add_argument("batches", nargs="+", help="Delta files (.xlsx exports or .csv) to append, in order")
+    parser.add_argument("--workbook", default="./Transactions.xlsx", help="Workbook the dataset is built from")
+    args = parser.parse_args(argv)
+    for batch in args.batches:
+        appended = append_transactions(args.workbook, batch)
+        print(f"{batch}: appended {appended} new transactions")
+
+
+if __name__ == "__main__":
+    main()
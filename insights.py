@@ -0,0 +1,222 @@
+import calendar
+import hashlib
+
+from bootstrap import CONFIDENCE
+from charts import hash_value
+from shared import LRUCache
+
+# Bump when any template changes so cached text is not reused
+INSIGHTS_VERSION = 1
+
+
+# --- Templates ---
+def money(value):
+    return f"${value:,.2f}"
+
+
+def listing(items):
+    """'A', 'A and B' or 'A, B and C'."""
+    items = [str(item) for item in items]
+    if len(items) <= 1:
+        return "".join(items)
+    return f"{', '.join(items[:-1])} and {items[-1]}"
+
+
+def ranking(values, fmt=money):
+    """Labels of a Series from highest to lowest value, each with its value: 'A ($2.00), B ($1.00)'."""
+    ranked = values.dropna().sort_values(ascending=False, kind='stable')
+    return listing(f"{label} ({fmt(value)})" for label, value in ranked.items())
+
+
+def signed_money(value):
+    return f"{'+' if value >= 0 else '-'}{money(abs(value))}"
+
+
+def leader(values, fmt=money):
+    """Sentence naming the highest entry of a labelled Series, then the rest in order."""
+    ranked = values.dropna().sort_values(ascending=False, kind='stable')
+    if ranked.empty:
+        return "No matching transactions."
+    lead = f"{ranked.index[0]} leads at {fmt(ranked.iloc[0])}"
+    if len(ranked) == 1:
+        return f"{lead}."
+    return f"{lead}, ahead of {ranking(ranked.iloc[1:], fmt)}."
+
+
+def peak_and_dip(values, fmt=money):
+    """Sentence naming the highest and lowest entries of a labelled Series and the spread between them."""
+    values = values.dropna()
+    if values.empty:
+        return "No matching transactions."
+    if len(values) == 1:
+        return f"Only {values.index[0]} has transactions ({fmt(values.iloc[0])})."
+    peak, dip = values.idxmax(), values.idxmin()
+    spread = values[peak] - values[dip]
+    if not spread:
+        return f"Level at {fmt(values[peak])} across {listing(values.index)}."
+    relative = f" ({spread / abs(values[dip]):.1%})" if values[dip] else ""
+    return f"Peaks in {peak} ({fmt(values[peak])}) and dips in {dip} ({fmt(values[dip])}), a spread of {fmt(spread)}{relative}."
+
+
+def items(value):
+    return f"{value:.2f} items"
+
+
+def month_names(values):
+    return values.rename(index=lambda month: calendar.month_name[int(month)])
+
+
+def significance(differences, cell, describe):
+    """Sentence on which cells' differences are significant, from bootstrap.effects; None without them."""
+    if differences is None or differences.empty:
+        return None
+    significant = differences[differences['Significant']]
+    if significant.empty:
+        return f"No {describe} is significant at the {CONFIDENCE:.0%} level: the gaps are within resampling noise."
+    cells = listing(
+        f"{calendar.month_name[int(row[cell])] if cell == 'Month' else row[cell]} ({signed_money(row['Difference'])})"
+        for _, row in significant.iterrows()
+    )
+    return f"Significant {describe} ({CONFIDENCE:.0%} bootstrap interval excluding zero) in {len(significant)} of {len(differences)}: {cells}."
+
+
+# --- Question 1 ---
+def store_season_insights(answers):
+    """Per store type: its peak and dip seasons, and how the seasons rank."""
+    table = answers['average_transaction_by_store_season']
+    insights = {}
+    for store_type, rows in table.groupby('Store Type', sort=True, observed=True):
+        averages = rows.set_index('Season')['Average Transaction Amount ($)']
+        insights[store_type] = [peak_and_dip(averages), f"Seasons by average transaction: {ranking(averages)}."]
+    return insights
+
+
+# --- Question 2 ---
+def payment_method_insights(answers):
+    """Which payment method leads the high-value transactions in which cities."""
+    table = answers['most_common_payment_method']
+    if table.empty:
+        return {'payment_method': ["No transaction is above the high-value cut."]}
+    lines = []
+    by_method = table.groupby('Payment_Method', sort=True)
+    cities = by_method.size().sort_values(ascending=False, kind='stable')
+    leaders = cities.index[cities == cities.iloc[0]]
+    if len(leaders) == 1:
+        lines.append(f"{leaders[0]} leads in {cities.iloc[0]} of {len(table)} cities.")
+    else:
+        lines.append(f"{listing(leaders)} tie for the lead, in {cities.iloc[0]} of {len(table)} cities each.")
+    for method in cities.index:
+        rows = by_method.get_group(method).sort_values('Count', ascending=False, kind='stable')
+        counts = listing(f"{city} ({count:,.0f})" for city, count in zip(rows['City'], rows['Count']))
+        lines.append(f"**{method}:** the most common high-value payment method in {counts}.")
+    return {'payment_method': lines}
+
+
+# --- Question 3 ---
+def discount_insights(answers, differences=None):
+    """Months where discounted sales lead, the widest gap, peak and dip months, and (given the
+    bootstrap differences) the months whose mean transaction really differs."""
+    sales = month_names(answers['sales_with_without_discount'])
+    if sales.empty:
+        return {'discount_sales': ["No matching transactions."]}
+    gap = sales['With Discount'] - sales['No Discount']
+    widest = gap.abs().idxmax()
+    with_total, without_total = sales['With Discount'].sum(), sales['No Discount'].sum()
+    ahead = "with a discount" if with_total >= without_total else "without a discount"
+    lines = [
+        f"Sales with a discount are higher in {int((gap > 0).sum())} of {len(gap)} months; over all months, sales "
+        f"{ahead} lead ({money(with_total)} with, {money(without_total)} without).",
+        f"The widest gap is in {widest}, where sales {'with' if gap[widest] > 0 else 'without'} "
+        f"a discount are ahead by {money(abs(gap[widest]))}.",
+        f"**Total sales:** {peak_and_dip(sales.sum(axis=1))}",
+        f"**With discount:** {peak_and_dip(sales['With Discount'])}",
+        f"**No discount:** {peak_and_dip(sales['No Discount'])}",
+    ]
+    tested = significance(differences, 'Month', "monthly difference in mean transaction with and without a discount")
+    if tested:
+        lines.append(tested)
+    return {'discount_sales': lines}
+
+
+# --- Question 4 ---
+def top_cities_insights(answers):
+    """The top cities by items per transaction, then each one's seasonal peak and dip in sales."""
+    top_cities = answers['top_cities'].set_index('City')['Total_Items']
+    sales = answers['sales_by_city_season']
+    if top_cities.empty:
+        return {'top_cities': ["No matching transactions."], 'sales_by_city_season': []}
+    lines = [f"Highest average items per transaction: {ranking(top_cities, fmt=items)}."]
+    if len(top_cities) > 1:
+        lines.append(
+            f"The gap from first to last is {top_cities.max() - top_cities.min():.2f} items per transaction."
+        )
+    season_lines = []
+    best_seasons = []
+    for city in top_cities.index:
+        city_sales = sales[sales['City'] == city].set_index('Season')['Amount($)']
+        season_lines.append(f"**{city}:** {peak_and_dip(city_sales)}")
+        if not city_sales.empty:
+            best_seasons.append(city_sales.idxmax())
+    if best_seasons:
+        counts = {season: best_seasons.count(season) for season in dict.fromkeys(best_seasons)}
+        season = max(counts, key=counts.get)
+        season_lines.append(f"{season} is the top season in {counts[season]} of {len(best_seasons)} of these cities.")
+    return {'top_cities': lines, 'sales_by_city_season': season_lines}
+
+
+# --- Question 5 ---
+def promotion_insights(answers, differences=None):
+    """The leading promotion per season, each promotion's best and worst season, and (given the
+    bootstrap differences) the seasons where the lead is more than noise."""
+    table = answers['promotion_effectiveness']
+    if table.empty:
+        return {'promotion': ["No matching transactions with a promotion."]}
+    lines = []
+    for season, rows in table.groupby('Season', sort=True, observed=True):
+        averages = rows.set_index('Promotion')['Amount($)']
+        lines.append(f"**{season}:** {leader(averages)}")
+    for promotion, rows in table.groupby('Promotion', sort=True, observed=True):
+        lines.append(f"**{promotion}:** {peak_and_dip(rows.set_index('Season')['Amount($)'])}")
+    tested = significance(differences, 'Season', "lead of the best promotion over the runner-up")
+    if tested:
+        lines.append(tested)
+    return {'promotion': lines}
+
+
+# Insight builders of each question, reading its entries of the answers dict; Q3 and Q5 also
+# take the bootstrap differences of their effect
+QUESTION_INSIGHTS = {
+    'Q1': store_season_insights,
+    'Q2': payment_method_insights,
+    'Q3': discount_insights,
+    'Q4': top_cities_insights,
+    'Q5': promotion_insights,
+}
+
+
+# --- Memoization ---
+def insights_key(question, answers, differences=None):
+    """Content address of a question's insights: its answer tables (which reflect the data and the
+    filters) and the bootstrap differences they cite."""
+    digest = hashlib.sha256(f"{INSIGHTS_VERSION}:{question}".encode())
+    for name in sorted(answers):
+        digest.update(name.encode())
+        hash_value(digest, answers[name])
+    if differences is not None:
+        hash_value(digest, differences)
+    return digest.hexdigest()
+
+
+# {topic: [lines]} keyed by insights_key
+insight_cache = LRUCache(max_entries=1024)
+
+
+def question_insights(question, answers, differences=None, cache=insight_cache):
+    """{topic: [insight lines]} for one question, generated from its answers once per distinct answer."""
+    key = insights_key(question, answers, differences)
+    insights = cache.get(key)
+    if insights is None:
+        builder = QUESTION_INSIGHTS[question]
+        insights = builder(answers) if differences is None else builder(answers, differences)
+        cache.put(key, insights)
+    return insights
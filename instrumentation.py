@@ -0,0 +1,158 @@
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+# Set to 1 to trace every run (the dashboard's debug checkbox turns it on per session)
+ENABLE_ENV = "DASHBOARD_INSTRUMENTATION"
+# When set, every traced run is appended to this file as JSON lines
+EXPORT_ENV = "DASHBOARD_TRACE_PATH"
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """Resident set size in bytes (peak RSS where /proc is not available, 0 where neither is)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def enabled_by_env():
+    return os.environ.get(ENABLE_ENV, "").lower() in ("1", "true", "yes")
+
+
+class NullSpan:
+    """What a disabled tracer hands out: entering, leaving and setting `rows` all do nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """One timed stage: wall time, RSS delta and (optionally) the number of rows it handled."""
+
+    def __init__(self, tracer, name, rows=None):
+        self.tracer = tracer
+        self.name = name
+        self.rows = rows
+        self.parent = None
+        self.started = None
+        self.seconds = None
+        self.memory_delta = None
+
+    def __enter__(self):
+        stack = self.tracer.stack
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.rss = current_rss()
+        self.started = time.time()
+        self.clock = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.clock
+        self.memory_delta = current_rss() - self.rss
+        self.tracer.stack.pop()
+        self.tracer.spans.append(self)
+        return False
+
+    def record(self):
+        return {
+            'run': self.tracer.run_id,
+            'stage': self.name,
+            'parent': self.parent,
+            'started': self.started,
+            'seconds': self.seconds,
+            'rows': self.rows,
+            'memory_delta_bytes': self.memory_delta,
+        }
+
+
+class Tracer:
+    """Collects spans for one script run. Disabled tracers cost one attribute check per span."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.run_id = f"{time.time():.6f}-{os.getpid()}"
+        self.spans = []
+        self.stack = []
+
+    def span(self, name, rows=None):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, rows)
+
+    def record(self, name, seconds, rows=None, memory_delta=None):
+        """Add a span measured elsewhere (e.g. a chart rendered in a worker process)."""
+        if not self.enabled:
+            return
+        span = Span(self, name, rows)
+        span.parent = self.stack[-1].name if self.stack else None
+        span.started = time.time() - seconds
+        span.seconds = seconds
+        span.memory_delta = memory_delta
+        self.spans.append(span)
+
+    def records(self):
+        return [span.record() for span in self.spans]
+
+    # --- Export ---
+    def json_lines(self):
+        return "".join(json.dumps(record) + "\n" for record in self.records())
+
+    def prometheus(self):
+        """Prometheus text exposition of the run; repeated stage names are summed."""
+        totals = {}
+        for record in self.records():
+            seconds, rows, memory = totals.get(record['stage'], (0.0, None, None))
+            totals[record['stage']] = (
+                seconds + record['seconds'],
+                record['rows'] if record['rows'] is not None else rows,
+                (memory or 0) + record['memory_delta_bytes'] if record['memory_delta_bytes'] is not None else memory,
+            )
+        metrics = [
+            ('dashboard_stage_seconds', "Wall time of a dashboard stage in the last traced run.", 0),
+            ('dashboard_stage_rows', "Rows handled by a dashboard stage in the last traced run.", 1),
+            ('dashboard_stage_memory_delta_bytes', "RSS change across a dashboard stage in the last traced run.", 2),
+        ]
+        lines = []
+        for metric, help_text, position in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, values in totals.items():
+                if values[position] is not None:
+                    label = stage.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                    lines.append(f'{metric}{{stage="{label}"}} {values[position]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=None):
+        """Append this run's spans as JSON lines to `path` (default: $DASHBOARD_TRACE_PATH, if set)."""
+        path = path or os.environ.get(EXPORT_ENV)
+        if not path or not self.spans:
+            return
+        with open(path, "a") as handle:
+            handle.write(self.json_lines())
+
+
+NULL_TRACER = Tracer(enabled=False)
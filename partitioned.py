@@ -0,0 +1,168 @@
+import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis import FrameAggregator, MEASURES, QUESTION_GROUPINGS, answer_questions, empty_aggregate
+from data_loader import add_month, iter_source_chunks
+from filters import FilterIndex, Filters
+from schema import apply_schema, to_cents
+from xlsx_stream import DEFAULT_CHUNK_ROWS
+
+PARTITION_PREFIX = "month="
+
+# Q2's "above the average" cut depends on the global mean, which no single partition knows. Each
+# partition therefore also reports row counts per (City, Payment_Method, amount in cents); these
+# add up across partitions and give the exact count above any threshold once the mean is known.
+THRESHOLD_GROUPING = ['City', 'Payment_Method']
+
+
+# --- Partitioning ---
+def partition_dataset(source, output_dir, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream a workbook (or CSV) into one directory per year-month, one file per chunk piece.
+
+    Memory stays bounded by `chunk_rows`; returns the partition directories written. An existing
+    `output_dir` must be a partition root: its month=* directories are replaced, and a directory
+    holding anything else is refused rather than emptied.
+    """
+    if os.path.isdir(output_dir):
+        foreign = sorted(
+            name for name in os.listdir(output_dir)
+            if not (name.startswith(PARTITION_PREFIX) and os.path.isdir(os.path.join(output_dir, name)))
+        )
+        if foreign:
+            raise ValueError(
+                f"{output_dir} is not a partition directory (it holds {', '.join(foreign[:3])}"
+                f"{', ...' if len(foreign) > 3 else ''}); choose an empty or new directory"
+            )
+        for directory in partition_dirs(output_dir):
+            shutil.rmtree(directory)
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = set()
+    for index, chunk in enumerate(iter_source_chunks(source, chunk_rows)):
+        months = chunk['Date'].dt.to_period('M').astype(str)
+        for month, piece in chunk.groupby(months, sort=False):
+            directory = os.path.join(output_dir, f"{PARTITION_PREFIX}{month}")
+            os.makedirs(directory, exist_ok=True)
+            apply_schema(piece.reset_index(drop=True)).to_pickle(os.path.join(directory, f"part-{index:06d}.pkl"))
+            partitions.add(directory)
+    return sorted(partitions)
+
+
+def partition_dirs(partition_root):
+    return sorted(
+        os.path.join(partition_root, name)
+        for name in os.listdir(partition_root)
+        if name.startswith(PARTITION_PREFIX)
+    )
+
+
+def read_partition(directory):
+    pieces = [pd.read_pickle(os.path.join(directory, name)) for name in sorted(os.listdir(directory)) if name.endswith(".pkl")]
+    # Pieces carry their own category sets; re-encode once they are combined
+    return add_month(apply_schema(pd.concat(pieces, ignore_index=True)))
+
+
+# --- Map ---
+def partition_partials(task):
+    """Worker: partial aggregates of one partition (only this partition is ever in memory)."""
+    directory, filters = task
+    transactions_df = read_partition(directory)
+    rows = FilterIndex(transactions_df).select(filters)
+    source = FrameAggregator(transactions_df).select(rows)
+    partials = {tuple(by): source.aggregate(by) for by in QUESTION_GROUPINGS}
+    selected = transactions_df if rows is None else transactions_df.iloc[rows]
+    keep = selected['City'].notna().to_numpy() & selected['Payment_Method'].notna().to_numpy()
+    partials['threshold'] = (
+        pd.DataFrame({
+            'City': selected['City'].to_numpy()[keep],
+            'Payment_Method': selected['Payment_Method'].to_numpy()[keep],
+            'cents': to_cents(selected['Amount($)'].to_numpy()[keep]),
+        })
+        .value_counts()
+        .rename('count')
+        .reset_index()
+    )
+    count, amount_sum = source.totals()
+    partials['totals'] = (count, amount_sum)
+    return partials
+
+
+# --- Reduce ---
+def merge_aggregates(by, tables):
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return empty_aggregate(by)
+    return pd.concat(tables, ignore_index=True).groupby(by, sort=True, observed=True)[MEASURES].sum().reset_index()
+
+
+class MergedSource:
+    """Aggregate source (same interface as analysis.Selection) over merged partition partials."""
+
+    def __init__(self, partials):
+        self.tables = {
+            tuple(by): merge_aggregates(by, [partial[tuple(by)] for partial in partials]) for by in QUESTION_GROUPINGS
+        }
+        threshold = [partial['threshold'] for partial in partials if len(partial['threshold'])]
+        self.threshold = (
+            pd.concat(threshold, ignore_index=True).groupby([*THRESHOLD_GROUPING, 'cents'], sort=True)['count'].sum().reset_index()
+            if threshold else pd.DataFrame(columns=[*THRESHOLD_GROUPING, 'cents', 'count'])
+        )
+        self.count = sum(partial['totals'][0] for partial in partials)
+        self.amount_sum = sum(partial['totals'][1] for partial in partials)
+
+    def totals(self):
+        return self.count, self.amount_sum
+
+    def aggregate(self, by, amount_above=None):
+        if amount_above is None:
+            return self.tables[tuple(by)]
+        if list(by) != THRESHOLD_GROUPING:
+            raise ValueError(f"Amount thresholds are only kept for {THRESHOLD_GROUPING}")
+        above = self.threshold[self.threshold['cents'] > np.floor(amount_above * 100)] if not np.isnan(amount_above) else self.threshold.iloc[:0]
+        counts = above.groupby(THRESHOLD_GROUPING, sort=True)['count'].sum().reset_index()
+        # Only the count is needed for Q2; sums of the above-average rows are not tracked
+        counts['amount_sum'] = np.nan
+        counts['items_sum'] = np.nan
+        return counts
+
+
+def answer_partitioned(partition_root, filters=Filters(), workers=None):
+    """Exact Q1-Q5 answers over a partitioned dataset, one partition per worker task."""
+    directories = partition_dirs(partition_root)
+    if filters.date_range is not None:
+        # Month partitions entirely outside the date range are never read
+        first, last = (f"{PARTITION_PREFIX}{bound:%Y-%m}" for bound in filters.date_range)
+        directories = [directory for directory in directories if first <= os.path.basename(directory) <= last]
+    tasks = [(directory, filters) for directory in directories]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        partials = list(executor.map(partition_partials, tasks))
+    return answer_questions(MergedSource(partials))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition the transactions by month and answer Q1-Q5 out of core.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="Write one partition per year-month")
+    split.add_argument("source", help="Workbook (.xlsx) or .csv export")
+    split.add_argument("--output", default="./partitions")
+    split.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    run = commands.add_parser("run", help="Answer Q1-Q5 over the partitions")
+    run.add_argument("partitions", nargs="?", default="./partitions")
+    run.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.command == "split":
+        written = partition_dataset(args.source, args.output, args.chunk_rows)
+        print(f"Wrote {len(written)} partitions to {args.output}")
+        return
+    for name, answer in answer_partitioned(args.partitions, workers=args.workers).items():
+        print(f"--- {name} ---")
+        print(answer.to_string() if isinstance(answer, pd.DataFrame) else answer)
+        print()
+
+
+if __name__ == "__main__":
+    main()
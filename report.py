@@ -0,0 +1,137 @@
+import argparse
+import base64
+import hashlib
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis import answer_questions
+from charts import question_chart_specs, render_charts
+from data_loader import load_cube
+from filters import Filters
+
+# Aggregate tables written for every workbook, with the heading each gets in the HTML bundle
+REPORT_TABLES = {
+    'average_transaction_by_store_season': "1. Average transaction amount ($) across store types by season",
+    'most_common_payment_method': "2. Most common payment method for high-value transactions across cities",
+    'sales_with_without_discount': "3. Sales amounts with and without discounts over the months",
+    'top_cities': "4. Top three cities by average items per transaction",
+    'sales_by_city_season': "4. Seasonal sales for the top cities",
+    'promotion_effectiveness': "5. Average transaction amount by promotion and season",
+}
+
+# Which charts follow which table in the HTML bundle
+TABLE_CHARTS = {
+    'average_transaction_by_store_season': 'store_season',
+    'most_common_payment_method': 'payment_method',
+    'sales_with_without_discount': 'discount_sales',
+    'sales_by_city_season': 'top_cities',
+    'promotion_effectiveness': 'promotion',
+}
+
+REPORT_STYLE = """
+body { font-family: sans-serif; max-width: 1000px; margin: 2em auto; color: #333; }
+section { background-color: #f0f0f0; padding: 20px; border-radius: 10px; margin-bottom: 20px;
+          box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); }
+table { border-collapse: collapse; margin-bottom: 1em; }
+th, td { padding: 4px 10px; border-bottom: 1px solid #ccc; text-align: right; }
+img { max-width: 100%; display: block; margin: 1em 0; }
+"""
+
+
+def compute_workbook(path):
+    """Worker: load one workbook through its cache and compute the Q1-Q5 answers."""
+    cube = load_cube(path)
+    return path, cube.rows, answer_questions(cube.select(Filters()))
+
+
+def write_tables(answers, directory, table_format):
+    for name in REPORT_TABLES:
+        table = answers[name]
+        # Q3 is indexed by month; every other table has a plain row index
+        keep_index = name == 'sales_with_without_discount'
+        if table_format == 'parquet':
+            table.to_parquet(os.path.join(directory, f"{name}.parquet"), index=keep_index)
+        else:
+            table.to_csv(os.path.join(directory, f"{name}.csv"), index=keep_index)
+
+
+def html_report(title, rows, answers, specs, images):
+    charts = {}
+    for (kind, _, _), image in zip(specs, images):
+        charts.setdefault(kind, []).append(base64.b64encode(image).decode('ascii'))
+    sections = []
+    for name, heading in REPORT_TABLES.items():
+        table = answers[name]
+        body = table.to_html(index=name == 'sales_with_without_discount', float_format=lambda value: f"{value:,.2f}")
+        images_html = "".join(
+            f'<img src="data:image/png;base64,{image}" alt="{html.escape(heading)}">'
+            for image in charts.get(TABLE_CHARTS.get(name), [])
+        )
+        sections.append(f"<section><h2>{html.escape(heading)}</h2>{body}{images_html}</section>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(title)}</title><style>{REPORT_STYLE}</style></head><body>"
+        f"<h1>Business Insights Report: {html.escape(title)}</h1>"
+        f"<p>{rows:,} transactions, generated {time.strftime('%Y-%m-%d %H:%M:%S')}.</p>"
+        + "".join(sections)
+        + "</body></html>"
+    )
+
+
+def report_names(paths):
+    """Output directory name of each workbook: its file name without the extension, plus a short
+    hash of its full path when another workbook has the same file name."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    names = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}-{hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]}"
+        names.append(stem)
+    return names
+
+
+def build_reports(paths, output_dir, workers=None, table_format='csv'):
+    """Compute every workbook in parallel, render all their charts in one parallel batch, then write
+    one directory per workbook with report.html and the aggregate tables. Returns those directories."""
+    # A workbook named twice gets one report
+    paths = list(dict.fromkeys(os.path.abspath(path) for path in paths))
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(compute_workbook, paths))
+        specs = {}
+        for path, _, answers in results:
+            specs[path] = question_chart_specs(answers)[1]
+        all_specs = [spec for path, _, _ in results for spec in specs[path]]
+        all_images = render_charts(all_specs, executor=executor)
+    written = []
+    offset = 0
+    for (path, rows, answers), name in zip(results, report_names(paths)):
+        file_specs = specs[path]
+        images = all_images[offset:offset + len(file_specs)]
+        offset += len(file_specs)
+        directory = os.path.join(output_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        write_tables(answers, directory, table_format)
+        with open(os.path.join(directory, "report.html"), "w", encoding="utf-8") as handle:
+            handle.write(html_report(name, rows, answers, file_specs, images))
+        written.append(directory)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the Q1-Q5 tables and charts without starting Streamlit.")
+    parser.add_argument("workbooks", nargs="*", default=["./Transactions.xlsx"], help="Transaction workbooks (one report each)")
+    parser.add_argument("--output", default="./reports", help="Directory the reports are written to")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Format of the aggregate tables")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    for directory in build_reports(args.workbooks, args.output, args.workers, args.format):
+        print(f"Wrote {directory}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
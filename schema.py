@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the Transactions.xlsx export, in sheet order, with the kind of value each holds
+COLUMN_KINDS = {
+    'Transaction_ID': 'int',
+    'Date': 'datetime',
+    'Customer_Name': 'str',
+    'Total_Items': 'int',
+    'Amount($)': 'float',
+    'Payment_Method': 'str',
+    'City': 'str',
+    'Store_Type': 'str',
+    'Discount_Applied': 'bool',
+    'Customer_Category': 'str',
+    'Season': 'str',
+    'Promotion': 'str',
+}
+
+TRANSACTION_COLUMNS = list(COLUMN_KINDS)
+
+# Columns stored as (codes, categories) pairs in the cache
+STRING_COLUMNS = [column for column, kind in COLUMN_KINDS.items() if kind == 'str']
+
+# --- Compact in-memory representation ---
+# Strings are held as categoricals (dictionary codes), amounts as float32, item counts in the
+# smallest integer type that fits, and dates as datetime64[ns] (an int64 epoch under the hood)
+AMOUNT_DTYPE = np.float32
+DATE_DTYPE = 'datetime64[ns]'
+
+# Layout of the Date text in the export, e.g. '2022-09-12 17:40:23'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Text read as True in a bool column (compared lower-cased); any other text is False
+TRUE_TEXT = ['true', '1', 'yes']
+
+
+def smallest_int_dtype(values):
+    """Smallest signed integer dtype that holds every value (int64 for empty input)."""
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.dtype(np.int64)
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def parse_dates(values):
+    """Date text as a datetime64[ns] Series, parsed in one pass with DATE_FORMAT.
+
+    Values that are already dates pass through. Text in another layout falls back to a single
+    ISO 8601 parse rather than pandas' per-value format inference.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype(DATE_DTYPE)
+    try:
+        parsed = pd.to_datetime(values, format=DATE_FORMAT)
+    except ValueError:
+        parsed = pd.to_datetime(values, format='ISO8601')
+    return parsed.astype(DATE_DTYPE)
+
+
+def apply_schema(transactions_df):
+    """Return transactions_df with the compact dtypes used throughout the dashboard."""
+    compact = {}
+    for column in transactions_df.columns:
+        values = transactions_df[column]
+        kind = COLUMN_KINDS.get(column)
+        if kind == 'str':
+            compact[column] = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+        elif kind == 'datetime':
+            compact[column] = parse_dates(values)
+        elif kind == 'bool':
+            compact[column] = values.astype(bool)
+        elif column == 'Amount($)':
+            compact[column] = values.astype(AMOUNT_DTYPE)
+        elif column == 'Total_Items':
+            compact[column] = values.astype(smallest_int_dtype(values))
+        else:
+            compact[column] = values
+    return pd.DataFrame(compact, index=transactions_df.index)
+
+
+def to_cents(amount):
+    """Dollar amounts as exact int64 cents."""
+    return np.rint(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64)
+
+
+def category_codes(values):
+    """(codes, labels) for a dimension column; missing values get code -1."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), list(values.cat.categories)
+    if values.dtype == bool:
+        return values.to_numpy().astype(np.int8), [False, True]
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, list(labels)
+
+
+def extend_labels(labels, new_labels):
+    """(labels extended append-only by the unseen `new_labels`, remap from `new_labels` codes).
+
+    Existing codes keep their meaning. The remap has a trailing -1, so indexing it with code -1
+    keeps missing values missing.
+    """
+    merged = list(labels)
+    positions = {label: position for position, label in enumerate(merged)}
+    for label in new_labels:
+        if label not in positions:
+            positions[label] = len(merged)
+            merged.append(label)
+    return merged, np.array([positions[label] for label in new_labels] + [-1], dtype=np.int32)
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+# --- Process pool ---
+# Modules imported by the forkserver before any worker forks (see preload_in_workers)
+worker_preload = []
+# Environment the forkserver starts with, e.g. a headless plotting backend
+worker_environ = {}
+
+pool = None
+pool_lock = threading.Lock()
+
+
+def preload_in_workers(*modules, **environ):
+    """Have the shared pool's workers start with `modules` imported and `environ` set.
+
+    Called at import time by the modules whose functions run in the pool, so the one forkserver
+    (there is only one per process) preloads all of them before the pool is first used.
+    """
+    for module in modules:
+        if module not in worker_preload:
+            worker_preload.append(module)
+    for name, value in environ.items():
+        worker_environ.setdefault(name, value)
+
+
+def process_pool():
+    """Process pool shared by every session; forkserver keeps workers clear of the server's threads."""
+    global pool
+    with pool_lock:
+        if pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            if context.get_start_method() == "forkserver":
+                for name, value in worker_environ.items():
+                    os.environ.setdefault(name, value)
+                context.set_forkserver_preload(list(worker_preload))
+            pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=context)
+        return pool
+
+
+# --- Memoization ---
+class LRUCache:
+    """Least-recently-used cache shared by every session.
+
+    Capped by number of entries, by total size in bytes of values that have a length (rendered
+    PNGs), or both; the most recent entry is always kept. Keys are content addresses, so a key
+    that is already cached is never overwritten.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = value
+            if self.max_bytes is not None:
+                self.size += len(value)
+            while len(self.entries) > 1 and self.full():
+                _, evicted = self.entries.popitem(last=False)
+                if self.max_bytes is not None:
+                    self.size -= len(evicted)
+
+    def full(self):
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.size > self.max_bytes
@@ -0,0 +1,451 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from filters import FILTER_COLUMNS, filter_mask
+from schema import category_codes, extend_labels
+
+# Sketches are kept per combination of the sidebar's categorical filters, so a filtered query merges
+# at most (store types x seasons x cities) small sketches whatever the number of rows
+CELL_COLUMNS = list(FILTER_COLUMNS.values())
+
+# t-digest compression: about COMPRESSION / 2 centroids per digest, finest in the tails
+COMPRESSION = 100
+# HyperLogLog registers per cell are 2 ** HLL_PRECISION; relative standard error 1.04 / sqrt(registers)
+HLL_PRECISION = 12
+# Payment methods monitored per cell by the heavy-hitter summary
+TOP_K = 3
+SKETCHES_NAME = "sketches.npz"
+
+
+# --- t-digest ---
+class TDigest:
+    """Mergeable quantile sketch of Amount($): weighted centroids sorted by mean.
+
+    The mean and count are exact; quantiles and ranks are interpolated between centroid centres,
+    so their error is about half the weight of the centroids next to the point asked about.
+    """
+
+    def __init__(self, means, weights, low, high, compression=COMPRESSION):
+        self.means = means
+        self.weights = weights
+        self.low = low
+        self.high = high
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values, compression=COMPRESSION):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls.empty(compression)
+        means, weights = np.unique(values, return_counts=True)
+        return cls(means, weights.astype(np.float64), values.min(), values.max(), compression).compressed()
+
+    @classmethod
+    def empty(cls, compression=COMPRESSION):
+        return cls(np.empty(0), np.empty(0), np.nan, np.nan, compression)
+
+    @classmethod
+    def merged(cls, digests, compression=COMPRESSION):
+        digests = [digest for digest in digests if digest.count]
+        if not digests:
+            return cls.empty(compression)
+        means = np.concatenate([digest.means for digest in digests])
+        weights = np.concatenate([digest.weights for digest in digests])
+        order = np.argsort(means, kind='stable')
+        low = min(digest.low for digest in digests)
+        high = max(digest.high for digest in digests)
+        return cls(means[order], weights[order], low, high, compression).compressed()
+
+    def compressed(self):
+        """Fold neighbouring centroids that fall in the same unit of the k1 scale function."""
+        if len(self.means) <= 1:
+            return self
+        cumulative = np.cumsum(self.weights)
+        middle = (cumulative - self.weights / 2) / cumulative[-1]
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * middle - 1)
+        _, groups = np.unique(np.floor(scale), return_inverse=True)
+        weights = np.bincount(groups, weights=self.weights)
+        means = np.bincount(groups, weights=self.means * self.weights) / weights
+        return TDigest(means, weights, self.low, self.high, self.compression)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def mean(self):
+        return float((self.means * self.weights).sum() / self.count) if self.count else float('nan')
+
+    def interpolation_points(self):
+        centres = np.cumsum(self.weights) - self.weights / 2
+        return np.concatenate([[0.0], centres, [self.count]]), np.concatenate([[self.low], self.means, [self.high]])
+
+    def quantile(self, q):
+        if not self.count:
+            return float('nan')
+        ranks, values = self.interpolation_points()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def rank(self, value):
+        """Estimated number of values <= `value`."""
+        if not self.count:
+            return 0.0
+        ranks, values = self.interpolation_points()
+        return float(np.interp(value, values, ranks))
+
+    def rank_error(self, value):
+        """Half the weight of the centroids either side of `value`: the interpolation error bound."""
+        if not self.count:
+            return 0.0
+        position = np.searchsorted(self.means, value)
+        neighbours = self.weights[max(position - 1, 0):position + 1]
+        return float(neighbours.sum() / 2)
+
+    def count_above(self, value):
+        """(estimate, error bound) of the number of values strictly above `value`."""
+        if not self.count or np.isnan(value):
+            return 0.0, 0.0
+        return self.count - self.rank(value), self.rank_error(value)
+
+    def edge_terms(self, low, high):
+        """(sum, count) of the centroids certain to lie within [low, high], and the weight of the
+        centroids either side of each edge, which may lie partly inside and partly outside it.
+
+        Only centroid means are known, so these edge weights are what the amount slider leaves in doubt.
+        """
+        kept = (self.means >= low) & (self.means <= high)
+        low_edge = np.zeros(len(self.means), dtype=bool)
+        position = np.searchsorted(self.means, low, side='left')
+        low_edge[max(position - 1, 0):position + 1] = True
+        high_edge = np.zeros(len(self.means), dtype=bool)
+        position = np.searchsorted(self.means, high, side='right')
+        high_edge[max(position - 1, 0):position + 1] = True
+        high_edge &= ~low_edge
+        certain = kept & ~low_edge & ~high_edge
+        return np.array([
+            (self.means[certain] * self.weights[certain]).sum(),
+            self.weights[certain].sum(),
+            self.weights[low_edge].sum(),
+            self.weights[high_edge].sum(),
+        ])
+
+    def restricted(self, low, high):
+        """Digest of the centroids whose mean lies in [low, high] (the amount slider)."""
+        keep = (self.means >= low) & (self.means <= high)
+        if not keep.any():
+            return TDigest.empty(self.compression)
+        return TDigest(self.means[keep], self.weights[keep], max(self.low, low), min(self.high, high), self.compression)
+
+
+# --- HyperLogLog ---
+def bit_length(values):
+    """Bit length of each uint64, by halving."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= (np.uint64(1) << np.uint64(shift))
+        length[big] += shift
+        values[big] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+def hll_registers(cell_ids, hashes, cells, precision=HLL_PRECISION):
+    """One HyperLogLog register array per cell from 64-bit hashes of the counted values."""
+    registers = np.zeros(cells << precision, dtype=np.uint8)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision) - bit_length(rest) + 1
+    np.maximum.at(registers, (cell_ids.astype(np.int64) << precision) + index, rank.astype(np.uint8))
+    return registers.reshape(cells, 1 << precision)
+
+
+def hll_estimate(registers):
+    """Distinct-count estimate of one register array, with linear counting for small counts."""
+    size = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / size)
+    estimate = alpha * size * size / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * size and zeros:
+        estimate = size * np.log(size / zeros)
+    return float(estimate)
+
+
+def hll_relative_error(precision=HLL_PRECISION):
+    return 1.04 / np.sqrt(1 << precision)
+
+
+# --- Heavy hitters ---
+def merge_top_k(summaries, k=TOP_K):
+    """Merge (counts, errors, floor) space-saving summaries into one holding the k largest counts.
+
+    `counts` are upper bounds and `counts - errors` lower bounds; an item a summary does not
+    monitor occurred at most `floor` times in it.
+    """
+    items = set()
+    for counts, _, _ in summaries:
+        items.update(counts)
+    merged_counts = {}
+    merged_errors = {}
+    for item in items:
+        merged_counts[item] = sum(counts.get(item, floor) for counts, _, floor in summaries)
+        merged_errors[item] = sum(errors[item] if item in counts else floor for counts, errors, floor in summaries)
+    ranked = sorted(items, key=lambda item: (-merged_counts[item], str(item)))
+    kept = ranked[:k]
+    floor = max((merged_counts[item] for item in ranked[k:]), default=sum(floor for _, _, floor in summaries))
+    return (
+        {item: merged_counts[item] for item in kept},
+        {item: merged_errors[item] for item in kept},
+        floor,
+    )
+
+
+# --- Sketch set ---
+class TransactionSketches:
+    """Approximate-mode summaries kept per (Store_Type, Season, City) cell and maintained at ingest.
+
+    - a t-digest of Amount($) per cell and Payment_Method (Q2 cut at the mean or any percentile)
+    - a space-saving top-k of Payment_Method per cell (heavy hitters per City)
+    - HyperLogLog registers of Customer_Name per cell (distinct customers)
+    """
+
+    def __init__(self, labels, cell_codes, digests, registers, top_k):
+        self.labels = labels
+        self.cell_codes = cell_codes
+        # {(cell, payment code): TDigest}; payment code -1 holds rows without a Payment_Method
+        self.digests = digests
+        self.registers = registers
+        # [(counts, errors, floor)] per cell, keyed by payment code
+        self.top_k = top_k
+        # Dataset fingerprint recorded by the last save or load; None for sketches built in memory
+        self.content = None
+
+    @classmethod
+    def from_frame(cls, transactions_df):
+        labels = {}
+        codes = []
+        for column in CELL_COLUMNS:
+            column_codes, labels[column] = category_codes(transactions_df[column])
+            codes.append(column_codes.astype(np.int64))
+        payment_codes, labels['Payment_Method'] = category_codes(transactions_df['Payment_Method'])
+        payment_codes = payment_codes.astype(np.int64)
+        stacked = np.stack(codes, axis=1) if len(transactions_df) else np.empty((0, len(CELL_COLUMNS)), dtype=np.int64)
+        cell_codes, cell_ids = np.unique(stacked, axis=0, return_inverse=True)
+        cell_ids = cell_ids.reshape(-1)
+        cells = len(cell_codes)
+        amount = transactions_df['Amount($)'].to_numpy(dtype=np.float64)
+        digests = {}
+        order = np.lexsort((payment_codes, cell_ids))
+        keys = cell_ids[order] * (len(labels['Payment_Method']) + 1) + payment_codes[order] + 1
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        for start, end in zip(starts, np.r_[starts[1:], len(keys)]):
+            rows = order[start:end]
+            digests[(int(cell_ids[rows[0]]), int(payment_codes[rows[0]]))] = TDigest.from_values(amount[rows])
+        hashes = pd.util.hash_pandas_object(transactions_df['Customer_Name'], index=False).to_numpy()
+        registers = hll_registers(cell_ids, hashes, cells)
+        counts = np.zeros((cells, len(labels['Payment_Method'])), dtype=np.int64)
+        known = payment_codes >= 0
+        np.add.at(counts, (cell_ids[known], payment_codes[known]), 1)
+        top_k = []
+        for cell_counts in counts:
+            ranked = [code for code in np.argsort(-cell_counts, kind='stable') if cell_counts[code]]
+            kept = ranked[:TOP_K]
+            top_k.append((
+                {int(code): int(cell_counts[code]) for code in kept},
+                {int(code): 0 for code in kept},
+                int(cell_counts[ranked[TOP_K]]) if len(ranked) > TOP_K else 0,
+            ))
+        return cls(labels, cell_codes.astype(np.int32), digests, registers, top_k)
+
+    @property
+    def cells(self):
+        return len(self.cell_codes)
+
+    # --- Incremental updates ---
+    def merge(self, other):
+        """Return sketches covering the rows of both (e.g. the stored history plus a new batch)."""
+        labels = {}
+        remaps = {}
+        for column in [*CELL_COLUMNS, 'Payment_Method']:
+            labels[column], remaps[column] = extend_labels(self.labels[column], other.labels[column])
+        cell_positions = {tuple(codes): cell for cell, codes in enumerate(self.cell_codes.tolist())}
+        cell_codes = list(self.cell_codes.tolist())
+        mapping = []
+        for codes in other.cell_codes.tolist():
+            key = tuple(int(remaps[column][code]) for column, code in zip(CELL_COLUMNS, codes))
+            if key not in cell_positions:
+                cell_positions[key] = len(cell_codes)
+                cell_codes.append(list(key))
+            mapping.append(cell_positions[key])
+        registers = np.zeros((len(cell_codes), self.registers.shape[1]), dtype=np.uint8)
+        registers[:self.cells] = self.registers
+        np.maximum.at(registers, np.asarray(mapping, dtype=np.int64), other.registers)
+        digests = dict(self.digests)
+        payment_remap = remaps['Payment_Method']
+        for (cell, payment), digest in other.digests.items():
+            key = (mapping[cell], int(payment_remap[payment]))
+            digests[key] = TDigest.merged([digests[key], digest]) if key in digests else digest
+        top_k = list(self.top_k) + [({}, {}, 0)] * (len(cell_codes) - self.cells)
+        for cell, (counts, errors, floor) in enumerate(other.top_k):
+            remapped = (
+                {int(payment_remap[code]): count for code, count in counts.items()},
+                {int(payment_remap[code]): error for code, error in errors.items()},
+                floor,
+            )
+            top_k[mapping[cell]] = merge_top_k([top_k[mapping[cell]], remapped])
+        return TransactionSketches(labels, np.asarray(cell_codes, dtype=np.int32).reshape(-1, len(CELL_COLUMNS)), digests, registers, top_k)
+
+    # --- Persistence ---
+    def save(self, directory, content=None):
+        """Write every sketch into one .npz, replaced atomically, tagged with the dataset `content` it covers."""
+        os.makedirs(directory, exist_ok=True)
+        keys = sorted(self.digests)
+        digests = [self.digests[key] for key in keys]
+        top_rows = [
+            (cell, code, count, errors[code])
+            for cell, (counts, errors, _) in enumerate(self.top_k)
+            for code, count in counts.items()
+        ]
+        arrays = {f"labels_{column}": np.asarray(labels, dtype=str) for column, labels in self.labels.items()}
+        arrays.update(
+            cell_codes=self.cell_codes,
+            registers=self.registers,
+            digest_keys=np.asarray(keys, dtype=np.int64).reshape(-1, 2),
+            digest_sizes=np.asarray([len(digest.means) for digest in digests], dtype=np.int64),
+            digest_bounds=np.asarray([(digest.low, digest.high) for digest in digests], dtype=np.float64).reshape(-1, 2),
+            digest_means=np.concatenate([digest.means for digest in digests]) if digests else np.empty(0),
+            digest_weights=np.concatenate([digest.weights for digest in digests]) if digests else np.empty(0),
+            top_rows=np.asarray(top_rows, dtype=np.int64).reshape(-1, 4),
+            top_floors=np.asarray([floor for _, _, floor in self.top_k], dtype=np.int64),
+            content=np.asarray('' if content is None else content, dtype=str),
+        )
+        handle, staging = tempfile.mkstemp(dir=directory, prefix=".sketches-", suffix=".npz")
+        with os.fdopen(handle, "wb") as stream:
+            np.savez(stream, **arrays)
+        os.replace(staging, os.path.join(directory, SKETCHES_NAME))
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            stored = np.load(os.path.join(directory, SKETCHES_NAME))
+        except (OSError, ValueError):
+            return None
+        labels = {column: stored[f"labels_{column}"].tolist() for column in [*CELL_COLUMNS, 'Payment_Method']}
+        offsets = np.r_[0, np.cumsum(stored['digest_sizes'])]
+        means = stored['digest_means']
+        weights = stored['digest_weights']
+        digests = {}
+        for index, (cell, payment) in enumerate(stored['digest_keys'].tolist()):
+            low, high = stored['digest_bounds'][index]
+            span = slice(offsets[index], offsets[index + 1])
+            digests[(cell, payment)] = TDigest(means[span], weights[span], low, high)
+        top_k = [({}, {}, int(floor)) for floor in stored['top_floors']]
+        for cell, code, count, error in stored['top_rows'].tolist():
+            top_k[cell][0][code] = count
+            top_k[cell][1][code] = error
+        sketches = cls(labels, stored['cell_codes'], digests, stored['registers'], top_k)
+        sketches.content = str(stored['content']) if 'content' in stored else None
+        return sketches
+
+    # --- Queries ---
+    def cell_mask(self, filters):
+        """Cells whose Store_Type, Season and City pass `filters`."""
+        return filter_mask(filters, self.labels, lambda column: self.cell_codes[:, CELL_COLUMNS.index(column)], self.cells)
+
+    def select(self, filters):
+        return SketchSelection(self, filters)
+
+
+class SketchSelection:
+    """Approximate answers for one filter selection; cost follows the number of cells, not rows."""
+
+    def __init__(self, sketches, filters):
+        self.sketches = sketches
+        self.filters = filters
+        self.cell_ids = np.flatnonzero(sketches.cell_mask(filters))
+        selected = set(self.cell_ids.tolist())
+        self.digests = {key: digest for key, digest in sketches.digests.items() if key[0] in selected}
+        # (certain sum, certain count, low-edge weight, high-edge weight) summed over the digests; None without an amount range
+        self.edge_terms = None
+        if filters.amount_range is not None:
+            low, high = filters.amount_range
+            self.edge_terms = sum(
+                (digest.edge_terms(low, high) for digest in self.digests.values() if digest.count), np.zeros(4)
+            )
+            self.digests = {key: digest.restricted(low, high) for key, digest in self.digests.items()}
+        self.amount_digest = TDigest.merged(self.digests.values())
+
+    def label(self, column, code):
+        return self.sketches.labels[column][code]
+
+    def mean_bounds(self):
+        """(low, high) bounds of the mean Amount($) of the selection.
+
+        Exact without an amount range. With one, the edge centroids may belong either side of the
+        range: the low bound counts the whole low-edge weight at the range's low end and drops the
+        high edge, and the high bound does the reverse.
+        """
+        mean = self.amount_digest.mean()
+        if self.edge_terms is None or np.isnan(mean):
+            return mean, mean
+        low, high = self.filters.amount_range
+        total, count, low_weight, high_weight = self.edge_terms
+        lows = [(total + low * weight) / (count + weight) for weight in (0.0, low_weight) if count + weight]
+        highs = [(total + high * weight) / (count + weight) for weight in (0.0, high_weight) if count + weight]
+        return min([mean, *lows]), max([mean, *highs])
+
+    def high_value_cut(self, percentile=None):
+        """(cut, low, high): the mean or the given percentile of Amount($), with its bounds."""
+        digest = self.amount_digest
+        if percentile is None:
+            return (digest.mean(), *self.mean_bounds())
+        cut = digest.quantile(percentile / 100)
+        slack = digest.rank_error(cut) / digest.count if digest.count else 0.0
+        return cut, digest.quantile(max(percentile / 100 - slack, 0)), digest.quantile(min(percentile / 100 + slack, 1))
+
+    def most_common_payment_method(self, cut):
+        """Q2 from the digests: per City, the payment method with the most transactions above `cut`."""
+        city_position = CELL_COLUMNS.index('City')
+        grouped = {}
+        for (cell, payment), digest in self.digests.items():
+            city = self.sketches.cell_codes[cell, city_position]
+            if payment < 0 or city < 0:
+                continue
+            grouped.setdefault((int(city), payment), []).append(digest)
+        rows = []
+        for (city, payment), digests in grouped.items():
+            count, error = TDigest.merged(digests).count_above(cut)
+            rows.append((self.label('City', city), self.label('Payment_Method', payment), count, error))
+        table = pd.DataFrame(rows, columns=['City', 'Payment_Method', 'Count', 'Count ±'])
+        if table.empty:
+            return table
+        table = table.sort_values(['City', 'Payment_Method']).reset_index(drop=True)
+        return table.loc[table.groupby('City')['Count'].idxmax()].sort_values(by='City').round({'Count': 0, 'Count ±': 0})
+
+    def top_payment_methods(self):
+        """Heavy hitters of Payment_Method per City (all amounts), with count bounds."""
+        city_position = CELL_COLUMNS.index('City')
+        summaries = {}
+        for cell in self.cell_ids:
+            city = int(self.sketches.cell_codes[cell, city_position])
+            if city >= 0:
+                summaries.setdefault(city, []).append(self.sketches.top_k[cell])
+        rows = []
+        for city, city_summaries in sorted(summaries.items(), key=lambda item: self.label('City', item[0])):
+            counts, errors, _ = merge_top_k(city_summaries)
+            for rank, (code, count) in enumerate(sorted(counts.items(), key=lambda item: -item[1]), start=1):
+                rows.append((self.label('City', city), rank, self.label('Payment_Method', code), count, errors[code]))
+        return pd.DataFrame(rows, columns=['City', 'Rank', 'Payment_Method', 'Count', 'Count ±'])
+
+    def distinct_customers(self, column):
+        """HyperLogLog distinct Customer_Name per value of one cell column, with ±1 standard error."""
+        position = CELL_COLUMNS.index(column)
+        codes = self.sketches.cell_codes[self.cell_ids, position]
+        rows = []
+        for code in np.unique(codes[codes >= 0]):
+            registers = self.sketches.registers[self.cell_ids[codes == code]].max(axis=0)
+            estimate = hll_estimate(registers)
+            rows.append((self.label(column, code), round(estimate), round(estimate * hll_relative_error())))
+        table = pd.DataFrame(rows, columns=[column, 'Distinct Customers', 'Distinct Customers ±'])
+        return table.sort_values(column).reset_index(drop=True)
@@ -0,0 +1,112 @@
+import gc
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+from data_loader import dataset_stamp, load_cube, load_customer_segments, load_sketches, load_time_index
+from instrumentation import NULL_TRACER
+from sqlite_store import load_database
+
+# How often the watcher checks the workbook and the cache manifest for changes
+POLL_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything the dashboard reads for one version of the dataset. Never modified once built:
+    cache files are replaced rather than rewritten, and the SQLite store is pinned to the rows it
+    was opened with (see sqlite_store.TransactionDatabase)."""
+    stamp: tuple
+    store: object
+    sketches: object
+    time_index: object
+    loaded_at: float
+    path: str = None
+    # Filled in by customer_segments() on first use
+    segments: object = field(default=None, compare=False, repr=False)
+    segments_lock: object = field(default_factory=threading.Lock, compare=False, repr=False)
+
+    def customer_segments(self, tracer=NULL_TRACER):
+        """Per-customer RFM segments and clusters, a full per-customer frame under either backend.
+
+        Computed (or read from the cache) the first time the Customers tab asks, then kept for
+        the snapshot's lifetime; a snapshot that is never asked never pays for the clustering.
+        """
+        with self.segments_lock:
+            if self.segments is None:
+                object.__setattr__(self, 'segments', load_customer_segments(self.path, tracer=tracer))
+            return self.segments
+
+
+def load_snapshot(path, backend="cube", tracer=NULL_TRACER):
+    """Build a snapshot: the query store for `backend` ("cube" or "sqlite"), sketches and the
+    Date index (cube backend only; the database answers date queries itself)."""
+    quick = dataset_stamp(path)
+    if backend == "sqlite":
+        store, time_index = load_database(path), None
+    else:
+        store, time_index = load_cube(path, tracer=tracer), load_time_index(path, tracer=tracer)
+    sketches = load_sketches(path)
+    # The source part of the stamp is taken before loading, so a workbook replaced mid-build is
+    # still seen as a change; the manifest part after, since loading may itself rewrite the manifest
+    stamp = (*quick[:2], dataset_stamp(path)[2])
+    return Snapshot(stamp, store, sketches, time_index, time.time(), path)
+
+
+class SnapshotWatcher:
+    """Serves the current Snapshot and replaces it from a background thread when the data changes.
+
+    Readers take `watcher.snapshot` once per run and keep using that object, so a swap (a single
+    attribute assignment) never mixes two versions within a run. A rebuild starts only once the
+    snapshot it retired last time has been released, so at most two are ever alive: the one being
+    served and the one being built.
+    """
+
+    def __init__(self, path, backend="cube", interval=POLL_SECONDS, loader=load_snapshot, tracer=NULL_TRACER):
+        self.path = path
+        self.backend = backend
+        self.interval = interval
+        self.loader = loader
+        # The first snapshot is built by the caller; only later ones are built in the background
+        self.snapshot = loader(path, backend, tracer)
+        self.retired = None
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.watch, name="dataset-watcher", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            self.refresh()
+
+    def refresh(self):
+        """Rebuild and swap in a new snapshot if the data changed; returns whether it swapped."""
+        if self.retired is not None and self.retired() is not None:
+            # Runs drop their snapshot when they finish, but a reference cycle can keep it a while
+            gc.collect()
+            if self.retired() is not None:
+                # A run still holds the snapshot before this one; building now would make three
+                return False
+        try:
+            if dataset_stamp(self.path) == self.snapshot.stamp:
+                return False
+            snapshot = self.loader(self.path, self.backend)
+        except Exception as error:
+            # Keep serving the last good snapshot; the next poll tries again
+            self.error = error
+            return False
+        self.error = None
+        self.retired = weakref.ref(self.snapshot)
+        self.snapshot = snapshot
+        return True
@@ -0,0 +1,382 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from analysis import MEASURES, empty_aggregate
+from cube import cents_bounds
+from data_loader import (
+    add_month, cache_dir_for, cache_lock, columns_to_frame, dataset_fingerprint, ensure_cache, part_dirs, read_part,
+)
+from filters import FILTER_COLUMNS, day_bounds
+from schema import to_cents
+from timeindex import check_year_over_year, discount_trend_frame, year_over_year_frame
+
+DATABASE_NAME = "transactions.sqlite"
+INSERT_ROWS = 100_000
+
+# Amounts are stored as integer cents (exact sums, like the cube) and dates as int64 nanoseconds
+# since the epoch, so date ranges compare integers against the Date index
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    Transaction_ID INTEGER NOT NULL,
+    Date INTEGER,
+    Customer_Name TEXT,
+    Total_Items INTEGER NOT NULL,
+    Amount_Cents INTEGER NOT NULL,
+    Payment_Method TEXT,
+    City TEXT,
+    Store_Type TEXT,
+    Discount_Applied INTEGER NOT NULL,
+    Customer_Category TEXT,
+    Season TEXT,
+    Promotion TEXT,
+    Month INTEGER
+);
+CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS transactions_filters ON transactions (Store_Type, Season, City, Amount_Cents);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (Date);
+CREATE INDEX IF NOT EXISTS transactions_amount ON transactions (Amount_Cents);
+"""
+COLUMNS = [
+    'Transaction_ID', 'Date', 'Customer_Name', 'Total_Items', 'Amount_Cents', 'Payment_Method', 'City',
+    'Store_Type', 'Discount_Applied', 'Customer_Category', 'Season', 'Promotion', 'Month',
+]
+
+# Period numbers since the epoch, matching timeindex.period_keys
+NS_PER_DAY = 86_400_000_000_000
+PERIOD_KEYS = {
+    'hour': "Date / 3600000000000",
+    'day': f"Date / {NS_PER_DAY}",
+    'week': f"(Date / {NS_PER_DAY} + 3) / 7",
+    'month': "(CAST(strftime('%Y', Date / 1000000000, 'unixepoch') AS INTEGER) - 1970) * 12"
+             " + CAST(strftime('%m', Date / 1000000000, 'unixepoch') AS INTEGER) - 1",
+    'year': "CAST(strftime('%Y', Date / 1000000000, 'unixepoch') AS INTEGER) - 1970",
+}
+
+
+# --- Building ---
+def frame_rows(transactions_df):
+    """Row tuples in COLUMNS order, with missing labels as NULL."""
+    values = []
+    for column in COLUMNS:
+        if column == 'Amount_Cents':
+            values.append(to_cents(transactions_df['Amount($)'].to_numpy()).tolist())
+        elif column == 'Date':
+            dates = transactions_df['Date'].to_numpy(dtype='datetime64[ns]')
+            values.append([None if missing else date for missing, date in zip(np.isnat(dates), dates.view(np.int64).tolist())])
+        elif column == 'Discount_Applied':
+            values.append(transactions_df[column].to_numpy(dtype=bool).astype(np.int64).tolist())
+        elif column in ('Transaction_ID', 'Total_Items', 'Month'):
+            values.append(transactions_df[column].to_numpy().astype(np.int64).tolist())
+        else:
+            labels = transactions_df[column]
+            values.append(labels.astype(object).where(labels.notna(), None).tolist())
+    return zip(*values)
+
+
+def insert_part(connection, directory, categories, chunk_rows=INSERT_ROWS):
+    """Insert one cached part, a window of rows at a time (parts are memory-mapped)."""
+    columns = read_part(directory)
+    rows = len(columns['Transaction_ID'])
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    for start in range(0, rows, chunk_rows):
+        window = {column: values[start:start + chunk_rows] for column, values in columns.items()}
+        connection.executemany(
+            f"INSERT INTO transactions ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            frame_rows(add_month(columns_to_frame(window, categories))),
+        )
+
+
+def read_metadata(connection):
+    return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM metadata")}
+
+
+def span_union(first, second):
+    """Smallest [low, high] covering two spans, either of which may be None."""
+    if first is None or second is None:
+        return first if second is None else second
+    return [min(first[0], second[0]), max(first[1], second[1])]
+
+
+def summarize(connection, after_rowid=0, previous=None):
+    """Row count, amount and date spans and sidebar options of the rows past `after_rowid`, folded
+    into `previous`. Kept in the metadata table, so the sidebar never scans the transactions."""
+    count, low, high, first, last = connection.execute(
+        "SELECT COUNT(*), MIN(Amount_Cents), MAX(Amount_Cents), MIN(Date), MAX(Date) FROM transactions WHERE rowid > ?",
+        (after_rowid,),
+    ).fetchone()
+    summary = {
+        'rows': count,
+        'amount_cents': None if low is None else [low, high],
+        'dates': None if first is None else [first, last],
+        'options': {
+            column: [value for (value,) in connection.execute(
+                f"SELECT DISTINCT {column} FROM transactions WHERE rowid > ? AND {column} IS NOT NULL", (after_rowid,)
+            )]
+            for column in FILTER_COLUMNS.values()
+        },
+    }
+    if previous is not None:
+        summary['rows'] += previous['rows']
+        summary['amount_cents'] = span_union(previous['amount_cents'], summary['amount_cents'])
+        summary['dates'] = span_union(previous['dates'], summary['dates'])
+        for column, values in previous['options'].items():
+            summary['options'][column] = [*values, *summary['options'][column]]
+    summary['options'] = {column: sorted(set(values)) for column, values in summary['options'].items()}
+    return summary
+
+
+def build_database(cache_dir, manifest, database_path):
+    """Bring the database up to date with the columnar cache.
+
+    Segments appended since the last build are inserted on their own; a new base export
+    rebuilds the database in a staging file that then replaces the old one.
+    """
+    if os.path.exists(database_path):
+        connection = sqlite3.connect(database_path)
+        try:
+            metadata = read_metadata(connection)
+            loaded = metadata.get('segments', [])
+            segments = [segment['name'] for segment in manifest['segments']]
+            if metadata.get('base') == manifest['base'] and segments[:len(loaded)] == loaded:
+                if segments == loaded and 'summary' in metadata:
+                    return
+                with connection:
+                    # Only the new rows are summarized (databases built before summaries were kept get a full pass)
+                    previous = metadata.get('summary')
+                    (last_rowid,) = connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM transactions").fetchone()
+                    for directory, categories in part_dirs(cache_dir, manifest)[1 + len(loaded):]:
+                        insert_part(connection, directory, categories)
+                    summary = summarize(connection, last_rowid if previous else 0, previous)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO metadata VALUES ('segments', ?), ('fingerprint', ?), ('summary', ?)",
+                        (json.dumps(segments), json.dumps(dataset_fingerprint(manifest)), json.dumps(summary)),
+                    )
+                return
+        finally:
+            connection.close()
+    staging = f"{database_path}.tmp"
+    if os.path.exists(staging):
+        os.remove(staging)
+    connection = sqlite3.connect(staging)
+    try:
+        connection.executescript(SCHEMA)
+        with connection:
+            for directory, categories in part_dirs(cache_dir, manifest):
+                insert_part(connection, directory, categories)
+            # Indexes are built once after the bulk insert, which is faster than maintaining them row by row
+            connection.executescript(INDEXES)
+            connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", [
+                ('base', json.dumps(manifest['base'])),
+                ('segments', json.dumps([segment['name'] for segment in manifest['segments']])),
+                ('fingerprint', json.dumps(dataset_fingerprint(manifest))),
+                ('summary', json.dumps(summarize(connection))),
+            ])
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+    os.replace(staging, database_path)
+
+
+def load_database(path, cache_root=None):
+    """TransactionDatabase for the dataset, building or updating its SQLite file as needed."""
+    with cache_lock(cache_dir_for(path, cache_root)):
+        cache_dir, manifest = ensure_cache(path, cache_root)
+        database_path = os.path.join(cache_dir, DATABASE_NAME)
+        build_database(cache_dir, manifest, database_path)
+        # Opened under the lock, so it is pinned to the rows of exactly this build
+        return TransactionDatabase(database_path)
+
+
+# --- Querying ---
+def where_clause(filters):
+    """(SQL condition, parameters) for the sidebar filters; every filter becomes a predicate."""
+    conditions = []
+    parameters = []
+    for name, column in FILTER_COLUMNS.items():
+        values = getattr(filters, name)
+        if values is None:
+            continue
+        if not values:
+            conditions.append("0")
+            continue
+        conditions.append(f"{column} IN ({', '.join('?' for _ in values)})")
+        parameters.extend(values)
+    if filters.amount_range is not None:
+        conditions.append("Amount_Cents BETWEEN ? AND ?")
+        parameters.extend(cents_bounds(filters.amount_range))
+    if filters.date_range is not None:
+        start, end = day_bounds(filters.date_range)
+        conditions.append("Date >= ? AND Date < ?")
+        parameters.extend([int(start.astype(np.int64)), int(end.astype(np.int64))])
+    return " AND ".join(conditions) or "1", parameters
+
+
+class TransactionDatabase:
+    """Read-only queries against the SQLite copy of the dataset; only aggregates come back.
+
+    Offers the sidebar methods of TransactionCube (options, amount and date bounds, select) so the
+    dashboard can use either. Each thread gets its own read-only connection.
+
+    Answers only ever cover the rows present when it was opened: later appends land past
+    `last_rowid`, and while a rebuild swaps a new file in at the same path, `anchor` keeps the old
+    one open; threads that would open the new file share the anchor instead.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.local = threading.local()
+        self.anchor = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True, check_same_thread=False)
+        self.anchor_lock = threading.Lock()
+        (self.last_rowid,) = self.anchor.execute("SELECT COALESCE(MAX(rowid), 0) FROM transactions").fetchone()
+        (value,) = self.anchor.execute("SELECT value FROM metadata WHERE key = 'summary'").fetchone()
+        # Row count, spans and sidebar options recorded by build_database for these rows
+        self.summary = json.loads(value)
+        self.inode = os.stat(database_path).st_ino
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True, check_same_thread=False)
+            connection.execute("SELECT 1 FROM metadata LIMIT 1")
+            if os.stat(self.database_path).st_ino != self.inode:
+                # The file was rebuilt since; this connection may be reading the new one
+                connection.close()
+                connection = self.anchor
+            self.local.connection = connection
+        return connection
+
+    def query(self, sql, parameters=()):
+        connection = self.connection()
+        if connection is self.anchor:
+            with self.anchor_lock:
+                return connection.execute(sql, parameters).fetchall()
+        return connection.execute(sql, parameters).fetchall()
+
+    def where(self, filters):
+        """where_clause for the sidebar filters, limited to the rows this database was opened with."""
+        condition, parameters = where_clause(filters)
+        # The unary plus keeps the planner on the filter indexes rather than a rowid range scan
+        return f"+rowid <= ? AND {condition}", [self.last_rowid, *parameters]
+
+    @property
+    def rows(self):
+        return self.summary['rows']
+
+    def amount_bounds(self):
+        """(min, max) Amount($) in dollars."""
+        cents = self.summary['amount_cents']
+        return (0.0, 0.0) if cents is None else (cents[0] / 100, cents[1] / 100)
+
+    def date_bounds(self):
+        """(first, last) transaction day as datetime.date, or None for an empty database."""
+        dates = self.summary['dates']
+        if dates is None:
+            return None
+        return pd.Timestamp(dates[0]).date(), pd.Timestamp(dates[1]).date()
+
+    def options(self, column):
+        """Values of one dimension, for the sidebar; the filter columns come from the stored summary."""
+        if column in self.summary['options']:
+            return list(self.summary['options'][column])
+        return [value for (value,) in self.query(
+            f"SELECT DISTINCT {column} FROM transactions WHERE +rowid <= ? AND {column} IS NOT NULL ORDER BY {column}",
+            (self.last_rowid,),
+        )]
+
+    def select(self, filters):
+        return SQLiteSelection(self, filters)
+
+    # --- Discount trend (same output as timeindex.TimeIndex) ---
+    def period_sales(self, granularity, filters):
+        condition, parameters = self.where(filters)
+        key = PERIOD_KEYS[granularity]
+        rows = self.query(
+            f"SELECT {key} AS period,"
+            " SUM(CASE WHEN Discount_Applied THEN 0 ELSE Amount_Cents END),"
+            " SUM(CASE WHEN Discount_Applied THEN Amount_Cents ELSE 0 END)"
+            f" FROM transactions WHERE Date IS NOT NULL AND {condition} GROUP BY period ORDER BY period",
+            parameters,
+        )
+        table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        return table[:, 0], table[:, 1] / 100, table[:, 2] / 100
+
+    def discount_trend(self, granularity, filters):
+        return discount_trend_frame(granularity, *self.period_sales(granularity, filters))
+
+    def year_over_year(self, granularity, filters, discount=None):
+        check_year_over_year(granularity)
+        return year_over_year_frame(granularity, *self.period_sales(granularity, filters), discount)
+
+
+class SQLiteSelection:
+    """Aggregate source (same interface as analysis.Selection) answered by SQL with the filters pushed down."""
+
+    def __init__(self, database, filters):
+        self.database = database
+        self.filters = filters
+        self.condition, self.parameters = database.where(filters)
+
+    def totals(self):
+        """(count, amount_sum) of the selection."""
+        count, cents = self.database.query(
+            f"SELECT COUNT(*), SUM(Amount_Cents) FROM transactions WHERE {self.condition}", self.parameters
+        )[0]
+        return count, (cents or 0) / 100
+
+    def aggregate(self, by, amount_above=None):
+        """GROUP BY `by`; same output as analysis.Selection.aggregate."""
+        conditions = [self.condition, *(f"{column} IS NOT NULL" for column in by)]
+        parameters = list(self.parameters)
+        if amount_above is not None:
+            # Same cent arithmetic as the cube; nothing is above a NaN average
+            if np.isnan(amount_above):
+                conditions.append("0")
+            else:
+                conditions.append("Amount_Cents >= ?")
+                parameters.append(int(np.floor(amount_above * 100)) + 1)
+        groups = ", ".join(by)
+        rows = self.database.query(
+            f"SELECT {groups}, COUNT(*), SUM(Amount_Cents), SUM(Total_Items) FROM transactions"
+            f" WHERE {' AND '.join(conditions)} GROUP BY {groups} ORDER BY {groups}",
+            parameters,
+        )
+        if not rows:
+            return empty_aggregate(by)
+        result = pd.DataFrame(rows, columns=[*by, *MEASURES])
+        if 'Discount_Applied' in by:
+            result['Discount_Applied'] = result['Discount_Applied'].astype(bool)
+        result['amount_sum'] = result['amount_sum'] / 100
+        return result
+
+    def amount_histogram(self, by):
+        """Rows per (`by` labels, amount in cents), counted by the database."""
+        conditions = [self.condition, *(f"{column} IS NOT NULL" for column in by)]
+        groups = ", ".join([*by, 'Amount_Cents'])
+        rows = self.database.query(
+            f"SELECT {groups}, COUNT(*) FROM transactions WHERE {' AND '.join(conditions)} GROUP BY {groups} ORDER BY {groups}",
+            self.parameters,
+        )
+        result = pd.DataFrame(rows, columns=[*by, 'cents', 'count'])
+        if 'Discount_Applied' in by:
+            result['Discount_Applied'] = result['Discount_Applied'].astype(bool)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build (or update) the SQLite copy of the transactions.")
+    parser.add_argument("source", nargs="?", default="./Transactions.xlsx", help="Workbook (.xlsx) or .csv export")
+    args = parser.parse_args(argv)
+    database = load_database(args.source)
+    print(f"{database.database_path}: {database.rows:,} transactions")
+
+
+if __name__ == "__main__":
+    main()
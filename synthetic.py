@@ -0,0 +1,128 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import TRANSACTION_COLUMNS
+
+# Category values and shares as they appear in Transactions.xlsx (promotion is missing on a third of rows)
+CITIES = [
+    'Atlanta', 'Boston', 'Chicago', 'Dallas', 'Houston', 'Los Angeles', 'Miami', 'New York', 'San Francisco', 'Seattle',
+]
+STORE_TYPES = ['Convenience Store', 'Department Store', 'Pharmacy', 'Specialty Store', 'Supermarket', 'Warehouse Club']
+PAYMENT_METHODS = ['Cash', 'Credit Card', 'Debit Card', 'Mobile Payment']
+CUSTOMER_CATEGORIES = [
+    'Homemaker', 'Middle-Aged', 'Professional', 'Retiree', 'Senior Citizen', 'Student', 'Teenager', 'Young Adult',
+]
+SEASONS = ['Fall', 'Spring', 'Summer', 'Winter']
+PROMOTIONS = ['BOGO (Buy One Get One)', 'Discount on Selected Items', None]
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth', 'William',
+    'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Christopher', 'Karen', 'Charles', 'Lisa',
+    'Daniel', 'Nancy', 'Matthew', 'Betty', 'Anthony', 'Sandra', 'Mark', 'Ashley', 'Steven', 'Kimberly', 'Paul',
+    'Emily', 'Andrew', 'Donna', 'Joshua', 'Michelle', 'Kenneth', 'Carol', 'Kevin', 'Amanda', 'Brian', 'Melissa',
+    'George', 'Deborah', 'Timothy', 'Stephanie', 'Ronald', 'Chelsea', 'Jason', 'Rebecca', 'Edward', 'Laura',
+    'Jeffrey', 'Sharon', 'Ryan', 'Cynthia', 'Jacob', 'Kathleen',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson', 'Walker', 'Young',
+    'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores', 'Green', 'Adams', 'Nelson', 'Baker',
+    'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts', 'Gomez', 'Phillips', 'Evans', 'Turner', 'Diaz',
+    'Parker', 'Cruz', 'Edwards', 'Collins', 'Garza',
+]
+# Middle initials ("" for none) widen the name space for the larger scales
+MIDDLE_INITIALS = [''] + [f'{letter}. ' for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ']
+
+DATE_RANGE = (np.datetime64('2020-01-01T00:00:00'), np.datetime64('2024-05-18T23:59:59'))
+FIRST_TRANSACTION_ID = 1_000_000_000
+# Names are drawn with replacement from a pool this many times the row count, which leaves about 84
+# distinct customers per 100 transactions as in the bundled workbook
+CUSTOMERS_PER_ROW = 2.8
+# Excel's sheet limit, less the header row
+XLSX_MAX_ROWS = 1_048_575
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def customer_names(count):
+    combinations = len(FIRST_NAMES) * len(LAST_NAMES) * len(MIDDLE_INITIALS)
+    index = np.arange(min(count, combinations))
+    first = np.asarray(FIRST_NAMES, dtype=object)[index % len(FIRST_NAMES)]
+    last = np.asarray(LAST_NAMES, dtype=object)[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    middle = np.asarray(MIDDLE_INITIALS, dtype=object)[index // (len(FIRST_NAMES) * len(LAST_NAMES))]
+    return first + ' ' + middle + last
+
+
+def generate_chunk(rng, first_row, rows, customers):
+    """One chunk of transactions; IDs are unique across chunks and increase with `first_row`."""
+    start, end = DATE_RANGE
+    seconds = rng.integers(0, int((end - start) / np.timedelta64(1, 's')) + 1, rows)
+    # Sparse, shuffled IDs like the export's (about one ID in 25 is used)
+    ids = FIRST_TRANSACTION_ID + (first_row + np.arange(rows)) * 25 + rng.integers(0, 25, rows)
+    rng.shuffle(ids)
+    return pd.DataFrame({
+        'Transaction_ID': ids,
+        'Date': (start + seconds.astype('timedelta64[s]')).astype('datetime64[ns]'),
+        'Customer_Name': customers[rng.integers(0, len(customers), rows)],
+        'Total_Items': rng.integers(1, 11, rows),
+        'Amount($)': rng.integers(500, 10_001, rows) / 100,
+        'Payment_Method': rng.choice(PAYMENT_METHODS, rows),
+        'City': rng.choice(CITIES, rows),
+        'Store_Type': rng.choice(STORE_TYPES, rows),
+        'Discount_Applied': rng.random(rows) < 0.5,
+        'Customer_Category': rng.choice(CUSTOMER_CATEGORIES, rows),
+        'Season': rng.choice(SEASONS, rows),
+        'Promotion': np.asarray(PROMOTIONS, dtype=object)[rng.integers(0, len(PROMOTIONS), rows)],
+    })[TRANSACTION_COLUMNS]
+
+
+def iter_synthetic_chunks(rows, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    rng = np.random.default_rng(seed)
+    customers = customer_names(max(int(rows * CUSTOMERS_PER_ROW), 1))
+    for first_row in range(0, rows, chunk_rows):
+        yield generate_chunk(rng, first_row, min(chunk_rows, rows - first_row), customers)
+
+
+def write_synthetic(path, rows, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write `rows` synthetic transactions to an .xlsx (up to Excel's row limit) or .csv file."""
+    if path.lower().endswith(".xlsx"):
+        if rows > XLSX_MAX_ROWS:
+            raise ValueError(f"An .xlsx sheet holds at most {XLSX_MAX_ROWS:,} rows; write {rows:,} rows to a .csv instead")
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append(TRANSACTION_COLUMNS)
+        for chunk in iter_synthetic_chunks(rows, seed, chunk_rows):
+            chunk = chunk.astype({'Date': str}).astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(path)
+        return path
+    for index, chunk in enumerate(iter_synthetic_chunks(rows, seed, chunk_rows)):
+        chunk.to_csv(path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+    return path
+
+
+def synthetic_path(directory, rows):
+    """Default file for a scale: .xlsx where Excel can hold it, .csv beyond."""
+    extension = "xlsx" if rows <= XLSX_MAX_ROWS else "csv"
+    return os.path.join(directory, f"synthetic-{rows}.{extension}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write schema-faithful synthetic transactions.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--output", default="./benchmark_data", help="Directory the files are written to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    for rows in args.rows:
+        print(f"Wrote {write_synthetic(synthetic_path(args.output, rows), rows, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
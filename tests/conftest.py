@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import QUESTION_GROUPINGS  # noqa: E402
+from synthetic import iter_synthetic_chunks  # noqa: E402
+
+
+def synthetic_frame(rows, seed=0):
+    return pd.concat(list(iter_synthetic_chunks(rows, seed)), ignore_index=True)
+
+
+def normalized(aggregate, by):
+    """An aggregate with plain labels, in label order, so sources with different label orders compare."""
+    aggregate = aggregate.astype({column: object for column in by}).sort_values(by).reset_index(drop=True)
+    return aggregate[[*by, 'count', 'amount_sum', 'items_sum']].astype({'count': 'int64', 'items_sum': 'int64'})
+
+
+def assert_sources_agree(expected, sources):
+    for source in sources:
+        assert source.totals()[0] == expected.totals()[0]
+        assert source.totals()[1] == pytest.approx(expected.totals()[1])
+        for by in QUESTION_GROUPINGS:
+            pd.testing.assert_frame_equal(normalized(source.aggregate(by), by), normalized(expected.aggregate(by), by))
+        by = ['City', 'Payment_Method']
+        pd.testing.assert_frame_equal(
+            normalized(source.aggregate(by, amount_above=52.5), by), normalized(expected.aggregate(by, amount_above=52.5), by)
+        )
+        by = ['Season', 'Promotion']
+        pd.testing.assert_frame_equal(
+            source.amount_histogram(by).astype({'Season': object, 'Promotion': object}),
+            expected.amount_histogram(by).astype({'Season': object, 'Promotion': object}),
+            check_dtype=False,
+        )
+
+
+@pytest.fixture
+def transactions_df():
+    return synthetic_frame(600)
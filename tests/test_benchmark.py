@@ -0,0 +1,68 @@
+import json
+import time
+
+import benchmark
+from benchmark import dataset_stages, measure, regressions
+from synthetic import write_synthetic
+
+
+def results(seconds, peak_mb):
+    return {'1000': {'q1': {'seconds': seconds, 'peak_mb': peak_mb}}}
+
+
+def test_every_stage_runs(tmp_path):
+    path = write_synthetic(str(tmp_path / "synthetic.xlsx"), 300)
+    stages = dataset_stages(path)
+    names = [name for name, _ in stages]
+    assert len(set(names)) == len(names)
+    assert {'cache_build', 'q1', 'q5', 'sidebar_filtering', 'sqlite_filtering', 'bootstrap_effects'} <= set(names)
+    for _, function in stages:
+        function()
+
+
+def test_measure_keeps_the_best_run():
+    durations = iter([0.02, 0.0, 0.01, 0.0])
+
+    def stage():
+        bytearray(2**20)
+        time.sleep(next(durations))
+
+    seconds, peak_mb = measure(stage, repeat=3)
+    assert seconds < 0.015
+    assert peak_mb >= 1.0
+
+
+def test_regressions_need_both_the_tolerance_and_the_slack():
+    baseline = results(0.100, 50.0)
+    assert regressions(results(0.120, 55.0), baseline, 0.25) == []
+    slower, bigger = regressions(results(0.200, 100.0), baseline, 0.25)
+    assert '200.0 ms vs baseline 100.0 ms' in slower
+    assert '100.0 MB vs baseline 50.0 MB' in bigger
+    # A millisecond stage tripling in time is noise, not a regression
+    assert regressions(results(0.003, 0.1), results(0.001, 0.1), 0.25) == []
+    # Stages and scales missing from the baseline are not compared
+    assert regressions({'5000': {'q1': {'seconds': 9.0, 'peak_mb': 9.0}}}, baseline, 0.25) == []
+
+
+def test_main_saves_and_checks_a_baseline(tmp_path, monkeypatch, capsys):
+    measured = [results(0.100, 50.0)]
+    monkeypatch.setattr(benchmark, 'run_benchmarks', lambda scales, data_dir, repeat: measured[0])
+    baseline = str(tmp_path / "baseline.json")
+    arguments = ['--rows', '1000', '--baseline', baseline]
+    assert benchmark.main(arguments) == 0
+    assert 'No baseline' in capsys.readouterr().out
+    assert benchmark.main([*arguments, '--save-baseline']) == 0
+    with open(baseline) as handle:
+        assert json.load(handle) == measured[0]
+    assert benchmark.main(arguments) == 0
+    measured[0] = results(0.500, 50.0)
+    assert benchmark.main(arguments) == 1
+    assert 'REGRESSIONS (1)' in capsys.readouterr().err
+    assert benchmark.main([*arguments, '--tolerance', '5']) == 0
+
+
+def test_run_benchmarks_generates_missing_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, 'dataset_stages', lambda path: [('q1', lambda: None)])
+    found = benchmark.run_benchmarks([300], str(tmp_path / "data"), repeat=1)
+    assert list(found) == ['300'] and list(found['300']) == ['q1']
+    assert (tmp_path / "data" / "synthetic-300.xlsx").exists()
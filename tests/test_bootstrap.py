@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import FrameAggregator
+from bootstrap import EFFECTS, bootstrap_effects, compress_histogram, effects
+from conftest import synthetic_frame
+from data_loader import load_cube, load_time_index, load_transactions
+from filters import FilterIndex, Filters
+from shared import LRUCache, process_pool
+from sqlite_store import load_database
+
+
+def null_histogram(trials, rows, seed=0):
+    """Amount histogram of `trials` cells, each with groups 'A' and 'B' of `rows` amounts drawn
+    from the same distribution, whose mean is $50."""
+    rng = np.random.default_rng(seed)
+    tables = []
+    for trial in range(trials):
+        for group in ['A', 'B']:
+            cents, count = np.unique(np.rint(rng.normal(5000, 1500, rows)).astype(np.int64), return_counts=True)
+            tables.append(pd.DataFrame({'Trial': trial, 'Group': group, 'cents': cents, 'count': count}))
+    return pd.concat(tables, ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = tmp_path_factory.mktemp('bootstrap') / "Transactions.xlsx"
+    synthetic_frame(1500, seed=5).to_excel(path, index=False)
+    return str(path)
+
+
+def test_compressed_histogram_keeps_the_mean_and_count():
+    rng = np.random.default_rng(1)
+    cents = np.arange(100, 20000, 7)
+    counts = rng.integers(1, 50, len(cents))
+    values, binned = compress_histogram(cents, counts, max_bins=16)
+    assert len(values) <= 16
+    assert binned.sum() == counts.sum()
+    assert binned @ values == pytest.approx(counts @ cents / 100, rel=1e-12)
+    assert np.all(np.diff(values) > 0)
+
+
+@pytest.mark.parametrize('effect', list(EFFECTS))
+def test_pool_and_inline_runs_agree(workbook, effect):
+    cell, group, order = EFFECTS[effect]
+    histogram = FrameAggregator(load_transactions(workbook)).select(None).amount_histogram([cell, group])
+    inline = bootstrap_effects(histogram, cell, group, order, replicates=300, parallel=False)
+    pooled = bootstrap_effects(histogram, cell, group, order, replicates=300, executor=process_pool())
+    for expected, result in zip(inline, pooled):
+        pd.testing.assert_frame_equal(result, expected)
+    assert len(inline[0]) and len(inline[1])
+
+
+@pytest.mark.parametrize('effect', list(EFFECTS))
+@pytest.mark.parametrize('filters', [Filters(), Filters(store_types=('Pharmacy', 'Supermarket'))])
+def test_backends_draw_the_same_resamples(workbook, effect, filters):
+    transactions_df = load_transactions(workbook)
+    expected = effects(
+        FrameAggregator(transactions_df).select(FilterIndex(transactions_df).select(filters)), effect, replicates=300,
+        cache=LRUCache(),
+    )
+    for backend in [load_cube, load_time_index, load_database]:
+        result = effects(backend(workbook).select(filters), effect, replicates=300, cache=LRUCache())
+        for frame, expected_frame in zip(result, expected):
+            # Labels come back as categories or plain values depending on the backend
+            pd.testing.assert_frame_equal(frame, expected_frame, check_dtype=False, check_categorical=False)
+
+
+def test_intervals_cover_the_true_mean():
+    # Groups of 300 rows are resampled row by row, groups of 3000 through the compressed histogram
+    for rows in [300, 3000]:
+        intervals, _ = bootstrap_effects(null_histogram(200, rows), 'Trial', 'Group', ['A', 'B'], replicates=500,
+                                         parallel=False)
+        covered = ((intervals['Low'] <= 50) & (intervals['High'] >= 50)).mean()
+        assert 0.9 <= covered <= 0.99
+
+
+def test_equal_means_are_not_significant():
+    _, differences = bootstrap_effects(null_histogram(200, 500), 'Trial', 'Group', ['A', 'B'], replicates=500,
+                                       parallel=False)
+    # Under the null hypothesis p-values are uniform, so they average 0.5 and 5% fall below 0.05
+    assert differences['p-value'].mean() == pytest.approx(0.5, abs=0.07)
+    assert differences['Significant'].mean() <= 0.1
+    # Two identical groups differ by exactly zero and are never significant
+    histogram = null_histogram(1, 500)
+    histogram = pd.concat([histogram[histogram['Group'] == 'A'], histogram[histogram['Group'] == 'A'].assign(Group='B')])
+    _, differences = bootstrap_effects(histogram, 'Trial', 'Group', ['A', 'B'], replicates=500, parallel=False)
+    assert differences['Difference'].iloc[0] == 0
+    assert not differences['Significant'].iloc[0]
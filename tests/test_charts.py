@@ -0,0 +1,79 @@
+import charts
+from analysis import FrameAggregator, answer_questions
+from charts import chart_key, question_chart_specs, render_charts
+from data_loader import add_month
+from filters import FilterIndex, Filters
+from instrumentation import Tracer
+from shared import LRUCache
+
+
+def chart_specs(transactions_df, filters=Filters()):
+    transactions_df = add_month(transactions_df)
+    answers = answer_questions(FrameAggregator(transactions_df).select(FilterIndex(transactions_df).select(filters)))
+    return question_chart_specs(answers)[1]
+
+
+def test_equal_inputs_share_a_key(transactions_df):
+    # Separately computed answers hash alike, whatever the frames' identity
+    assert [chart_key(spec) for spec in chart_specs(transactions_df)] == [
+        chart_key(spec) for spec in chart_specs(transactions_df.copy())
+    ]
+    frame = chart_specs(transactions_df)[-1][1][0]
+    assert chart_key(('promotion', (frame,), {'a': 1, 'b': 2})) == chart_key(('promotion', (frame,), {'b': 2, 'a': 1}))
+
+
+def test_changed_data_or_style_changes_the_key(transactions_df):
+    keys = {kind: chart_key((kind, args, kwargs)) for kind, args, kwargs in chart_specs(transactions_df)[-5:]}
+    filtered = {
+        kind: chart_key((kind, args, kwargs))
+        for kind, args, kwargs in chart_specs(transactions_df, Filters(seasons=('Fall', 'Winter')))[-5:]
+    }
+    assert all(keys[kind] != filtered[kind] for kind in keys)
+    kind, (frame,), kwargs = chart_specs(transactions_df)[-1]
+    assert chart_key((kind, (frame,), {'palette': 'muted'})) != chart_key((kind, (frame,), kwargs))
+    # A cent's difference, or the same values under another column name, is other data
+    nudged = frame.assign(**{'Amount($)': frame['Amount($)'] + 0.01})
+    assert chart_key((kind, (nudged,), kwargs)) != chart_key((kind, (frame,), kwargs))
+    assert chart_key((kind, (frame.rename(columns={'Season': 'season'}),), kwargs)) != chart_key((kind, (frame,), kwargs))
+    store_charts = [spec for spec in chart_specs(transactions_df) if spec[0] == 'store_season']
+    first, second = store_charts[:2]
+    # Q1 charts differ only in their store type, position and color
+    assert chart_key(first) != chart_key(('store_season', (*first[1][:4], second[1][4]), {}))
+
+
+def test_cached_charts_are_not_rendered_again(transactions_df, monkeypatch):
+    specs = chart_specs(transactions_df)[-5:]
+    cache = LRUCache(max_entries=None, max_bytes=None)
+    tracer = Tracer(enabled=True)
+    images = render_charts(specs, cache, parallel=False, tracer=tracer)
+    assert all(image.startswith(b'\x89PNG') for image in images)
+    assert len(tracer.records()) == len(specs)
+
+    def fail(spec):
+        raise AssertionError("a cached chart was rendered again")
+
+    monkeypatch.setattr(charts, 'timed_render_png', fail)
+    assert render_charts(specs, cache, parallel=False, tracer=tracer) == images
+
+
+def test_eviction_keeps_the_cache_within_its_limit(transactions_df):
+    specs = chart_specs(transactions_df)[-5:]
+    sizes = [len(image) for image in render_charts(specs, LRUCache(), parallel=False)]
+    limit = sum(sizes) - min(sizes)
+    cache = LRUCache(max_entries=None, max_bytes=limit)
+    render_charts(specs, cache, parallel=False)
+    # The least recently used chart went; the rest fit the limit
+    assert cache.size <= limit
+    assert cache.get(chart_key(specs[0])) is None
+    assert cache.get(chart_key(specs[-1])) is not None
+    cache = LRUCache(max_entries=2)
+    render_charts(specs, cache, parallel=False)
+    assert len(cache.entries) == 2
+    assert [cache.get(chart_key(spec)) is not None for spec in specs] == [False, False, False, True, True]
+
+
+def test_pool_renders_match_inline_renders(transactions_df):
+    specs = chart_specs(transactions_df)[-3:]
+    inline = render_charts(specs, LRUCache(), parallel=False)
+    pooled = render_charts(specs, LRUCache(), executor=charts.process_pool())
+    assert pooled == inline
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from conftest import synthetic_frame
+from customers import customer_metrics, customer_segments, quintile_scores, rfm_segments
+
+
+def test_rfm_metrics():
+    transactions_df = pd.DataFrame({
+        'Customer_Name': ['Ann', 'Bob', 'Ann', 'Cid', 'Bob', None, 'Ann'],
+        'Date': pd.to_datetime([
+            '2023-01-01', '2023-01-05', '2023-01-10', '2023-01-02', '2023-01-03', '2023-01-20', None,
+        ]),
+        'Amount($)': [10.0, 20.0, 30.0, 5.0, 7.5, 100.0, 1000.0],
+        'Customer_Category': ['Student', 'Retiree', 'Teacher', 'Student', 'Retiree', 'Student', 'Student'],
+    })
+    metrics = customer_metrics(transactions_df).set_index('Customer_Name')
+    # Rows without a customer or a date are left out; recency counts back from the latest purchase kept (Jan 10)
+    assert list(metrics.index) == ['Ann', 'Bob', 'Cid']
+    assert metrics['Recency'].tolist() == [0, 5, 8]
+    assert metrics['Frequency'].tolist() == [2, 2, 1]
+    assert metrics['Monetary'].tolist() == [40.0, 27.5, 5.0]
+    assert metrics.loc['Ann', 'First_Purchase'] == pd.Timestamp('2023-01-01')
+    assert metrics.loc['Ann', 'Last_Purchase'] == pd.Timestamp('2023-01-10')
+    assert metrics['Customer_Category'].tolist() == ['Teacher', 'Retiree', 'Student']
+
+
+def test_rfm_scores():
+    assert quintile_scores([1, 1, 1, 1, 2]).tolist() == [1, 1, 1, 1, 5]
+    assert quintile_scores(np.arange(10)).tolist() == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    metrics = pd.DataFrame({
+        'Recency': np.arange(10)[::-1], 'Frequency': np.arange(10), 'Monetary': np.arange(10, dtype=float),
+    })
+    segments = rfm_segments(metrics)
+    # Recency scores run the other way: the most recent customer scores 5
+    assert segments['R'].tolist() == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert segments['RFM'].iloc[-1] == 555
+    assert segments['Segment'].iloc[-1] == 'Champions'
+    assert segments['Segment'].iloc[0] == 'Hibernating'
+
+
+def test_cluster_labels_are_stable():
+    transactions_df = synthetic_frame(3000, seed=2)
+    segments = customer_segments(transactions_df).set_index('Customer_Name')
+    # Row order does not change a customer's metrics or cluster
+    shuffled = customer_segments(transactions_df.sample(frac=1, random_state=1)).set_index('Customer_Name')
+    pd.testing.assert_frame_equal(shuffled.loc[segments.index], segments, check_categorical=False)
+    # Clusters are numbered by descending mean spend
+    spend = segments.groupby('Cluster')['Monetary'].mean()
+    assert list(spend.index) == [1, 2, 3, 4]
+    assert spend.is_monotonic_decreasing
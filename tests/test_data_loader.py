@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import data_loader
+from conftest import synthetic_frame
+from data_loader import SEGMENTS_DIR, append_transactions, ensure_cache, load_transactions
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """(workbook path, transactions): a workbook of the first 400 of 600 synthetic transactions."""
+    transactions_df = synthetic_frame(600)
+    path = tmp_path / "Transactions.xlsx"
+    transactions_df.iloc[:400].to_excel(path, index=False)
+    return str(path), transactions_df
+
+
+def test_touched_workbook_is_not_converted_again(dataset, monkeypatch):
+    path, _ = dataset
+    cache_dir, manifest = ensure_cache(path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the workbook was converted again")
+
+    monkeypatch.setattr(data_loader, 'build_columns', fail)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    # Only the mtime moved, so the content hash matches and the manifest just records the new mtime
+    _, touched = ensure_cache(path)
+    assert touched['base'] == manifest['base']
+    assert touched['source']['mtime_ns'] == stat.st_mtime_ns + 10**9
+    assert touched['source']['sha256'] == manifest['source']['sha256']
+    assert ensure_cache(path) == (cache_dir, touched)
+
+
+def test_replaced_workbook_prunes_covered_segments(dataset):
+    path, transactions_df = dataset
+    append_transactions(path, transactions_df.iloc[400:500])
+    append_transactions(path, transactions_df.iloc[500:600])
+    cache_dir, manifest = ensure_cache(path)
+    first, second = (segment['name'] for segment in manifest['segments'])
+    # The new export holds all of the first batch and half of the second
+    transactions_df.iloc[:550].to_excel(path, index=False)
+    _, replaced = ensure_cache(path)
+    assert replaced['base'] != manifest['base']
+    assert not os.path.exists(os.path.join(cache_dir, manifest['base']))
+    assert not os.path.exists(os.path.join(cache_dir, SEGMENTS_DIR, first))
+    assert [(segment['name'], segment['rows']) for segment in replaced['segments']] == [(second, 50)]
+    assert replaced['rows'] == 600
+    loaded = load_transactions(path)
+    assert sorted(loaded['Transaction_ID']) == sorted(transactions_df['Transaction_ID'])
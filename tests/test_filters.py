@@ -0,0 +1,20 @@
+import numpy as np
+
+from filters import Filters, filter_mask
+from schema import extend_labels
+
+
+def test_filter_mask_never_passes_missing_codes():
+    labels = {'Store_Type': ['Pharmacy', 'Warehouse Club'], 'Season': ['Fall'], 'City': ['Boston']}
+    codes = {'Store_Type': np.array([0, 1, -1, 0]), 'Season': np.array([0, 0, 0, -1]), 'City': np.zeros(4, dtype=int)}
+    mask = filter_mask(Filters(store_types=('Pharmacy',)), labels, codes.__getitem__, 4)
+    assert mask.tolist() == [True, False, False, True]
+    mask = filter_mask(Filters(store_types=('Pharmacy',), seasons=('Fall',)), labels, codes.__getitem__, 4)
+    assert mask.tolist() == [True, False, False, False]
+    assert filter_mask(Filters(), labels, codes.__getitem__, 4).all()
+
+
+def test_extend_labels_keeps_existing_codes():
+    labels, remap = extend_labels(['b', 'a'], ['c', 'a'])
+    assert labels == ['b', 'a', 'c']
+    assert remap[np.array([0, 1, -1])].tolist() == [2, 1, -1]
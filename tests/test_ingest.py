@@ -0,0 +1,114 @@
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+import data_loader
+from conftest import assert_sources_agree, synthetic_frame
+from cube import TransactionCube
+from data_loader import append_transactions, ensure_cache, load_cube, load_sketches
+from filters import Filters
+from sqlite_store import load_database
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """(workbook path, batch): a 400-row workbook and the 200 rows that follow it."""
+    transactions_df = synthetic_frame(600)
+    path = tmp_path / "Transactions.xlsx"
+    transactions_df.iloc[:400].to_excel(path, index=False)
+    return str(path), transactions_df.iloc[400:].reset_index(drop=True)
+
+
+def stored_rows(path):
+    _, manifest = ensure_cache(path)
+    return manifest['rows']
+
+
+def sketch_rows(sketches):
+    return sum(digest.count for digest in sketches.digests.values())
+
+
+@pytest.mark.parametrize('filters', [Filters(), Filters(seasons=('Fall', 'Spring'), amount_range=(15.0, 70.0))])
+def test_append_matches_full_rebuild(tmp_path, dataset, filters):
+    path, batch = dataset
+    # Build the cube, sketches and database first so the batch is folded into them, not built with them
+    load_database(path)
+    load_sketches(path)
+    # Two batches, the second bringing a city the stored data has never seen
+    append_transactions(path, batch.iloc[:120])
+    append_transactions(path, batch.iloc[120:].assign(City='Aardvark Falls'))
+    rebuilt_path = str(tmp_path / "rebuilt" / "Transactions.xlsx")
+    (tmp_path / "rebuilt").mkdir()
+    full = pd.concat([synthetic_frame(600).iloc[:400], batch.iloc[:120], batch.iloc[120:].assign(City='Aardvark Falls')])
+    full.to_excel(rebuilt_path, index=False)
+
+    rebuilt = load_cube(rebuilt_path).select(filters)
+    assert_sources_agree(rebuilt, [load_cube(path).select(filters), load_database(path).select(filters)])
+    assert_sources_agree(rebuilt, [load_database(rebuilt_path).select(filters)])
+
+    # Digests compress differently when merged, so only the exact parts are compared, over all amounts
+    filters = replace(filters, amount_range=None)
+    appended, full_sketches = load_sketches(path).select(filters), load_sketches(rebuilt_path).select(filters)
+    assert appended.amount_digest.count == full_sketches.amount_digest.count
+    assert appended.amount_digest.mean() == pytest.approx(full_sketches.amount_digest.mean())
+    # HyperLogLog registers merge exactly
+    for column in ['Store_Type', 'City', 'Season']:
+        pd.testing.assert_frame_equal(appended.distinct_customers(column), full_sketches.distinct_customers(column))
+
+
+def test_duplicate_rows_are_skipped(dataset):
+    path, batch = dataset
+    assert append_transactions(path, batch.iloc[:50]) == 50
+    # Repeats within the batch and rows already stored are both dropped
+    assert append_transactions(path, batch.iloc[[0, 0, 60, 60, 61]]) == 2
+    assert append_transactions(path, batch.iloc[:62]) == 10
+    assert stored_rows(path) == 462
+    assert load_cube(path).rows == 462
+
+
+def test_retry_after_failed_manifest_write(dataset, monkeypatch):
+    path, batch = dataset
+
+    def fail(cache_dir, manifest):
+        raise OSError("disk full")
+
+    load_cube(path)
+    with monkeypatch.context() as patch:
+        patch.setattr(data_loader, 'write_manifest', fail)
+        with pytest.raises(OSError):
+            append_transactions(path, batch)
+    assert stored_rows(path) == 400
+    assert load_cube(path).rows == 400
+    assert append_transactions(path, batch) == len(batch)
+    assert load_cube(path).rows == 600
+    assert sketch_rows(load_sketches(path)) == 600
+
+
+def test_retry_after_failed_cube_save(dataset, monkeypatch):
+    path, batch = dataset
+
+    def fail(self, directory, content=None):
+        raise OSError("disk full")
+
+    load_cube(path)
+    with monkeypatch.context() as patch:
+        patch.setattr(TransactionCube, 'save', fail)
+        with pytest.raises(OSError):
+            append_transactions(path, batch)
+    # The batch is committed; the retry adds nothing and the stale cube and sketches are rebuilt
+    assert append_transactions(path, batch) == 0
+    assert stored_rows(path) == 600
+    assert load_cube(path).rows == 600
+    assert sketch_rows(load_sketches(path)) == 600
+    assert load_cube(path).select(Filters()).totals()[1] == pytest.approx(synthetic_frame(600)['Amount($)'].sum())
+
+
+def test_cube_options_are_sorted(dataset):
+    path, batch = dataset
+    # Appended labels land at the end of the cube's label list, but options stay in order
+    batch = batch.iloc[:5].assign(City='Aardvark Falls')
+    append_transactions(path, batch)
+    cities = load_cube(path).options('City')
+    assert cities == sorted(cities)
+    assert 'Aardvark Falls' in cities
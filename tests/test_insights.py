@@ -0,0 +1,14 @@
+from analysis import FrameAggregator, answer_questions
+from data_loader import add_month
+from insights import QUESTION_INSIGHTS, question_insights
+from shared import LRUCache
+
+
+def test_every_question_has_insights(transactions_df):
+    answers = answer_questions(FrameAggregator(add_month(transactions_df)).select(None))
+    cache = LRUCache()
+    for question in QUESTION_INSIGHTS:
+        insights = question_insights(question, answers, cache=cache)
+        assert insights and all(lines for lines in insights.values())
+        assert question_insights(question, answers, cache=cache) is insights
+    assert 'discount lead' in question_insights('Q3', answers, cache=cache)['discount_sales'][0]
@@ -0,0 +1,77 @@
+import json
+
+import instrumentation
+from instrumentation import NULL_SPAN, Tracer
+
+
+def test_spans_nest_and_record():
+    tracer = Tracer(enabled=True)
+    with tracer.span('load') as load:
+        load.rows = 600
+        with tracer.span('build cube', rows=600):
+            pass
+    tracer.record('render chart', 0.25, rows=3)
+    records = tracer.records()
+    # Spans are recorded as they finish, so the inner one comes first
+    assert [(record['stage'], record['parent']) for record in records] == [
+        ('build cube', 'load'), ('load', None), ('render chart', None),
+    ]
+    assert records[1]['rows'] == 600
+    assert records[2]['seconds'] == 0.25
+    assert records[1]['seconds'] >= records[0]['seconds'] >= 0
+    assert all(record['run'] == tracer.run_id for record in records)
+    assert not tracer.stack
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer()
+    with tracer.span('load') as span:
+        span.rows = 10
+    assert span is NULL_SPAN
+    tracer.record('render chart', 0.25)
+    assert tracer.records() == []
+    path = tmp_path / "trace.jsonl"
+    tracer.export(str(path))
+    assert not path.exists()
+
+
+def test_json_lines_export(tmp_path):
+    tracer = Tracer(enabled=True)
+    with tracer.span('load', rows=5):
+        pass
+    path = tmp_path / "trace.jsonl"
+    tracer.export(str(path))
+    tracer.export(str(path))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines == tracer.records() * 2
+
+
+def test_prometheus_export_sums_repeated_stages():
+    tracer = Tracer(enabled=True)
+    tracer.record('render chart', 0.5, rows=3, memory_delta=100)
+    tracer.record('render chart', 0.25, rows=4, memory_delta=-40)
+    tracer.record('load "big"\nfile', 1.0)
+    text = tracer.prometheus()
+    assert '# TYPE dashboard_stage_seconds gauge' in text
+    assert 'dashboard_stage_seconds{stage="render chart"} 0.75' in text
+    assert 'dashboard_stage_rows{stage="render chart"} 4' in text
+    assert 'dashboard_stage_memory_delta_bytes{stage="render chart"} 60' in text
+    assert 'dashboard_stage_seconds{stage="load \\"big\\"\\nfile"} 1.0' in text
+    # Stages without rows or memory figures get no sample for them
+    assert 'dashboard_stage_rows{stage="load' not in text
+    assert text.endswith("\n")
+
+
+def test_rss_without_proc_or_resource(monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc")
+
+    monkeypatch.setattr(instrumentation, 'open', no_proc, raising=False)
+    assert instrumentation.current_rss() > 0
+    # Windows has neither /proc nor the resource module
+    monkeypatch.setattr(instrumentation, 'resource', None)
+    assert instrumentation.current_rss() == 0
+    tracer = Tracer(enabled=True)
+    with tracer.span('load'):
+        pass
+    assert tracer.records()[0]['memory_delta_bytes'] == 0
@@ -0,0 +1,55 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+from analysis import FrameAggregator, answer_questions
+from data_loader import add_month
+from filters import FilterIndex, Filters
+from partitioned import answer_partitioned, partition_dataset
+from schema import apply_schema
+
+
+@pytest.fixture
+def source(tmp_path, transactions_df):
+    path = tmp_path / "transactions.csv"
+    transactions_df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_repartitioning_replaces_only_month_directories(tmp_path, source):
+    output = tmp_path / "partitions"
+    first = partition_dataset(source, str(output), chunk_rows=200)
+    stale = output / "month=1999-01"
+    stale.mkdir()
+    assert partition_dataset(source, str(output), chunk_rows=200) == first
+    assert not stale.exists()
+
+
+def test_foreign_directory_is_left_alone(tmp_path, source):
+    output = tmp_path / "documents"
+    output.mkdir()
+    (output / "notes.txt").write_text("keep me")
+    with pytest.raises(ValueError):
+        partition_dataset(source, str(output))
+    assert os.listdir(output) == ["notes.txt"]
+
+
+@pytest.mark.parametrize('filters', [
+    Filters(),
+    Filters(store_types=('Pharmacy', 'Supermarket'), amount_range=(20.0, 80.0)),
+    Filters(seasons=('Fall', 'Winter'), date_range=(datetime.date(2021, 1, 1), datetime.date(2022, 6, 30))),
+])
+def test_matches_the_frame(tmp_path, source, transactions_df, filters):
+    output = str(tmp_path / "partitions")
+    partition_dataset(source, output, chunk_rows=200)
+    answers = answer_partitioned(output, filters, workers=1)
+    transactions_df = add_month(apply_schema(transactions_df))
+    expected = answer_questions(FrameAggregator(transactions_df).select(FilterIndex(transactions_df).select(filters)))
+    assert answers.keys() == expected.keys()
+    for name, answer in answers.items():
+        if isinstance(answer, pd.DataFrame):
+            pd.testing.assert_frame_equal(answer, expected[name], check_dtype=False, check_categorical=False, check_index_type=False)
+        else:
+            assert answer == pytest.approx(expected[name])
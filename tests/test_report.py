@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+import pytest
+
+from analysis import answer_questions
+from conftest import synthetic_frame
+from data_loader import load_cube
+from filters import Filters
+from report import REPORT_TABLES, build_reports, report_names
+
+
+@pytest.fixture(scope='module')
+def workbooks(tmp_path_factory):
+    """Two different workbooks that share a file name."""
+    paths = []
+    for seed in [0, 1]:
+        path = tmp_path_factory.mktemp(f'store{seed}') / "Transactions.xlsx"
+        synthetic_frame(300 + 100 * seed, seed=seed).to_excel(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_report_names():
+    assert report_names(['a/Transactions.xlsx', 'b/Other.xlsx']) == ['Transactions', 'Other']
+    first, second = report_names(['a/Transactions.xlsx', 'b/Transactions.xlsx'])
+    assert first != second
+    assert first.startswith('Transactions-') and second.startswith('Transactions-')
+
+
+def read_table(path, table_format, indexed):
+    if table_format == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path, index_col=0 if indexed else None)
+
+
+@pytest.mark.parametrize('table_format', ['csv', 'parquet'])
+def test_same_named_workbooks_get_their_own_reports(tmp_path, workbooks, table_format):
+    # The first workbook is named twice but reported once
+    directories = build_reports([*workbooks, workbooks[0]], str(tmp_path), workers=1, table_format=table_format)
+    assert len(set(directories)) == 2
+    for path, directory in zip(workbooks, directories):
+        assert sorted(os.listdir(directory)) == sorted(['report.html', *(f"{name}.{table_format}" for name in REPORT_TABLES)])
+        cube = load_cube(path)
+        answers = answer_questions(cube.select(Filters()))
+        for name in REPORT_TABLES:
+            indexed = name == 'sales_with_without_discount'
+            table = read_table(os.path.join(directory, f"{name}.{table_format}"), table_format, indexed)
+            expected = answers[name] if indexed else answers[name].reset_index(drop=True)
+            pd.testing.assert_frame_equal(
+                table, expected.astype({column: object for column in expected.select_dtypes('category')}),
+                check_dtype=False, check_index_type=False, check_names=False,
+            )
+        with open(os.path.join(directory, "report.html"), encoding="utf-8") as handle:
+            report = handle.read()
+        assert f"{cube.rows:,} transactions" in report
+        assert '<img src="data:image/png;base64,' in report
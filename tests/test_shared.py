@@ -0,0 +1,22 @@
+from shared import LRUCache
+
+
+def test_entry_cap_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_byte_cap_keeps_the_newest_entry():
+    cache = LRUCache(max_entries=None, max_bytes=10)
+    cache.put('a', b'x' * 6)
+    cache.put('b', b'y' * 6)
+    assert cache.get('a') is None
+    cache.put('c', b'z' * 20)
+    assert cache.get('b') is None
+    assert cache.get('c') == b'z' * 20
+    assert cache.size == 20
@@ -0,0 +1,29 @@
+import pytest
+
+from conftest import synthetic_frame
+from data_loader import add_month
+from filters import Filters
+from sketches import TransactionSketches
+
+
+@pytest.fixture
+def sketches_and_frame():
+    transactions_df = add_month(synthetic_frame(5000))
+    return TransactionSketches.from_frame(transactions_df), transactions_df
+
+
+def test_mean_cut_is_exact_without_amount_range(sketches_and_frame):
+    sketches, transactions_df = sketches_and_frame
+    mean, low, high = sketches.select(Filters()).high_value_cut()
+    assert mean == low == high == pytest.approx(transactions_df['Amount($)'].mean())
+
+
+@pytest.mark.parametrize('amount_range', [(20.0, 60.0), (55.5, 55.7), (10.0, 99.0)])
+def test_mean_cut_bounds_cover_the_filtered_mean(sketches_and_frame, amount_range):
+    sketches, transactions_df = sketches_and_frame
+    amounts = transactions_df['Amount($)']
+    exact = amounts[amounts.between(*amount_range)].mean()
+    mean, low, high = sketches.select(Filters(amount_range=amount_range)).high_value_cut()
+    assert low <= exact <= high
+    assert low <= mean <= high
+    assert low < high
@@ -0,0 +1,141 @@
+import gc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import synthetic_frame
+from data_loader import append_transactions
+from filters import Filters
+from snapshots import Snapshot, SnapshotWatcher, load_snapshot
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """(workbook path, batch): a 400-row workbook and the 200 rows that follow it."""
+    transactions_df = synthetic_frame(600)
+    path = tmp_path / "Transactions.xlsx"
+    transactions_df.iloc[:400].to_excel(path, index=False)
+    return str(path), transactions_df.iloc[400:].reset_index(drop=True)
+
+
+def in_new_thread(function):
+    """Run `function` on a thread of its own, so a database store opens a fresh connection."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function).result()
+
+
+@pytest.mark.parametrize('backend', ['cube', 'sqlite'])
+def test_snapshot_ignores_later_appends(dataset, backend):
+    path, batch = dataset
+    snapshot = load_snapshot(path, backend)
+    before = snapshot.store.select(Filters()).totals()
+    append_transactions(path, batch)
+    # Loading the next snapshot brings the stored data (the database file itself, for SQLite) up to date
+    assert load_snapshot(path, backend).store.rows == 600
+    assert snapshot.store.rows == 400
+    assert snapshot.store.select(Filters()).totals() == before
+    assert in_new_thread(lambda: snapshot.store.select(Filters()).totals()) == before
+
+
+def test_sqlite_snapshot_survives_a_rebuild(dataset):
+    path, batch = dataset
+    snapshot = load_snapshot(path, 'sqlite')
+    before = snapshot.store.select(Filters()).totals()
+    # A replaced workbook rebuilds the database file from scratch
+    synthetic_frame(300, seed=1).to_excel(path, index=False)
+    assert load_snapshot(path, 'sqlite').store.rows == 300
+    assert in_new_thread(lambda: snapshot.store.select(Filters()).totals()) == before
+    assert snapshot.store.select(Filters()).totals() == before
+
+
+class FakeLoader:
+    """Stands in for load_snapshot: snapshots stamped with the current version, or a raised error."""
+
+    def __init__(self):
+        self.version = 0
+        self.error = None
+        self.calls = 0
+
+    def __call__(self, path, backend="cube", tracer=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return Snapshot((self.version,), None, None, None, 0.0)
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    loader = FakeLoader()
+    monkeypatch.setattr('snapshots.dataset_stamp', lambda path: (loader.version,))
+    return SnapshotWatcher("Transactions.xlsx", loader=loader), loader
+
+
+def test_refreshes_when_the_stamp_changes(watcher):
+    watcher, loader = watcher
+    first = watcher.snapshot
+    assert not watcher.refresh()
+    assert loader.calls == 1
+    loader.version = 1
+    assert watcher.refresh()
+    assert watcher.snapshot.stamp == (1,)
+    assert watcher.snapshot is not first
+
+
+def test_failed_build_keeps_the_last_snapshot(watcher):
+    watcher, loader = watcher
+    first = watcher.snapshot
+    loader.version, loader.error = 1, OSError("workbook is being written")
+    assert not watcher.refresh()
+    assert watcher.snapshot is first
+    assert watcher.error is loader.error
+    loader.error = None
+    assert watcher.refresh()
+    assert watcher.snapshot.stamp == (1,)
+    assert watcher.error is None
+
+
+def test_at_most_two_snapshots_are_alive(watcher):
+    watcher, loader = watcher
+    held = watcher.snapshot
+    loader.version = 1
+    assert watcher.refresh()
+    # A run still holds the first snapshot, so building a third waits
+    loader.version = 2
+    assert not watcher.refresh()
+    assert loader.calls == 2
+    del held
+    gc.collect()
+    assert watcher.refresh()
+    assert watcher.snapshot.stamp == (2,)
+
+
+def test_background_thread_swaps_snapshots(watcher):
+    watcher, loader = watcher
+    swapped = threading.Event()
+    refresh = watcher.refresh
+
+    def refresh_and_signal():
+        if refresh():
+            swapped.set()
+
+    watcher.interval = 0.01
+    watcher.refresh = refresh_and_signal
+    loader.version = 1
+    watcher.start()
+    try:
+        assert swapped.wait(5)
+    finally:
+        watcher.stop()
+    assert watcher.snapshot.stamp == (1,)
+
+
+def test_customer_segments_load_on_first_use(dataset, monkeypatch):
+    path, _ = dataset
+    calls = []
+    monkeypatch.setattr('snapshots.load_customer_segments', lambda path, tracer=None: calls.append(path) or object())
+    snapshot = load_snapshot(path)
+    assert not calls
+    segments = snapshot.customer_segments()
+    assert snapshot.customer_segments() is segments
+    assert calls == [path]
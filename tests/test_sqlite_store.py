@@ -0,0 +1,53 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from analysis import FrameAggregator
+from conftest import assert_sources_agree, synthetic_frame
+from data_loader import append_transactions, load_cube, load_transactions
+from filters import FilterIndex, Filters
+from sqlite_store import load_database
+
+
+def test_sidebar_summary_follows_appends(tmp_path):
+    transactions_df = synthetic_frame(600)
+    path = str(tmp_path / "Transactions.xlsx")
+    transactions_df.iloc[:400].to_excel(path, index=False)
+    load_database(path)
+    append_transactions(path, transactions_df.iloc[400:].assign(City='Aardvark Falls'))
+    database = load_database(path)
+    cube = load_cube(path)
+    assert database.rows == cube.rows == 600
+    assert database.amount_bounds() == cube.amount_bounds()
+    assert database.date_bounds() == cube.date_bounds()
+    for column in ['Store_Type', 'Season', 'City']:
+        assert database.options(column) == cube.options(column)
+    # The summary is the stored one, not a fresh scan
+    with sqlite3.connect(database.database_path) as connection:
+        connection.execute("DELETE FROM transactions")
+    assert load_database(path).rows == 600
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = tmp_path_factory.mktemp('sqlite') / "Transactions.xlsx"
+    synthetic_frame(1500, seed=3).to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('filters', [
+    Filters(),
+    Filters(store_types=('Pharmacy', 'Supermarket'), seasons=('Fall', 'Winter', 'Summer')),
+    Filters(cities=('Boston', 'Chicago', 'Miami'), amount_range=(20.0, 80.0)),
+    Filters(store_types=(), cities=('Boston',)),
+    Filters(seasons=('Spring',), amount_range=(10.0, 60.0), date_range=(datetime.date(2022, 3, 1), datetime.date(2022, 5, 31))),
+])
+def test_matches_the_frame_and_the_cube(workbook, filters):
+    transactions_df = load_transactions(workbook)
+    expected = FrameAggregator(transactions_df).select(FilterIndex(transactions_df).select(filters))
+    sources = [load_database(workbook).select(filters)]
+    if filters.date_range is None:
+        # The cube has no Date dimension
+        sources.append(load_cube(workbook).select(filters))
+    assert_sources_agree(expected, sources)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from schema import TRANSACTION_COLUMNS
+from synthetic import (
+    CITIES, DATE_RANGE, PROMOTIONS, STORE_TYPES, XLSX_MAX_ROWS, iter_synthetic_chunks, synthetic_path, write_synthetic,
+)
+from xlsx_stream import read_transactions
+
+
+def test_chunks_follow_the_schema():
+    chunks = list(iter_synthetic_chunks(2500, seed=4, chunk_rows=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    transactions_df = pd.concat(chunks, ignore_index=True)
+    assert list(transactions_df.columns) == TRANSACTION_COLUMNS
+    assert transactions_df['Transaction_ID'].is_unique
+    assert transactions_df['City'].isin(CITIES).all()
+    assert transactions_df['Store_Type'].isin(STORE_TYPES).all()
+    assert transactions_df['Promotion'].dropna().isin(PROMOTIONS).all()
+    assert 0.25 < transactions_df['Promotion'].isna().mean() < 0.4
+    assert transactions_df['Amount($)'].between(5, 100).all()
+    cents = transactions_df['Amount($)'].to_numpy() * 100
+    assert np.allclose(cents, np.rint(cents))
+    assert transactions_df['Total_Items'].between(1, 10).all()
+    assert transactions_df['Date'].between(*(pd.Timestamp(bound) for bound in DATE_RANGE)).all()
+    # About 84 distinct customers per 100 transactions, as in the bundled workbook
+    assert 0.75 < transactions_df['Customer_Name'].nunique() / len(transactions_df) < 0.9
+
+
+def test_same_seed_same_data():
+    first = pd.concat(list(iter_synthetic_chunks(500, seed=7)), ignore_index=True)
+    again = pd.concat(list(iter_synthetic_chunks(500, seed=7)), ignore_index=True)
+    other = pd.concat(list(iter_synthetic_chunks(500, seed=8)), ignore_index=True)
+    pd.testing.assert_frame_equal(first, again)
+    assert not first.equals(other)
+
+
+@pytest.mark.parametrize('extension', ['xlsx', 'csv'])
+def test_written_files_read_back(tmp_path, extension):
+    path = write_synthetic(str(tmp_path / f"synthetic.{extension}"), 700, seed=1, chunk_rows=300)
+    expected = pd.concat(list(iter_synthetic_chunks(700, seed=1, chunk_rows=300)), ignore_index=True)
+    result = read_transactions(path) if extension == 'xlsx' else pd.read_csv(path, parse_dates=['Date'])
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_xlsx_is_limited_to_a_sheet(tmp_path):
+    with pytest.raises(ValueError):
+        write_synthetic(str(tmp_path / "synthetic.xlsx"), XLSX_MAX_ROWS + 1)
+    assert synthetic_path("data", XLSX_MAX_ROWS).endswith(".xlsx")
+    assert synthetic_path("data", XLSX_MAX_ROWS + 1).endswith(".csv")
@@ -0,0 +1,28 @@
+import datetime
+
+import pytest
+
+from analysis import FrameAggregator
+from conftest import assert_sources_agree, synthetic_frame
+from data_loader import load_time_index, load_transactions
+from filters import FilterIndex, Filters
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = tmp_path_factory.mktemp('timeindex') / "Transactions.xlsx"
+    synthetic_frame(1500, seed=3).to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('filters', [
+    Filters(),
+    Filters(store_types=('Pharmacy', 'Supermarket'), seasons=('Fall', 'Winter', 'Summer')),
+    Filters(cities=('Boston', 'Chicago', 'Miami'), amount_range=(20.0, 80.0)),
+    Filters(date_range=(datetime.date(2021, 1, 1), datetime.date(2023, 6, 30))),
+    Filters(seasons=('Spring',), amount_range=(10.0, 60.0), date_range=(datetime.date(2022, 3, 1), datetime.date(2022, 5, 31))),
+])
+def test_matches_the_frame(workbook, filters):
+    transactions_df = load_transactions(workbook)
+    expected = FrameAggregator(transactions_df).select(FilterIndex(transactions_df).select(filters))
+    assert_sources_agree(expected, [load_time_index(workbook).select(filters)])
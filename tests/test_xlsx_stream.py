@@ -0,0 +1,93 @@
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from schema import apply_schema
+from xlsx_stream import read_transactions, to_datetime_column
+
+NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def share_strings(path):
+    """Move a workbook's inline-string cells into a shared-strings table, as Excel itself saves them."""
+    with zipfile.ZipFile(path) as archive:
+        members = {name: archive.read(name).decode() for name in archive.namelist()}
+    shared = {}
+
+    def share(match):
+        index = shared.setdefault(match.group(3), len(shared))
+        return f'<c r="{match.group(1)}"{match.group(2)} t="s"><v>{index}</v></c>'
+
+    sheet = "xl/worksheets/sheet1.xml"
+    members[sheet] = re.sub(
+        r'<c r="([A-Z]+[0-9]+)"((?: s="[0-9]+")?) t="inlineStr"><is><t>([^<]*)</t></is></c>', share, members[sheet]
+    )
+    # Empty <c t="inlineStr"/> cells (missing values) stay as they are
+    assert shared
+    members["xl/sharedStrings.xml"] = (
+        f'<sst xmlns="{NAMESPACE}" count="{len(shared)}" uniqueCount="{len(shared)}">'
+        + "".join(f"<si><t>{text}</t></si>" for text in shared)
+        + "</sst>"
+    )
+    members["xl/_rels/workbook.xml.rels"] = members["xl/_rels/workbook.xml.rels"].replace(
+        "</Relationships>",
+        '<Relationship Id="rIdStrings" Target="sharedStrings.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"/></Relationships>',
+    )
+    members["[Content_Types].xml"] = members["[Content_Types].xml"].replace(
+        "</Types>",
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>',
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def test_to_excel_round_trip(tmp_path, transactions_df):
+    # DataFrame.to_excel writes Date as Excel serial numbers and text as inline strings
+    path = tmp_path / "transactions.xlsx"
+    transactions_df.to_excel(path, sheet_name="Sheet1", index=False)
+    result = read_transactions(path, chunk_rows=250)
+    pd.testing.assert_frame_equal(result, transactions_df, check_dtype=False)
+
+
+@pytest.mark.parametrize('strings', ['inline', 'shared'])
+@pytest.mark.parametrize('dates', ['serial', 'text'])
+def test_matches_read_excel(tmp_path, transactions_df, strings, dates):
+    path = tmp_path / "transactions.xlsx"
+    exported = transactions_df.copy()
+    if dates == 'text':
+        # Transactions.xlsx itself holds Date as text
+        exported['Date'] = exported['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    exported.to_excel(path, sheet_name="Sheet1", index=False)
+    if strings == 'shared':
+        share_strings(path)
+    expected = apply_schema(pd.read_excel(path, sheet_name="Sheet1"))
+    result = apply_schema(read_transactions(path, chunk_rows=250))
+    pd.testing.assert_frame_equal(result, expected, check_categorical=False)
+
+
+def test_text_booleans_and_numbers_in_text_columns(tmp_path, transactions_df):
+    path = tmp_path / "transactions.xlsx"
+    exported = transactions_df.iloc[:6].astype({'Discount_Applied': object, 'City': object, 'Customer_Name': object})
+    exported['Discount_Applied'] = ['FALSE', '0', 'TRUE', 'yes', False, True]
+    exported['City'] = [123, 4.5, 'Boston', 10001, 'Miami', 0]
+    exported.to_excel(path, sheet_name="Sheet1", index=False)
+    result = read_transactions(path)
+    assert result['Discount_Applied'].tolist() == [False, False, True, True, False, True]
+    assert result['City'].tolist() == ['123', '4.5', 'Boston', '10001', 'Miami', '0']
+    # The labels match pd.read_excel's values once those are written out as text
+    assert result['City'].tolist() == [str(value) for value in pd.read_excel(path, sheet_name="Sheet1")['City']]
+
+
+def test_serial_dates_land_on_whole_milliseconds():
+    # 2022-03-01 23:03:20 as a serial carries float error far below a millisecond
+    serial = (np.datetime64("2022-03-01T23:03:20") - np.datetime64("1899-12-30")) / np.timedelta64(1, "D")
+    result = to_datetime_column([float(serial), "2022-03-02 08:00:00", None])
+    assert result[0] == np.datetime64("2022-03-01T23:03:20", "ns")
+    assert result[1] == np.datetime64("2022-03-02T08:00:00", "ns")
+    assert np.isnat(result[2])
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from analysis import DIMENSIONS, FrameAggregator
+from filters import day_bounds, filter_mask
+
+# Granularities with a precomputed period key per row, finest first. Keys count periods since
+# the epoch, so rows sorted by Date have non-decreasing keys at every granularity.
+GRANULARITIES = ['hour', 'day', 'week', 'month', 'year']
+
+# Year-over-year views: the position of a period within its year, and how it is labelled
+PERIOD_OF_YEAR = {'day': 'Day of Year', 'week': 'ISO Week', 'month': 'Month'}
+
+# 1970-01-01 was a Thursday; ISO weeks start on Monday
+EPOCH_WEEKDAY = 3
+
+
+def period_keys(dates):
+    """int32 period numbers of sorted datetime64[ns] dates, one array per granularity."""
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    return {
+        'hour': dates.astype('datetime64[h]').astype(np.int64).astype(np.int32),
+        'day': days.astype(np.int32),
+        'week': ((days + EPOCH_WEEKDAY) // 7).astype(np.int32),
+        'month': dates.astype('datetime64[M]').astype(np.int64).astype(np.int32),
+        'year': dates.astype('datetime64[Y]').astype(np.int64).astype(np.int32),
+    }
+
+
+def period_starts(granularity, keys):
+    """First instant of each period key, as a DatetimeIndex."""
+    keys = np.asarray(keys, dtype=np.int64)
+    if granularity == 'week':
+        return pd.DatetimeIndex((keys * 7 - EPOCH_WEEKDAY).astype('datetime64[D]'), name='Week')
+    unit = {'hour': 'h', 'day': 'D', 'month': 'M', 'year': 'Y'}[granularity]
+    return pd.DatetimeIndex(keys.astype(f'datetime64[{unit}]').astype('datetime64[ns]'), name=granularity.title())
+
+
+def year_and_position(granularity, keys):
+    """(year, position within the year) of each period key; weeks use ISO years and week numbers."""
+    keys = np.asarray(keys, dtype=np.int64)
+    if granularity == 'month':
+        return 1970 + keys // 12, keys % 12 + 1
+    # The Thursday of an ISO week decides its year
+    days = keys * 7 if granularity == 'week' else keys
+    day_dates = days.astype('datetime64[D]')
+    years = day_dates.astype('datetime64[Y]')
+    day_of_year = (day_dates - years.astype('datetime64[D]')).astype(np.int64)
+    position = day_of_year // 7 + 1 if granularity == 'week' else day_of_year + 1
+    return years.astype(np.int64) + 1970, position
+
+
+# --- Period tables, shared by every source that reports (period keys, without, with discount) ---
+def discount_trend_frame(granularity, keys, without, with_discount):
+    return pd.DataFrame(
+        {'No Discount': without, 'With Discount': with_discount},
+        index=period_starts(granularity, keys),
+    )
+
+
+def check_year_over_year(granularity):
+    if granularity not in PERIOD_OF_YEAR:
+        raise ValueError(f"Year-over-year needs one of {', '.join(PERIOD_OF_YEAR)}, not {granularity!r}")
+
+
+def year_over_year_frame(granularity, keys, without, with_discount, discount=None):
+    sales = without + with_discount if discount is None else (with_discount if discount else without)
+    years, position = year_and_position(granularity, keys)
+    period = PERIOD_OF_YEAR[granularity]
+    return pd.DataFrame({'Year': years, period: position, 'Sales': sales}).pivot(
+        index=period, columns='Year', values='Sales'
+    )
+
+
+class TimeIndex:
+    """The transactions sorted by Date, with a period key per row at every granularity.
+
+    A date range is two binary searches into the sorted dates, and the rest of the sidebar
+    filters are applied to that slice only, so a query costs the rows in the range rather than
+    the whole table. Sorted keys turn any period rollup into one pass over contiguous runs.
+    """
+
+    def __init__(self, transactions_df):
+        dates = transactions_df['Date'].to_numpy(dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+        columns = [column for column in [*DIMENSIONS, 'Amount($)', 'Total_Items'] if column in transactions_df]
+        sorted_df = transactions_df[columns].take(order)
+        self.dates = dates[order]
+        self.keys = period_keys(self.dates)
+        self.aggregator = FrameAggregator(sorted_df)
+        self.discount = sorted_df['Discount_Applied'].to_numpy(dtype=bool)
+
+    @property
+    def rows(self):
+        return len(self.dates)
+
+    def date_slice(self, date_range=None):
+        """Positions of an inclusive (first day, last day) range, as a slice of the sorted rows."""
+        if date_range is None:
+            return slice(0, self.rows)
+        start, end = day_bounds(date_range)
+        return slice(int(np.searchsorted(self.dates, start)), int(np.searchsorted(self.dates, end)))
+
+    def positions(self, filters):
+        """Sorted row positions matching `filters`, found within the date range's slice."""
+        window = self.date_slice(filters.date_range)
+        aggregator = self.aggregator
+        keep = filter_mask(
+            filters, aggregator.labels, lambda column: aggregator.codes[column][window], window.stop - window.start
+        )
+        if filters.amount_range is not None:
+            low, high = filters.amount_range
+            amount = aggregator.amount[window]
+            keep &= (amount >= low) & (amount <= high)
+        return window.start + np.flatnonzero(keep)
+
+    def select(self, filters):
+        """Aggregate source (see analysis.Selection) over the rows matching `filters`."""
+        return self.aggregator.select(self.positions(filters))
+
+    # --- Discount trend ---
+    def period_sales(self, granularity, positions):
+        """(period keys, sales without a discount, sales with one) over sorted row positions."""
+        keys = self.keys[granularity][positions]
+        if not len(keys):
+            return keys, np.zeros(0), np.zeros(0)
+        # Keys of sorted rows are non-decreasing, so each period is one contiguous run
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        amount = self.aggregator.amount[positions].astype(np.float64)
+        discount = self.discount[positions]
+        without = np.add.reduceat(np.where(discount, 0.0, amount), starts)
+        with_discount = np.add.reduceat(np.where(discount, amount, 0.0), starts)
+        return keys[starts], without, with_discount
+
+    def discount_trend(self, granularity, filters):
+        """Sales with and without a discount per period, for every period with a matching row."""
+        return discount_trend_frame(granularity, *self.period_sales(granularity, self.positions(filters)))
+
+    def year_over_year(self, granularity, filters, discount=None):
+        """Sales per period of the year (rows) and year (columns); `discount` keeps only
+        discounted (True) or undiscounted (False) sales. Periods without sales are NaN."""
+        check_year_over_year(granularity)
+        return year_over_year_frame(granularity, *self.period_sales(granularity, self.positions(filters)), discount)
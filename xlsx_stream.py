@@ -0,0 +1,193 @@
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from schema import COLUMN_KINDS, TRANSACTION_COLUMNS, TRUE_TEXT, parse_dates
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+ROW_TAG = f"{MAIN_NS}row"
+CELL_TAG = f"{MAIN_NS}c"
+VALUE_TAG = f"{MAIN_NS}v"
+TEXT_TAG = f"{MAIN_NS}t"
+INLINE_TAG = f"{MAIN_NS}is"
+SHEET_DATA_TAG = f"{MAIN_NS}sheetData"
+
+CELL_COLUMN = re.compile(r"[A-Z]+")
+
+# Excel's serial-date epoch (1900 date system, including the leap-year bug offset)
+EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+MILLISECONDS_PER_DAY = 86_400_000
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+# --- Workbook structure ---
+def sheet_member(archive, sheet_name):
+    """Resolve a sheet name to its XML member inside the xlsx zip."""
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    relationships = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in relationships.iter(f"{PACKAGE_REL_NS}Relationship")}
+    for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+        if sheet.get("name") == sheet_name:
+            target = targets[sheet.get(f"{REL_NS}id")]
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise ValueError(f"Sheet {sheet_name!r} not found in workbook")
+
+
+def read_shared_strings(archive):
+    """Shared-strings table, if the export has one (ours normally uses inline strings)."""
+    try:
+        data = archive.read("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    return ["".join(text.text or "" for text in item.iter(TEXT_TAG)) for item in ET.fromstring(data).iter(f"{MAIN_NS}si")]
+
+
+def column_index(reference):
+    """'C17' -> 2"""
+    index = 0
+    for letter in CELL_COLUMN.match(reference).group():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def cell_value(cell, shared_strings):
+    """Raw Python value of one <c> element (str, float, bool or None)."""
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        inline = cell.find(INLINE_TAG)
+        return None if inline is None else "".join(text.text or "" for text in inline.iter(TEXT_TAG))
+    value = cell.find(VALUE_TAG)
+    if value is None or value.text is None:
+        return None
+    if cell_type == "n":
+        return float(value.text)
+    if cell_type == "b":
+        return value.text == "1"
+    if cell_type == "s":
+        return shared_strings[int(value.text)]
+    return value.text
+
+
+# --- Typed conversion ---
+def to_datetime_column(values):
+    """Dates arrive as text, or as Excel serial numbers when the export formats them as dates."""
+    serials = np.array([isinstance(value, float) for value in values], dtype=bool)
+    if not serials.any():
+        return parse_dates(values).to_numpy(dtype="datetime64[ns]")
+    # Text and missing cells are parsed together; serials are converted arithmetically. The parsed
+    # array is copied because pandas hands out read-only views under copy-on-write.
+    parsed = parse_dates([None if serial else value for value, serial in zip(values, serials)])
+    result = np.array(parsed.to_numpy(dtype="datetime64[ns]"), copy=True)
+    days = np.array([value for value, serial in zip(values, serials) if serial], dtype=np.float64)
+    # Serials are fractions of a day; rounding to whole milliseconds (Excel's own time resolution)
+    # drops the float error that would otherwise show up as stray nanoseconds
+    milliseconds = np.rint(days * MILLISECONDS_PER_DAY).astype(np.int64)
+    result[serials] = EXCEL_EPOCH + milliseconds.astype("timedelta64[ms]").astype("timedelta64[ns]")
+    return result
+
+
+def to_text(value):
+    """A text column's cell as pandas reads it: a number typed into it loses the '.0' when integral."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def to_bool(value):
+    """A bool column's cell: a boolean or number, or text such as 'TRUE', 'false' or '0'."""
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_TEXT
+    return bool(value)
+
+
+def to_typed_column(column, values, first_row):
+    kind = COLUMN_KINDS[column]
+    if kind == "str":
+        return np.array([np.nan if value is None else to_text(value) for value in values], dtype=object)
+    if kind == "datetime":
+        return to_datetime_column(values)
+    if kind == "bool":
+        return np.array([to_bool(value) for value in values], dtype=bool)
+    if kind == "float":
+        return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+    if any(value is None for value in values):
+        missing = next(position for position, value in enumerate(values) if value is None)
+        raise ValueError(f"Missing {column} in sheet row {first_row + missing}")
+    return np.array(values, dtype=np.float64).astype(np.int64)
+
+
+def to_chunk(buffers, first_row):
+    return pd.DataFrame(
+        {column: to_typed_column(column, buffers[column], first_row) for column in TRANSACTION_COLUMNS},
+        columns=TRANSACTION_COLUMNS,
+    )
+
+
+# --- Streaming reader ---
+def iter_transaction_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS, sheet_name="Sheet1"):
+    """Yield DataFrame chunks of at most `chunk_rows` rows with the transactions_df schema.
+
+    The sheet XML is iterparsed straight out of the zip and every finished row is dropped from
+    the tree, so peak memory is set by `chunk_rows`, not by the size of the export.
+    """
+    with zipfile.ZipFile(path) as archive:
+        member = sheet_member(archive, sheet_name)
+        shared_strings = read_shared_strings(archive)
+        with archive.open(member) as sheet:
+            positions = None
+            buffers = {column: [] for column in TRANSACTION_COLUMNS}
+            buffered = 0
+            first_row = 2
+            sheet_data = None
+            for event, element in ET.iterparse(sheet, events=("start", "end")):
+                if event == "start":
+                    if element.tag == SHEET_DATA_TAG:
+                        sheet_data = element
+                    continue
+                if element.tag != ROW_TAG:
+                    continue
+                values = {}
+                for cell in element.iter(CELL_TAG):
+                    values[column_index(cell.get("r"))] = cell_value(cell, shared_strings)
+                if sheet_data is not None:
+                    sheet_data.clear()
+                if positions is None:
+                    # Header row: map the 12 known columns to their sheet positions
+                    header = {value: position for position, value in values.items()}
+                    missing = [column for column in TRANSACTION_COLUMNS if column not in header]
+                    if missing:
+                        raise ValueError(f"Missing columns in {path}: {', '.join(missing)}")
+                    positions = {column: header[column] for column in TRANSACTION_COLUMNS}
+                    continue
+                if not values:
+                    continue
+                for column, position in positions.items():
+                    buffers[column].append(values.get(position))
+                buffered += 1
+                if buffered == chunk_rows:
+                    yield to_chunk(buffers, first_row)
+                    first_row += buffered
+                    buffers = {column: [] for column in TRANSACTION_COLUMNS}
+                    buffered = 0
+            if buffered:
+                yield to_chunk(buffers, first_row)
+
+
+def read_transactions(path, chunk_rows=DEFAULT_CHUNK_ROWS, sheet_name="Sheet1"):
+    """Read the whole sheet through the streaming reader."""
+    chunks = list(iter_transaction_chunks(path, chunk_rows, sheet_name))
+    if not chunks:
+        return to_chunk({column: [] for column in TRANSACTION_COLUMNS}, 2)
+    return pd.concat(chunks, ignore_index=True)